@@ -0,0 +1,12 @@
+"""pytest configuration for the materials tests."""
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def materials_cache_dir(tmp_path_factory):
+    """Cache parsed records in a temporary directory for the whole test session, rather
+    than in the developer's `~/.cache/materials`. Subprocesses inherit the setting."""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        cache_dir = tmp_path_factory.mktemp('materials_cache')
+        monkeypatch.setenv('MATERIALS_CACHE_DIR', str(cache_dir))
+        yield cache_dir
@@ -1,3 +1,4 @@
 """__init__.py for materials module."""
 from .material import Material, load_from_yaml, load
 from .path_magic import get_database_dir
+from .database import Database
@@ -0,0 +1,153 @@
+"""Batch queries, split into chunks.
+
+`query_batch` evaluates the chunks in parallel, in a thread pool. Most of the time of a
+large query is spent in numpy functions, which release the GIL, so the chunks run in
+parallel on several cores.
+
+`query_chunked` evaluates the chunks one at a time, so that the temporary arrays
+of the query are the size of one chunk, however long the state arrays are.
+"""
+import concurrent.futures
+import os
+import threading
+import numpy as np
+
+
+DEFAULT_CHUNK_SIZE = 2**16
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def get_default_executor():
+    """Get the thread pool used by batch queries, creating it if needed.
+
+    It has one thread per CPU, and is shared by all batch queries which are
+    not given an executor.
+
+    Returns:
+        concurrent.futures.ThreadPoolExecutor
+    """
+    global _default_executor  # pylint: disable=global-statement
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=os.cpu_count(), thread_name_prefix='materials-batch')
+        return _default_executor
+
+
+def query_batch(query, state, chunk_size=DEFAULT_CHUNK_SIZE, executor=None):
+    """
+    Evaluate a query in chunks, in a thread pool.
+
+    The state arrays are broadcast against each other and split into chunks of
+    `chunk_size` points. `query` is called once per chunk, and writes its values
+    into the corresponding part of one output array.
+
+    Arguments:
+        query (callable): `query(state, out)` writes the values at the points of
+            `state` into `out` (a 1d float array), e.g.
+            `lambda state, out: model.query_value(state, out=out)`.
+            It is called from several threads at once, so must be thread-safe.
+        state (dict): The query state, as for `query_value`. Scalars are passed to
+            every chunk unchanged.
+        chunk_size (int): Number of points per chunk.
+        executor (concurrent.futures.Executor): Executor which runs the chunks.
+            Defaults to `get_default_executor()`.
+
+    Returns:
+        scalar or ndarray: the values, with the broadcast shape of the state arrays.
+
+    """
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be at least 1.')
+    shape = np.broadcast_shapes(*[np.shape(value) for value in state.values()])
+    size = int(np.prod(shape))
+    out = np.empty(size)
+    if size <= chunk_size:
+        # Only one chunk, so query in this thread.
+        query(state, out.reshape(shape))
+        return out.reshape(shape)[()] if shape == () else out.reshape(shape)
+
+    # Flatten the state arrays. This copies only the arrays which are broadcast
+    # or not contiguous.
+    flat_state = {name: value if np.ndim(value) == 0 else np.broadcast_to(value, shape).reshape(-1)
+                  for name, value in state.items()}
+
+    def query_chunk(start):
+        stop = min(start + chunk_size, size)
+        chunk_state = {name: value if np.ndim(value) == 0 else value[start:stop]
+                       for name, value in flat_state.items()}
+        query(chunk_state, out[start:stop])
+
+    if executor is None:
+        executor = get_default_executor()
+    # Wait for every chunk, and re-raise the first error.
+    for future in [executor.submit(query_chunk, start) for start in range(0, size, chunk_size)]:
+        future.result()
+    return out.reshape(shape)
+
+
+def iter_chunks(state, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Split a query state into chunks along the first axis of its (broadcast) shape, without copying.
+
+    Slicing a memory-mapped state array only reads the slice, so the state arrays
+    may be larger than memory.
+
+    Arguments:
+        state (dict): The query state, as for `query_value`.
+        chunk_size (int): Number of points per chunk. A chunk has at least one row
+            (i.e. one index along the first axis), even if that is more points.
+
+    Yields:
+        slice: the rows of the query in the chunk (`...` if the query is a scalar).
+        dict: the state of the chunk. Scalars are passed to every chunk unchanged.
+
+    """
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be at least 1.')
+    shape = np.broadcast_shapes(*[np.shape(value) for value in state.values()])
+    if shape == ():
+        yield Ellipsis, state
+        return
+    rows = max(1, chunk_size // max(int(np.prod(shape[1:])), 1))
+    for start in range(0, shape[0], rows):
+        rows_slice = slice(start, min(start + rows, shape[0]))
+        yield rows_slice, {name: value if np.ndim(value) == 0
+                           else np.broadcast_to(value, shape)[rows_slice]
+                           for name, value in state.items()}
+
+
+def query_chunked(query, state, out=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Evaluate a query one chunk at a time, so that its temporary arrays have bounded size.
+
+    Arguments:
+        query (callable): `query(state, out)` writes the values at the points of
+            `state` into `out`, e.g. `lambda state, out: model.query_value(state, out=out)`.
+        state (dict): The query state, as for `query_value`. The state arrays may be
+            memory-mapped, see `iter_chunks`.
+        out (ndarray): Optional float array, with the broadcast shape of the state arrays,
+            into which the values are written. It may be memory-mapped (e.g. `np.memmap`
+            or `np.lib.format.open_memmap`), so that the memory used by the query does
+            not depend on the number of points.
+        chunk_size (int): Number of points per chunk.
+
+    Returns:
+        scalar or ndarray: the values. If `out` is given, returns `out`.
+
+    """
+    shape = np.broadcast_shapes(*[np.shape(value) for value in state.values()])
+    if out is None:
+        values = np.empty(shape)
+    else:
+        if out.shape != shape:
+            raise ValueError('out has shape {}, but the query has shape {}'.format(
+                out.shape, shape))
+        values = out
+    for rows_slice, chunk_state in iter_chunks(state, chunk_size):
+        query(chunk_state, values[rows_slice])
+    if out is None and shape == ():
+        return values[()]
+    return values
@@ -0,0 +1,141 @@
+"""Unit tests for batch."""
+import concurrent.futures
+import os.path
+import tempfile
+import tracemalloc
+import unittest
+import numpy as np
+
+from materials import load
+from materials.batch import iter_chunks, query_batch
+import materials.variation_with_state as vstate
+
+
+class TestQueryBatch(unittest.TestCase):
+    """Unit tests for query_batch."""
+
+    def setUp(self):
+        al6061 = load('Al_6061', 'extruded, thickness > 1 inch', 'T6')
+        self.prop = al6061['strength_tensile_ultimate']
+
+    def test_matches_query_value(self):
+        """Batch queries should give the same values as a single query."""
+        # Setup
+        rng = np.random.default_rng(0)
+        state = {'temperature': rng.uniform(30., 650., (50, 21)),
+                 'exposure time': rng.uniform(0.1, 1e4, 21)}
+
+        # Action
+        result = self.prop.query_value_batch(state, chunk_size=100)
+
+        # Verification
+        self.assertEqual(result.shape, (50, 21))
+        np.testing.assert_array_equal(result, self.prop.query_value(state))
+
+    def test_single_chunk(self):
+        """Queries of a single chunk, including scalar queries, should be evaluated directly."""
+        state = {'temperature': 300., 'exposure time': 10.}
+        self.assertEqual(self.prop.query_value_batch(state), self.prop.query_value(state))
+        state = {'temperature': [300., 400.], 'exposure time': 10.}
+        np.testing.assert_array_equal(self.prop.query_value_batch(state),
+                                      self.prop.query_value(state))
+
+    def test_errors(self):
+        """Errors in a chunk should be raised to the caller."""
+        def query(state, out):
+            raise ValueError('bad chunk')
+        with self.assertRaises(ValueError):
+            query_batch(query, {'temperature': np.arange(10.)}, chunk_size=3)
+        with self.assertRaises(ValueError):
+            query_batch(query, {'temperature': np.arange(10.)}, chunk_size=0)
+
+
+class TestQueryChunked(unittest.TestCase):
+    """Unit tests for query_chunked and iter_chunks."""
+
+    def setUp(self):
+        al6061 = load('Al_6061', 'extruded, thickness > 1 inch', 'T6')
+        self.prop = al6061['strength_tensile_ultimate']
+
+    def test_iter_chunks(self):
+        """Chunks should be views along the first axis, of at least one row."""
+        state = {'a': np.zeros((5, 3)), 'b': np.arange(3.), 'c': 1.}
+        chunks = list(iter_chunks(state, chunk_size=7))
+        self.assertEqual([rows for rows, _ in chunks], [slice(0, 2), slice(2, 4), slice(4, 5)])
+        self.assertEqual(chunks[0][1]['b'].shape, (2, 3))
+        self.assertTrue(np.shares_memory(chunks[1][1]['a'], state['a']))
+        self.assertEqual(chunks[0][1]['c'], 1.)
+        self.assertEqual(len(list(iter_chunks(state, chunk_size=1))), 5)
+
+    def test_matches_query_value(self):
+        """Chunked queries should give the same values as a single query."""
+        state = {'temperature': np.linspace(30., 650., 1001), 'exposure time': 10.}
+        result = self.prop.query_value_chunked(state, chunk_size=64)
+        np.testing.assert_array_equal(result, self.prop.query_value(state))
+        state = {'temperature': 300., 'exposure time': 10.}
+        self.assertEqual(self.prop.query_value_chunked(state), self.prop.query_value(state))
+
+    def test_memmap(self):
+        """Queries should read from and write to memory-mapped arrays."""
+        with tempfile.TemporaryDirectory() as tempdir:
+            temperature = np.lib.format.open_memmap(
+                os.path.join(tempdir, 'temperature.npy'), mode='w+', shape=(10000,))
+            temperature[:] = np.linspace(30., 650., 10000)
+            out = np.lib.format.open_memmap(
+                os.path.join(tempdir, 'out.npy'), mode='w+', shape=(10000,))
+            state = {'temperature': temperature, 'exposure time': 10.}
+            result = self.prop.query_value_chunked(state, out=out, chunk_size=1000)
+            self.assertIs(result, out)
+            np.testing.assert_array_equal(out, self.prop.query_value(state))
+            del temperature, out, result, state
+
+    def test_bounded_memory(self):
+        """The peak memory used by a chunked query should not depend on its length."""
+        # Setup
+        n = 2 * 10**6
+        state = {'temperature': np.linspace(30., 650., n), 'exposure time': np.full(n, 10.)}
+        out = np.empty(n)
+
+        # Action
+        tracemalloc.start()
+        self.prop.query_value_chunked(state, out=out, chunk_size=2**14)
+        _, chunked_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # Verification
+        self.assertLess(chunked_peak, out.nbytes / 4)
+
+    def test_stream(self):
+        """A stream of states should give a stream of values."""
+        states = ({'temperature': t, 'exposure time': 10.} for t in np.split(np.linspace(30., 650., 90), 3))
+        results = list(self.prop.query_value_stream(states))
+        self.assertEqual(len(results), 3)
+        np.testing.assert_array_equal(
+            np.concatenate(results),
+            self.prop.query_value({'temperature': np.linspace(30., 650., 90), 'exposure time': 10.}))
+
+
+class TestThreadSafety(unittest.TestCase):
+    """Queries from several threads at once should give the same results as serial queries."""
+
+    def test_asteval_equation(self):
+        """asteval procedures keep interpreter state, so each thread should have its own."""
+        # Setup
+        state_model = vstate.VariationWithStateEquation(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            't = temperature / 1000; value = t**2 + sqrt(t)', {'temperature': (0, 1000)},
+            compiled=False)
+        temperatures = np.linspace(1., 999., 200)
+        expected = [state_model.query_value({'temperature': t}) for t in temperatures]
+
+        # Action
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda t: state_model.query_value({'temperature': t}), temperatures))
+
+        # Verification
+        self.assertEqual(results, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
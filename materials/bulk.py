@@ -0,0 +1,136 @@
+"""Load every material in the database, in parallel."""
+import collections
+import collections.abc
+import concurrent.futures
+import os
+import time
+import numpy as np
+
+from materials.material import material_from_record
+from materials.path_magic import get_database_dir
+from materials.record_cache import load_record
+
+
+FileTiming = collections.namedtuple('FileTiming', ['parse_s', 'build_s', 'materials'])
+
+
+class MaterialCollection(collections.abc.Mapping):
+    """
+    A read-only dict of Materials, keyed by (name, form, condition).
+
+    Collections can be pickled, and merged with `merge` or the `|` operator.
+
+    Arguments:
+        materials (dict): Materials keyed by (name, form, condition), where name
+            is the record name (the YAML file name, less .yaml).
+        timings (dict): `FileTiming` for each record name: the time taken to parse the
+            record and to build its materials [units: second], and the number of materials.
+
+    """
+
+    def __init__(self, materials=None, timings=None):
+        self._materials = dict(materials or {})
+        self.timings = dict(timings or {})
+
+    def __getitem__(self, key):
+        return self._materials[key]
+
+    def __iter__(self):
+        return iter(self._materials)
+
+    def __len__(self):
+        return len(self._materials)
+
+    def names(self):
+        """Get the record names of the materials in the collection."""
+        return sorted({name for name, _, _ in self._materials})
+
+    def merge(self, other):
+        """Merge two collections.
+
+        Returns:
+            MaterialCollection: the materials and timings of both collections.
+                Where both have the same key, `other`'s is used.
+        """
+        materials = dict(self._materials)
+        materials.update(other._materials)  # pylint: disable=protected-access
+        timings = dict(self.timings)
+        timings.update(other.timings)
+        return MaterialCollection(materials, timings)
+
+    def __or__(self, other):
+        return self.merge(other)
+
+
+def load_file(filename, use_cache=True, table_dtype=np.double):
+    """
+    Load every form and condition of the material in one YAML file, and build all of their properties.
+
+    Arguments:
+        filename (string): Path to the YAML file containing the material data.
+        use_cache, table_dtype: See `load_from_yaml`.
+
+    Returns:
+        MaterialCollection
+
+    """
+    name = os.path.splitext(os.path.basename(filename))[0]
+    start = time.perf_counter()
+    record = load_record(filename, use_cache=use_cache)
+    parsed = time.perf_counter()
+    materials = {}
+    for form, form_dict in record['forms'].items():
+        # A form may be listed without any conditions (yet).
+        for condition in ((form_dict or {}).get('conditions') or {}):
+            matl = material_from_record(record, form, condition, filename, table_dtype)
+            # Build all of the properties now, rather than lazily on first access.
+            for property_name in matl.properties:
+                matl.properties[property_name]  # pylint: disable=pointless-statement
+            materials[(name, form, condition)] = matl
+    built = time.perf_counter()
+    return MaterialCollection(materials, {name: FileTiming(parsed - start, built - parsed, len(materials))})
+
+
+def load_all(directory=None, max_workers=None, executor=None, use_cache=True, table_dtype=np.double):
+    """
+    Load every form and condition of every material in the database.
+
+    Each YAML file is parsed, and its materials built, in a separate process.
+    The materials are pickled and sent back to this process.
+
+    Arguments:
+        directory (string): Directory containing the material YAML files.
+            Defaults to the package's database, `get_database_dir()`.
+        max_workers (int): Number of worker processes. Defaults to the number of CPUs.
+            If 1, the files are loaded in this process.
+        executor (concurrent.futures.Executor): Executor to load the files with,
+            instead of a new process pool.
+        use_cache, table_dtype: See `load_from_yaml`.
+
+    Returns:
+        MaterialCollection: all of the materials, and the time taken to load each file.
+
+    """
+    if directory is None:
+        directory = get_database_dir()
+    filenames = [os.path.join(directory, filename) for filename in sorted(os.listdir(directory))
+                 if filename.endswith('.yaml')]
+
+    collection = MaterialCollection()
+    if executor is None and max_workers == 1:
+        for filename in filenames:
+            collection = collection | load_file(filename, use_cache, table_dtype)
+        return collection
+
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [executor.submit(load_file, filename, use_cache, table_dtype)
+                   for filename in filenames]
+        for future in futures:
+            collection = collection | future.result()
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return collection
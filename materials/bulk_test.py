@@ -0,0 +1,58 @@
+"""Unit tests for bulk."""
+import pickle
+import unittest
+import numpy as np
+
+from materials import Database, Material
+from materials.bulk import MaterialCollection, load_all
+
+
+class TestLoadAll(unittest.TestCase):
+    """Unit tests for load_all."""
+
+    def test_load_all(self):
+        """Every form and condition should be loaded, in worker processes."""
+        # Setup
+        database = Database()
+        expected_keys = {(name, form, condition) for name in database.names()
+                         for form in database.forms(name)
+                         for condition in database.conditions(name, form)}
+
+        # Action
+        collection = load_all(max_workers=2)
+
+        # Verification
+        self.assertEqual(set(collection.keys()), expected_keys)
+        self.assertEqual(collection.names(), database.names())
+        self.assertEqual(set(collection.timings.keys()), set(database.names()))
+        self.assertEqual(sum(timing.materials for timing in collection.timings.values()),
+                         len(expected_keys))
+        matl = collection[('Al_6061', 'extruded, thickness > 1 inch', 'T6')]
+        self.assertEqual(type(matl), Material)
+        state = {'temperature': np.linspace(300., 600.), 'exposure time': 10.}
+        expected = database.load('Al_6061', 'extruded, thickness > 1 inch', 'T6')
+        np.testing.assert_array_equal(matl['strength_tensile_ultimate'].query_value(state),
+                                      expected['strength_tensile_ultimate'].query_value(state))
+
+    def test_pickle_merge(self):
+        """Collections should survive pickling, and merge."""
+        # Setup
+        collection = load_all(max_workers=1)
+        keys = list(collection.keys())
+        first = MaterialCollection({key: collection[key] for key in keys[:3]})
+        second = MaterialCollection({key: collection[key] for key in keys[3:]}, collection.timings)
+
+        # Action
+        merged = pickle.loads(pickle.dumps(first | second))
+
+        # Verification
+        self.assertEqual(list(merged.keys()), keys)
+        self.assertEqual(merged.timings, collection.timings)
+        copper = merged[('copper', 'wire', 'annealed')]
+        self.assertAlmostEqual(copper['heat_capacity'].query_value({'temperature': 300.}),
+                               collection[('copper', 'wire', 'annealed')]['heat_capacity'].query_value(
+                                   {'temperature': 300.}))
+
+
+if __name__ == '__main__':
+    unittest.main()
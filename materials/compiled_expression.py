@@ -0,0 +1,395 @@
+"""Compile variation with state equations to vectorized python functions."""
+import ast
+import keyword
+import sys
+import numpy as np
+
+
+# Names which a compiled expression may use, and the numpy objects they refer to.
+# These are the element-wise functions and constants of asteval's symbol table,
+# so an expression means the same thing whether it is compiled or run by asteval.
+ALLOWED_NAMES = {
+    'abs': np.abs,
+    'arccos': np.arccos, 'acos': np.arccos,
+    'arccosh': np.arccosh, 'acosh': np.arccosh,
+    'arcsin': np.arcsin, 'asin': np.arcsin,
+    'arcsinh': np.arcsinh, 'asinh': np.arcsinh,
+    'arctan': np.arctan, 'atan': np.arctan,
+    'arctan2': np.arctan2, 'atan2': np.arctan2,
+    'arctanh': np.arctanh, 'atanh': np.arctanh,
+    'ceil': np.ceil,
+    'clip': np.clip,
+    'cos': np.cos,
+    'cosh': np.cosh,
+    'deg2rad': np.deg2rad, 'radians': np.radians,
+    'exp': np.exp,
+    'exp2': np.exp2,
+    'expm1': np.expm1,
+    'floor': np.floor,
+    'fmax': np.fmax,
+    'fmin': np.fmin,
+    'hypot': np.hypot,
+    'log': np.log, 'ln': np.log,
+    'log10': np.log10,
+    'log1p': np.log1p,
+    'log2': np.log2,
+    'maximum': np.maximum,
+    'minimum': np.minimum,
+    'power': np.power, 'pow': np.power,
+    'rad2deg': np.rad2deg, 'degrees': np.degrees,
+    'sign': np.sign,
+    'sin': np.sin,
+    'sinh': np.sinh,
+    'sqrt': np.sqrt,
+    'square': np.square,
+    'tan': np.tan,
+    'tanh': np.tanh,
+    'where': np.where,
+    'e': np.e,
+    'pi': np.pi,
+}
+
+# Syntax tree nodes which a compiled expression may contain. There are no attribute
+# accesses, subscripts, imports, loops, function or class definitions, so the compiled
+# code cannot reach anything except the state variables and `ALLOWED_NAMES`.
+if sys.version_info < (3, 8):
+    # Python 3.7 parses numbers as ast.Num, rather than ast.Constant.
+    _NUMBER_NODES = (ast.Constant, ast.Num)
+else:
+    _NUMBER_NODES = (ast.Constant,)
+
+_ALLOWED_NODES = _NUMBER_NODES + (
+    ast.Module, ast.Assign, ast.Name, ast.Load, ast.Store,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UnaryOp, ast.UAdd, ast.USub,
+    ast.Compare, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq,
+    ast.Call,
+)
+
+
+def _constant_value(node):
+    """Get the value of a constant (`ast.Constant`, or `ast.Num` on Python 3.7) node."""
+    return node.value if isinstance(node, ast.Constant) else node.n
+
+
+class _Validator(ast.NodeVisitor):
+    """Check that an expression's syntax tree only uses the allowed subset of python."""
+
+    def __init__(self, arg_names):
+        self.defined_names = set(arg_names)
+
+    def generic_visit(self, node):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError('{:s} is not allowed in a compiled expression.'.format(
+                type(node).__name__))
+        ast.NodeVisitor.generic_visit(self, node)
+
+    def visit_Assign(self, node):  # pylint: disable=invalid-name
+        """Assignments must be to a single, new or state variable, name."""
+        if len(node.targets) != 1 or not isinstance(node.targets[0], ast.Name):
+            raise ValueError('Only assignments to a single name are allowed.')
+        # Visit the right hand side first, so that it cannot use the name it defines.
+        self.visit(node.value)
+        name = node.targets[0].id
+        if name in ALLOWED_NAMES or name.startswith('_'):
+            raise ValueError('Cannot assign to {:s}.'.format(name))
+        self.defined_names.add(name)
+
+    def visit_Name(self, node):  # pylint: disable=invalid-name
+        """Names must be state variables, already assigned, or in `ALLOWED_NAMES`."""
+        if node.id not in self.defined_names and node.id not in ALLOWED_NAMES:
+            raise ValueError('Unknown name {:s}.'.format(node.id))
+
+    def visit_Constant(self, node):  # pylint: disable=invalid-name
+        """Only numeric constants are allowed."""
+        value = _constant_value(node)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError('Only numeric constants are allowed.')
+
+    visit_Num = visit_Constant  # pylint: disable=invalid-name
+
+    def visit_Call(self, node):  # pylint: disable=invalid-name
+        """Only the functions in `ALLOWED_NAMES` may be called, with positional arguments."""
+        if not isinstance(node.func, ast.Name) or not callable(ALLOWED_NAMES.get(node.func.id)):
+            raise ValueError('Only the functions in ALLOWED_NAMES may be called.')
+        if node.keywords:
+            raise ValueError('Keyword arguments are not allowed.')
+        for arg in node.args:
+            self.visit(arg)
+
+
+class _FloatConstants(ast.NodeTransformer):
+    """Make integer constants floats, so `**` cannot build huge python integers."""
+
+    def visit_Constant(self, node):  # pylint: disable=invalid-name
+        """Replace an int constant with the equivalent float."""
+        return ast.copy_location(ast.Constant(value=float(_constant_value(node))), node)
+
+    visit_Num = visit_Constant  # pylint: disable=invalid-name
+
+
+def compile_expression(expression, arg_names):
+    """
+    Compile a (safe) expression for a property value into a python function.
+
+    The expression is parsed and checked against a whitelist: it may only contain
+    assignments, arithmetic and comparison operators, numeric constants, the names in
+    `arg_names`, and calls to the numpy functions in `ALLOWED_NAMES`. The checked
+    expression is compiled once into a native python code object, so evaluating it on
+    arrays runs at numpy speed.
+
+    Arguments:
+        expression (string): A python expression which assigns to `value`, e.g.\n
+            \t'value = 1.23 * temperature + 4.5 * temperature**2'
+        arg_names (list of string): Names of the function's arguments
+            (i.e. the state variables).
+
+    Returns:
+        callable: takes the `arg_names` as arguments and returns `value`.
+
+    Raises:
+        ValueError: if the expression uses anything not in the whitelist, or does not
+            assign to `value`.
+        SyntaxError: if the expression is not valid python.
+
+    """
+    for name in arg_names:
+        if (not name.isidentifier() or keyword.iskeyword(name)
+                or name in ALLOWED_NAMES or name.startswith('_')):
+            raise ValueError('{:s} cannot be used as an argument name.'.format(name))
+    tree = ast.parse(expression, mode='exec')
+    validator = _Validator(arg_names)
+    validator.visit(tree)
+    if 'value' not in validator.defined_names - set(arg_names):
+        raise ValueError('`expression` must assign to value.')
+    tree = _FloatConstants().visit(tree)
+
+    # Wrap the expression's statements in a function of `arg_names` which returns `value`.
+    module = ast.parse('def _compiled_expression({:s}):\n    return value'.format(
+        ', '.join(arg_names)))
+    module.body[0].body = tree.body + module.body[0].body
+    code = compile(ast.fix_missing_locations(module), '<expression>', 'exec')
+
+    namespace = dict(ALLOWED_NAMES)
+    namespace['__builtins__'] = {}
+    exec(code, namespace)  # pylint: disable=exec-used
+    return namespace['_compiled_expression']
+
+
+# Derivatives of the one-argument functions in `ALLOWED_NAMES`, as templates in terms of
+# the argument `{u}` and the function's value `{r}`. The derivative of f(u) is template * du.
+# Functions which are piecewise constant (e.g. floor) have zero derivative.
+_UNARY_DERIVATIVES = {
+    'abs': 'sign({u})',
+    'arccos': '-1. / sqrt(1. - {u}**2)', 'acos': '-1. / sqrt(1. - {u}**2)',
+    'arccosh': '1. / sqrt({u}**2 - 1.)', 'acosh': '1. / sqrt({u}**2 - 1.)',
+    'arcsin': '1. / sqrt(1. - {u}**2)', 'asin': '1. / sqrt(1. - {u}**2)',
+    'arcsinh': '1. / sqrt({u}**2 + 1.)', 'asinh': '1. / sqrt({u}**2 + 1.)',
+    'arctan': '1. / (1. + {u}**2)', 'atan': '1. / (1. + {u}**2)',
+    'arctanh': '1. / (1. - {u}**2)', 'atanh': '1. / (1. - {u}**2)',
+    'ceil': None,
+    'cos': '-sin({u})',
+    'cosh': 'sinh({u})',
+    'deg2rad': repr(float(np.pi / 180.)), 'radians': repr(float(np.pi / 180.)),
+    'exp': '{r}',
+    'exp2': '{r} * ' + repr(float(np.log(2.))),
+    'expm1': '({r} + 1.)',
+    'floor': None,
+    'log': '1. / {u}', 'ln': '1. / {u}',
+    'log10': '1. / ({u} * ' + repr(float(np.log(10.))) + ')',
+    'log1p': '1. / (1. + {u})',
+    'log2': '1. / ({u} * ' + repr(float(np.log(2.))) + ')',
+    'rad2deg': repr(float(180. / np.pi)), 'degrees': repr(float(180. / np.pi)),
+    'sign': None,
+    'sin': 'cos({u})',
+    'sinh': 'cosh({u})',
+    'sqrt': '0.5 / {r}',
+    'square': '2. * {u}',
+    'tan': '(1. + {r}**2)',
+    'tanh': '(1. - {r}**2)',
+}
+
+_BINARY_OPERATORS = {
+    ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/',
+    ast.FloorDiv: '//', ast.Mod: '%', ast.Pow: '**',
+}
+
+_COMPARE_OPERATORS = {
+    ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!=',
+}
+
+
+class _Differentiator:
+    """
+    Generate python source which evaluates an expression and its derivative (forward mode).
+
+    Each node of the expression's syntax tree is evaluated into a temporary variable, with
+    its derivative in a second temporary. Derivatives which are known to be zero are None,
+    so no code is generated for them.
+    """
+
+    def __init__(self, arg_names, wrt):
+        self.lines = []
+        # The name holding the derivative of each variable, or None if it is zero.
+        self.derivatives = {name: ('1.' if name == wrt else None) for name in arg_names}
+        self._n_temporaries = 0
+
+    def _temporary(self, source):
+        """Assign `source` to a new temporary variable, and return its name."""
+        name = '_t{:d}'.format(self._n_temporaries)
+        self._n_temporaries += 1
+        self.lines.append('{:s} = {:s}'.format(name, source))
+        return name
+
+    def statement(self, node):
+        """Generate the code for an assignment, and for the derivative of the assigned name."""
+        value, derivative = self.expression(node.value)
+        name = node.targets[0].id
+        self.lines.append('{:s} = {:s}'.format(name, value))
+        if derivative is None:
+            self.derivatives[name] = None
+        else:
+            self.lines.append('_d_{:s} = {:s}'.format(name, derivative))
+            self.derivatives[name] = '_d_' + name
+
+    def expression(self, node):
+        """Generate the code for an expression.
+
+        Returns:
+            string: python source for the value (a name or a constant).
+            string: python source for the derivative, or None if it is zero.
+        """
+        if isinstance(node, ast.Constant):
+            return repr(node.value), None
+        if isinstance(node, ast.Name):
+            # Names which are not variables are the constants in ALLOWED_NAMES.
+            return node.id, self.derivatives.get(node.id)
+        if isinstance(node, ast.UnaryOp):
+            u, du = self.expression(node.operand)
+            if isinstance(node.op, ast.UAdd):
+                return u, du
+            return self._temporary('-' + u), None if du is None else self._temporary('-' + du)
+        if isinstance(node, ast.BinOp):
+            u, du = self.expression(node.left)
+            v, dv = self.expression(node.right)
+            r = self._temporary('{:s} {:s} {:s}'.format(u, _BINARY_OPERATORS[type(node.op)], v))
+            return r, self._binary_derivative(type(node.op), u, du, v, dv, r)
+        if isinstance(node, ast.Compare):
+            terms = [self.expression(node.left)[0]]
+            for op, comparator in zip(node.ops, node.comparators):
+                terms += [_COMPARE_OPERATORS[type(op)], self.expression(comparator)[0]]
+            return self._temporary(' '.join(terms)), None
+        # Otherwise, it is a call of a function in ALLOWED_NAMES.
+        return self._call(node.func.id, [self.expression(arg) for arg in node.args])
+
+    def _sum(self, *terms):
+        """The sum of the terms which are not None, or None if they all are."""
+        terms = [term for term in terms if term is not None]
+        return self._temporary(' + '.join(terms)) if terms else None
+
+    def _binary_derivative(self, op, u, du, v, dv, r):
+        """Generate the derivative of `r = u op v`."""
+        if op in (ast.Add, ast.Sub):
+            if dv is None:
+                return du
+            dv = self._temporary('-' + dv) if op is ast.Sub else dv
+            return self._sum(du, dv)
+        if op is ast.Mult:
+            return self._sum(None if du is None else self._temporary('{:s} * {:s}'.format(du, v)),
+                             None if dv is None else self._temporary('{:s} * {:s}'.format(u, dv)))
+        if op is ast.Div:
+            return self._sum(None if du is None else self._temporary('{:s} / {:s}'.format(du, v)),
+                             None if dv is None else self._temporary(
+                                 '-{:s} * {:s} / {:s}'.format(r, dv, v)))
+        if op is ast.FloorDiv:
+            return None
+        if op is ast.Mod:
+            # u % v = u - floor(u / v) * v
+            return self._sum(du, None if dv is None else self._temporary(
+                '-floor({:s} / {:s}) * {:s}'.format(u, v, dv)))
+        # op is ast.Pow
+        return self._sum(
+            None if du is None else self._temporary('{0:s} * {1:s} ** ({0:s} - 1.) * {2:s}'.format(
+                v, u, du)),
+            None if dv is None else self._temporary('{:s} * log({:s}) * {:s}'.format(r, u, dv)))
+
+    def _call(self, func, args):
+        """Generate the code for a function call, and its derivative."""
+        r = self._temporary('{:s}({:s})'.format(func, ', '.join(u for u, _ in args)))
+        if func in _UNARY_DERIVATIVES:
+            (u, du), = args
+            template = _UNARY_DERIVATIVES[func]
+            if du is None or template is None:
+                return r, None
+            return r, self._temporary('{:s} * {:s}'.format(template.format(u=u, r=r), du))
+        if func in ('power', 'pow'):
+            (u, du), (v, dv) = args
+            return r, self._binary_derivative(ast.Pow, u, du, v, dv, r)
+        if all(du is None for _, du in args):
+            return r, None
+        zero = '0.'
+        if func in ('maximum', 'fmax', 'minimum', 'fmin'):
+            (u, du), (v, dv) = args
+            op = '>=' if func in ('maximum', 'fmax') else '<='
+            return r, self._temporary('where({:s} {:s} {:s}, {:s}, {:s})'.format(
+                u, op, v, du or zero, dv or zero))
+        if func == 'where':
+            (c, _), (_, du), (_, dv) = args
+            return r, self._temporary('where({:s}, {:s}, {:s})'.format(c, du or zero, dv or zero))
+        if func == 'clip':
+            (u, du), (lo, dlo), (hi, dhi) = args
+            return r, self._temporary('where({0:s} < {1:s}, {2:s}, where({0:s} > {3:s}, {4:s}, {5:s}))'.format(
+                u, lo, dlo or zero, hi, dhi or zero, du or zero))
+        if func == 'hypot':
+            (u, du), (v, dv) = args
+            return r, self._temporary('({:s} * {:s} + {:s} * {:s}) / {:s}'.format(
+                u, du or zero, v, dv or zero, r))
+        if func in ('arctan2', 'atan2'):
+            (y, dy), (x, dx) = args
+            return r, self._temporary('({0:s} * {1:s} - {2:s} * {3:s}) / ({0:s}**2 + {2:s}**2)'.format(
+                x, dy or zero, y, dx or zero))
+        raise ValueError('Cannot differentiate {:s}.'.format(func))
+
+
+def compile_derivative(expression, arg_names, wrt):
+    """
+    Compile an expression for a property value into a function which also returns its derivative.
+
+    The derivative is found by forward-mode automatic differentiation of the expression's
+    syntax tree, so the value and the derivative are computed in one vectorized pass.
+    The expression is checked as in `compile_expression`.
+
+    Arguments:
+        expression (string): A python expression which assigns to `value`, see `compile_expression`.
+        arg_names (list of string): Names of the function's arguments (i.e. the state variables).
+        wrt (string): The argument with respect to which the derivative is taken.
+
+    Returns:
+        callable: takes the `arg_names` as arguments and returns `value` and the derivative
+            of `value` with respect to `wrt`. The derivative is 0. if `value` does not depend
+            on `wrt`.
+
+    Raises:
+        ValueError: if the expression uses anything not in the whitelist, or does not
+            assign to `value`.
+        SyntaxError: if the expression is not valid python.
+
+    """
+    if wrt not in arg_names:
+        raise ValueError('{:s} is not an argument of the expression.'.format(wrt))
+    # Check the expression, and convert its constants to floats, as for compile_expression.
+    compile_expression(expression, arg_names)
+    tree = _FloatConstants().visit(ast.parse(expression, mode='exec'))
+
+    differentiator = _Differentiator(arg_names, wrt)
+    for node in tree.body:
+        differentiator.statement(node)
+    derivative = differentiator.derivatives['value'] or '0.'
+    source = 'def _compiled_derivative({:s}):\n{:s}\n    return value, {:s}'.format(
+        ', '.join(arg_names), '\n'.join('    ' + line for line in differentiator.lines), derivative)
+    code = compile(source, '<expression derivative>', 'exec')
+
+    namespace = dict(ALLOWED_NAMES)
+    namespace['__builtins__'] = {}
+    exec(code, namespace)  # pylint: disable=exec-used
+    return namespace['_compiled_derivative']
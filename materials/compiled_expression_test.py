@@ -0,0 +1,99 @@
+"""Unit tests for compiled_expression."""
+import unittest
+import numpy as np
+
+from materials.compiled_expression import compile_derivative, compile_expression
+
+
+class TestCompileExpression(unittest.TestCase):
+    """Unit tests for compile_expression."""
+
+    def test_scalar(self):
+        """Test a compiled expression of one variable at a scalar."""
+        function = compile_expression('value = 1 + temperature**2', ['temperature'])
+        self.assertEqual(function(2.), 5.)
+        self.assertEqual(function(temperature=2.), 5.)
+
+    def test_array(self):
+        """Test a multi-statement expression of two variables on arrays."""
+        function = compile_expression(
+            't = temperature / 1000; value = exp(t) + sqrt(pressure) * pi', ['temperature', 'pressure'])
+        temperature = np.array([100., 200.])
+        pressure = np.array([4., 9.])
+        result = function(temperature, pressure)
+        np.testing.assert_allclose(result, np.exp(temperature / 1000) + np.sqrt(pressure) * np.pi)
+
+    def test_where(self):
+        """Comparisons and `where` can be used for piecewise expressions."""
+        function = compile_expression(
+            'value = where(temperature < 300, 1, temperature / 300)', ['temperature'])
+        np.testing.assert_allclose(function(np.array([200., 600.])), [1., 2.])
+
+    def test_rejected(self):
+        """Expressions which are not in the whitelist should be rejected."""
+        bad_expressions = [
+            'value = 1; import os',
+            'value = temperature.__class__',
+            'value = open("file")',
+            'value = (lambda: 1)()',
+            'value = "a" * 3',
+            'value = [temperature][0]',
+            'exp = 1; value = exp',
+            'value = exp(temperature, out=temperature)',
+            'x = 1',
+            'value = y',
+        ]
+        for expression in bad_expressions:
+            with self.assertRaises(ValueError):
+                compile_expression(expression, ['temperature'])
+
+    def test_no_builtins(self):
+        """The compiled function should not have access to builtins."""
+        function = compile_expression('value = temperature', ['temperature'])
+        self.assertEqual(function.__globals__['__builtins__'], {})
+
+
+
+class TestCompileDerivative(unittest.TestCase):
+    """Unit tests for compile_derivative."""
+
+    def test_derivative(self):
+        """Derivatives should match central differences, for each supported construct."""
+        expressions = [
+            'value = 1.23 * temperature + 4.5 * temperature**2 - 6 / temperature',
+            't = temperature / 1000; value = exp(-t) * sqrt(temperature) + log10(temperature) % 0.3',
+            'value = where(temperature < 300, sin(temperature / 100), tanh(temperature / 400))',
+            'value = maximum(temperature, 350) + clip(temperature, 250, 450) + abs(400 - temperature)',
+            'value = power(temperature / 300, 1.5) + 2**(temperature / 300) + arctan2(temperature, 300)',
+            ('value = hypot(temperature, 300) + arctan(temperature / 300) + log1p(temperature)'
+             ' + floor(temperature / 1000)'),
+        ]
+        temperature = np.linspace(201., 599., 9)
+        step = 1e-4
+        for expression in expressions:
+            function = compile_derivative(expression, ['temperature'], 'temperature')
+            value, derivative = function(temperature)
+            np.testing.assert_allclose(value, compile_expression(expression, ['temperature'])(temperature))
+            central = (function(temperature + step)[0] - function(temperature - step)[0]) / (2 * step)
+            np.testing.assert_allclose(derivative, central, rtol=1e-6, atol=1e-9, err_msg=expression)
+
+    def test_partial(self):
+        """Partial derivatives of an expression of two variables."""
+        expression = 'value = temperature**2 * pressure + 3 * pressure'
+        self.assertEqual(
+            compile_derivative(expression, ['temperature', 'pressure'], 'temperature')(2., 5.), (35., 20.))
+        self.assertEqual(
+            compile_derivative(expression, ['temperature', 'pressure'], 'pressure')(2., 5.), (35., 7.))
+        # Independent of a variable.
+        self.assertEqual(compile_derivative('value = 2 * pressure', ['temperature', 'pressure'],
+                                            'temperature')(2., 5.), (10., 0.))
+
+    def test_rejected(self):
+        """Expressions are checked as for compile_expression."""
+        with self.assertRaises(ValueError):
+            compile_derivative('value = temperature.__class__', ['temperature'], 'temperature')
+        with self.assertRaises(ValueError):
+            compile_derivative('value = temperature', ['temperature'], 'pressure')
+
+if __name__ == '__main__':
+    unittest.main()
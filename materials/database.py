@@ -0,0 +1,126 @@
+"""An in-process registry of material records."""
+import os
+import threading
+import numpy as np
+
+from materials.material import material_from_record
+from materials.path_magic import get_database_dir
+from materials.record_cache import load_record
+
+
+def _record_name(name):
+    """Get a record name from a record or YAML file name."""
+    if name.endswith('.yaml'):
+        return name[:-len('.yaml')]
+    return name
+
+
+class Database:
+    """
+    A registry of the material records in a directory of YAML files.
+
+    `materials.load` parses a material's YAML file each time it is called,
+    so loading several forms or conditions of one material parses the file
+    several times. A Database parses each file once, the first time any of its
+    forms or conditions is loaded, and keeps the parsed record.
+
+    Arguments:
+        directory (string): Directory containing the material YAML files.
+            Defaults to the package's database, `get_database_dir()`.
+        memoize (bool): If True, also keep each Material which is loaded, and return
+            the same Material object for later loads of the same name, form and condition.
+        use_cache (bool): See `load_from_yaml`.
+        table_dtype: See `load_from_yaml`.
+
+    """
+
+    def __init__(self, directory=None, memoize=False, use_cache=True, table_dtype=np.double):
+        if directory is None:
+            directory = get_database_dir()
+        self.directory = directory
+        self.memoize = memoize
+        self.use_cache = use_cache
+        self.table_dtype = table_dtype
+        self._records = {}
+        self._materials = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        """Get the names of the material records in the database.
+
+        Returns:
+            list of string: record names, i.e. the YAML file names less .yaml.
+        """
+        return sorted(os.path.splitext(filename)[0] for filename in os.listdir(self.directory)
+                      if filename.endswith('.yaml'))
+
+    def get_record(self, name):
+        """Get the parsed record of a material, parsing its YAML file if needed.
+
+        Arguments:
+            name (string): name of the material record (e.g. yaml file name, less .yaml).
+
+        Returns:
+            dict: The parsed record.
+        """
+        name = _record_name(name)
+        with self._lock:
+            if name in self._records:
+                return self._records[name]
+        filename = os.path.join(self.directory, name + '.yaml')
+        if not os.path.isfile(filename):
+            raise ValueError(
+                'material "{:s}" not found in database.'.format(name)
+                + '\nAvailable materials are: {:s}'.format(str(self.names())))
+        record = load_record(filename, use_cache=self.use_cache)
+        with self._lock:
+            # If another thread parsed the record meanwhile, keep the first copy.
+            return self._records.setdefault(name, record)
+
+    def forms(self, name):
+        """Get the forms of a material which are in the database.
+
+        Returns:
+            list of string
+        """
+        return list(self.get_record(name)['forms'].keys())
+
+    def conditions(self, name, form):
+        """Get the conditions of a material's form which are in the database.
+
+        Returns:
+            list of string
+        """
+        forms = self.get_record(name)['forms']
+        if form not in forms:
+            raise ValueError('Form {:s} not present in {:s}'.format(form, name))
+        return list(((forms[form] or {}).get('conditions') or {}).keys())
+
+    def load(self, name, form, condition):
+        """Load a material.
+
+        Arguments:
+            name (string): name of the material record (e.g. yaml file name, less .yaml).
+            form : See `load_from_yaml`.
+            condition : See `load_from_yaml`.
+
+        Returns:
+            Material
+        """
+        key = (_record_name(name), form, condition)
+        if self.memoize:
+            with self._lock:
+                if key in self._materials:
+                    return self._materials[key]
+        matl = material_from_record(
+            self.get_record(name), form, condition, name, self.table_dtype)
+        if self.memoize:
+            with self._lock:
+                matl = self._materials.setdefault(key, matl)
+        return matl
+
+    def clear(self):
+        """Forget all parsed records and memoized materials."""
+        with self._lock:
+            self._records.clear()
+            self._materials.clear()
@@ -2,7 +2,7 @@
 import os.path
 import unittest
 import numpy as np
-from materials import Material, load
+from materials import Material, load, Database
 
 
 class TestAISI304(unittest.TestCase):
@@ -129,5 +129,65 @@ class TestAISI4130(unittest.TestCase):
         # TODO automate checking this
         print('\n' + str(aisi4130) + '\n')
 
+
+class TestDatabase(unittest.TestCase):
+    """Unit tests for Database."""
+
+    def test_load_all(self):
+        """Every form and condition in the database should load, parsing each record once."""
+        # Setup
+        database = Database()
+
+        # Action
+        for name in database.names():
+            for form in database.forms(name):
+                for condition in database.conditions(name, form):
+                    matl = database.load(name, form, condition)
+
+                    # Verification
+                    self.assertEqual(type(matl), Material)
+                    self.assertEqual((matl.form, matl.condition), (form, condition))
+            self.assertIs(database.get_record(name), database.get_record(name + '.yaml'))
+
+    def test_matches_load(self):
+        """Materials from a Database should match materials from `load`."""
+        # Setup
+        database = Database()
+        state = {'temperature': np.linspace(300., 600.)}
+
+        # Action
+        matl = database.load('AISI_316L', 'sheet', 'annealed')
+
+        # Verification
+        expected = load('AISI_316L', 'sheet', 'annealed')
+        np.testing.assert_array_equal(matl['youngs_modulus'].query_value(state),
+                                      expected['youngs_modulus'].query_value(state))
+
+    def test_memoize(self):
+        """With memoize, the same Material object should be returned for each load."""
+        # Setup
+        database = Database(memoize=True)
+
+        # Action
+        matl = database.load('Al_6061', 'extruded, thickness > 1 inch', 'T6')
+
+        # Verification
+        self.assertIs(database.load('Al_6061', 'extruded, thickness > 1 inch', 'T6'), matl)
+        self.assertIsNot(Database().load('Al_6061', 'extruded, thickness > 1 inch', 'T6'), matl)
+        database.clear()
+        self.assertIsNot(database.load('Al_6061', 'extruded, thickness > 1 inch', 'T6'), matl)
+
+    def test_bogus(self):
+        """Asking for a bogus material, form or condition should raise an error."""
+        database = Database()
+        with self.assertRaises(ValueError) as context:
+            database.load('bogus', 'a', 'b')
+        self.assertTrue('Available materials' in str(context.exception))
+        with self.assertRaises(ValueError):
+            database.load('Al_6061', 'a', 'b')
+        with self.assertRaises(ValueError):
+            database.conditions('Al_6061', 'a')
+
+
 if __name__ == '__main__':
     unittest.main()
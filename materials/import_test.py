@@ -0,0 +1,38 @@
+"""Tests to make sure `import materials` stays fast."""
+import subprocess
+import sys
+import unittest
+
+
+# Modules which are slow to import, and should only be imported when they are needed.
+HEAVY_MODULES = ['scipy', 'asteval', 'pkg_resources']
+
+
+def imported_modules(code):
+    """Run `code` in a new python process and get the heavy modules it imported."""
+    code += '\nimport sys\nprint(" ".join(m for m in {!r} if m in sys.modules))'.format(HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', code], check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return output.split()
+
+
+class TestImport(unittest.TestCase):
+    """Unit tests for the modules imported by `import materials`."""
+
+    def test_import(self):
+        """`import materials` should not import the heavy modules."""
+        self.assertEqual(imported_modules('import materials'), [])
+
+    def test_linear_table_query(self):
+        """Loading a material and querying its linear tables should not need scipy or asteval."""
+        code = '\n'.join([
+            'import materials',
+            "al6061 = materials.load('Al_6061', 'extruded, thickness > 1 inch', 'T6')",
+            "al6061['youngs_modulus'].query_value({'temperature': 300.})",
+            "al6061['strength_tensile_ultimate'].query_value({'temperature': 300., 'exposure time': 10.})",
+        ])
+        self.assertEqual(imported_modules(code), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,310 @@
+"""Export the whole database to one binary file, and load it by memory-mapping the file.
+
+Loading a material parses its YAML file (or its record cache entry, see
+`materials.record_cache`) and builds each of its interpolation tables, in every process
+which uses it. `export_database` does this once, and writes the built tables of every
+form and condition of every material into one file:
+
+    * 8 bytes: the magic string `MATLMMAP`.
+    * 8 bytes: the length of the header, as a little-endian unsigned integer.
+    * The header, as JSON. It lists each (material, form, condition), and each of its
+      properties and their state models. For each state model, it holds the model's
+      metadata, and the offset, dtype and shape of each of the model's arrays.
+    * The arrays, each aligned to 64 bytes.
+
+A `MappedDatabase` memory-maps the file (read-only) and reads the header. Each property
+is built the first time it is accessed, with its tables as views of the mapped file,
+so opening the database is fast, and all of the processes which open the same file
+share one copy of the tables in memory.
+
+e.g.::
+
+    export_database('materials.mmap')
+    # In each worker process:
+    database = MappedDatabase('materials.mmap')
+    matl = database[('Al_6061', 'extruded, thickness > 1 inch', 'T6')]
+"""
+import collections.abc
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import numpy as np
+
+from materials.bulk import load_all
+from materials.material import LazyProperties, Material, build_property
+import materials.variation_with_state as vstate
+
+
+# Increment this when the file layout changes, so that old files are rejected.
+MAPPED_FORMAT_VERSION = 2
+
+_MAGIC = b'MATLMMAP'
+_ALIGNMENT = 64
+
+
+def _model_metadata(model, arrays):
+    """
+    Describe a variation with state model as JSON-compatible metadata and a list of arrays.
+
+    Arguments:
+        model (VariationWithState): The model.
+        arrays (list of ndarray): The model's arrays are appended to this list,
+            and referred to in the metadata by their index in it.
+
+    Returns:
+        dict: the metadata.
+
+    """
+    def array(value):
+        arrays.append(np.ascontiguousarray(value))
+        return len(arrays) - 1
+
+    metadata = {
+        'state_vars': model.state_vars,
+        'state_vars_units': model.state_vars_units,
+        'value_type': model.value_type,
+        'reference': model.reference,
+    }
+    # pylint: disable=protected-access
+    if isinstance(model, vstate.VariationWithStateEquation):
+        metadata.update(kind='equation', expression=model.expression,
+                        state_domain={name: [float(x) for x in domain]
+                                      for name, domain in model.state_domain.items()})
+    elif isinstance(model, vstate.VariationWithStateSlicedTable):
+        metadata.update(kind='sliced table', interp_points=array(model._interp_points),
+                        interp_values=array(model._interp_values),
+                        slice_offsets=array(model._slice_offsets.astype(np.int64)),
+                        slice_keys=array(model._slice_keys),
+                        state_vars_interp_scales=model._state_vars_interp_scales)
+    elif isinstance(model, vstate.VariationWithStateTable):
+        metadata.update(kind='table', interp_points=array(model._interp_points),
+                        interp_values=array(model._interp_values),
+                        state_vars_interp_scales=model._state_vars_interp_scales)
+    elif isinstance(model, vstate.VariationWithStateUniformTable):
+        metadata.update(kind='uniform table', domain=model._domain,
+                        grid_values=array(model._grid_values),
+                        state_vars_interp_scales=model._state_vars_interp_scales)
+    elif isinstance(model, vstate.VariationWithStateGrid):
+        metadata.update(kind='grid', grid_points=[array(points) for points in model._grid_points],
+                        grid_values=array(model._grid_values),
+                        state_vars_interp_scales=model._state_vars_interp_scales)
+    else:
+        raise NotImplementedError('Cannot export {:s} models.'.format(type(model).__name__))
+    return metadata
+
+
+def _build_model(metadata, arrays):
+    """
+    Build a variation with state model from its metadata.
+
+    Arguments:
+        metadata (dict): See `_model_metadata`.
+        arrays (callable): Maps an array index in the metadata to the (memory-mapped) array.
+
+    Returns:
+        VariationWithState
+
+    """
+    args = (metadata['state_vars'], metadata['state_vars_units'], metadata['value_type'],
+            metadata['reference'])
+    kind = metadata['kind']
+    if kind == 'equation':
+        return vstate.VariationWithStateEquation(
+            *args, metadata['expression'],
+            {name: tuple(domain) for name, domain in metadata['state_domain'].items()})
+    scales = metadata['state_vars_interp_scales']
+    if kind == 'sliced table':
+        points = arrays(metadata['interp_points'])
+        return vstate.VariationWithStateSlicedTable(
+            *args, points, arrays(metadata['interp_values']), scales,
+            slice_offsets=arrays(metadata['slice_offsets']), dtype=points.dtype,
+            slice_keys=arrays(metadata['slice_keys']))
+    if kind == 'table':
+        points = arrays(metadata['interp_points'])
+        return vstate.VariationWithStateTable(
+            *args, points, arrays(metadata['interp_values']), scales, dtype=points.dtype)
+    if kind == 'uniform table':
+        values = arrays(metadata['grid_values'])
+        return vstate.VariationWithStateUniformTable(
+            *args, [tuple(domain) for domain in metadata['domain']], values, scales, dtype=values.dtype)
+    if kind == 'grid':
+        values = arrays(metadata['grid_values'])
+        return vstate.VariationWithStateGrid(
+            *args, [arrays(index) for index in metadata['grid_points']], values, scales,
+            dtype=values.dtype)
+    raise ValueError('Unknown model kind {:s}.'.format(kind))
+
+
+def _material_metadata(key, matl, arrays):
+    """Describe a material, and all of its properties, as JSON-compatible metadata."""
+    properties = {}
+    for property_name in matl.properties:
+        prop = matl.properties[property_name]
+        prop_metadata = {'default_value': prop.default_value, 'units': prop.units,
+                         'reference': prop.reference}
+        if hasattr(prop, 'variations_with_state'):
+            prop_metadata['variations_with_state'] = {
+                state_model: _model_metadata(model, arrays)
+                for state_model, model in prop.variations_with_state.items()}
+        properties[property_name] = prop_metadata
+    return {
+        'key': list(key),
+        'name': matl.name,
+        'category': matl.category,
+        'subcategory': matl.subcategory,
+        'references': matl.references,
+        'elemental_composition': matl.elemental_composition,
+        'properties': properties,
+    }
+
+
+def _to_json(obj):
+    """Convert the numpy arrays and scalars of a parsed record (e.g. from the record cache) for JSON."""
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError('{:s} cannot be stored in a mapped database.'.format(type(obj).__name__))
+
+
+def export_database(filename, directory=None, table_dtype=np.double, use_cache=True):
+    """
+    Write every form and condition of every material in the database to one binary file.
+
+    Arguments:
+        filename (string): The file to write. It is written to a temporary file and then
+            moved into place, so that processes which open it concurrently never see a
+            partial file.
+        directory (string): Directory containing the material YAML files.
+            Defaults to the package's database, `get_database_dir()`.
+        table_dtype: Floating point type in which the tables are stored, see `load_from_yaml`.
+        use_cache: See `load_from_yaml`.
+
+    Returns:
+        int: the size of the file, in bytes.
+
+    """
+    collection = load_all(directory, max_workers=1, use_cache=use_cache, table_dtype=table_dtype)
+    arrays = []
+    materials = [_material_metadata(key, collection[key], arrays) for key in sorted(collection)]
+
+    # The array offsets depend on the header's length, and vice versa, so lay out the
+    # arrays relative to the start of the data, which is aligned after the header.
+    layout = []
+    size = 0
+    for array in arrays:
+        layout.append({'offset': size, 'dtype': array.dtype.str, 'shape': list(array.shape)})
+        size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+    header = json.dumps({'version': MAPPED_FORMAT_VERSION, 'arrays': layout, 'materials': materials},
+                        default=_to_json).encode('utf-8')
+    data_start = -(-(len(_MAGIC) + 8 + len(header)) // _ALIGNMENT) * _ALIGNMENT
+
+    directory_name = os.path.dirname(os.path.abspath(filename))
+    fd, temp_filename = tempfile.mkstemp(dir=directory_name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(_MAGIC + struct.pack('<Q', len(header)) + header)
+            for array, array_layout in zip(arrays, layout):
+                temp_file.write(b'\0' * (data_start + array_layout['offset'] - temp_file.tell()))
+                temp_file.write(array.tobytes())
+            temp_file.write(b'\0' * (data_start + size - temp_file.tell()))
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.remove(temp_filename)
+        raise
+    return data_start + size
+
+
+class _MappedProperties(LazyProperties):
+    """A read-only dict of Property, built on first access from a `MappedDatabase`."""
+
+    def __init__(self, properties_metadata, arrays):
+        LazyProperties.__init__(self, properties_metadata)
+        self._arrays = arrays
+
+    def _build(self, key):
+        metadata = dict(self._properties_dict_yaml[key])
+        if 'variations_with_state' in metadata:
+            metadata['variations_with_state'] = {
+                state_model: _build_model(model_metadata, self._arrays)
+                for state_model, model_metadata in metadata['variations_with_state'].items()}
+        return build_property(key, metadata)
+
+
+class MappedDatabase(collections.abc.Mapping):
+    """
+    A read-only dict of every material in a file written by `export_database`, keyed by
+    (name, form, condition), where name is the record name (the YAML file name, less .yaml).
+
+    The file is memory-mapped, read-only. Each material's properties are built the first
+    time they are accessed, and their tables are views of the mapped file, which are
+    shared by every process which maps the same file.
+
+    A MappedDatabase can be pickled (e.g. to send it to worker processes): the
+    unpickled copy maps the file again.
+
+    Arguments:
+        filename (string): The file written by `export_database`.
+
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as mapped_file:
+            self._mmap = mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(_MAGIC)] != _MAGIC:
+            raise ValueError('{:s} is not a mapped materials database.'.format(filename))
+        header_length, = struct.unpack('<Q', self._mmap[len(_MAGIC):len(_MAGIC) + 8])
+        header_start = len(_MAGIC) + 8
+        header = json.loads(self._mmap[header_start:header_start + header_length].decode('utf-8'))
+        if header['version'] != MAPPED_FORMAT_VERSION:
+            raise ValueError('{:s} has format version {}, but version {:d} is needed.'.format(
+                filename, header['version'], MAPPED_FORMAT_VERSION))
+        self._data_start = -(-(header_start + header_length) // _ALIGNMENT) * _ALIGNMENT
+        self._layout = header['arrays']
+        self._records = {tuple(record['key']): record for record in header['materials']}
+        self._materials = {}
+        self._lock = threading.Lock()
+
+    def _array(self, index):
+        """Get array `index` of the file, as a read-only view of the mapped file."""
+        layout = self._layout[index]
+        dtype = np.dtype(layout['dtype'])
+        shape = tuple(layout['shape'])
+        return np.frombuffer(self._mmap, dtype=dtype, count=int(np.prod(shape)),
+                             offset=self._data_start + layout['offset']).reshape(shape)
+
+    def __getitem__(self, key):
+        key = tuple(key)
+        if key not in self._materials:
+            record = self._records[key]
+            form, condition = key[1], key[2]
+            matl = Material(record['name'], form, condition, record['category'],
+                            record['subcategory'], record['references'],
+                            elemental_composition=record['elemental_composition'])
+            matl.properties = _MappedProperties(record['properties'], self._array)
+            with self._lock:
+                self._materials.setdefault(key, matl)
+        return self._materials[key]
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def names(self):
+        """Get the record names of the materials in the database."""
+        return sorted({name for name, _, _ in self._records})
+
+    @property
+    def nbytes(self):
+        """Size of the mapped file, in bytes."""
+        return len(self._mmap)
+
+    def __getstate__(self):
+        return {'filename': self.filename}
+
+    def __setstate__(self, state):
+        self.__init__(state['filename'])
@@ -0,0 +1,90 @@
+"""Unit tests for mapped_database."""
+import os
+import pickle
+import tempfile
+import unittest
+import numpy as np
+
+from materials import Material
+from materials.bulk import load_all
+from materials.mapped_database import MappedDatabase, export_database
+
+
+class TestMappedDatabase(unittest.TestCase):
+    """Unit tests for export_database and MappedDatabase."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'materials.mmap')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip(self):
+        """Every model of every material should give the same values after export."""
+        # Setup
+        collection = load_all(max_workers=1)
+
+        # Action
+        size = export_database(self.filename)
+        database = MappedDatabase(self.filename)
+
+        # Verification
+        self.assertEqual(size, os.path.getsize(self.filename))
+        self.assertEqual(database.nbytes, size)
+        self.assertEqual(set(database.keys()), set(collection.keys()))
+        self.assertEqual(database.names(), collection.names())
+        for key, expected in collection.items():
+            matl = database[key]
+            self.assertEqual(type(matl), Material)
+            self.assertEqual(matl.name, expected.name)
+            self.assertEqual(list(matl.properties), list(expected.properties))
+            for property_name in expected.properties:
+                expected_prop = expected.properties[property_name]
+                prop = matl.properties[property_name]
+                self.assertEqual(prop.default_value, expected_prop.default_value)
+                for state_model, expected_model in getattr(expected_prop, 'variations_with_state', {}).items():
+                    model = prop.variations_with_state[state_model]
+                    self.assertEqual(type(model), type(expected_model))
+                    domain = expected_model.get_state_domain()
+                    state = dict(zip(expected_model.state_vars, np.meshgrid(
+                        *[np.linspace(float(domain[name][0]), float(domain[name][1]), 9)
+                          for name in expected_model.state_vars], indexing='ij')))
+                    np.testing.assert_array_equal(model.query_value(state),
+                                                  expected_model.query_value(state))
+
+    def test_shared_tables(self):
+        """The tables should be read-only views of the mapped file, and survive pickling."""
+        # Setup
+        export_database(self.filename, table_dtype=np.float32)
+        key = ('Al_6061', 'extruded, thickness > 1 inch', 'T6')
+        state = {'temperature': np.linspace(300., 600.), 'exposure time': 10.}
+
+        # Action
+        database = MappedDatabase(self.filename)
+        model = database[key]['strength_tensile_ultimate'].variations_with_state['thermal']
+        copy = pickle.loads(pickle.dumps(database))
+
+        # Verification
+        # pylint: disable=protected-access
+        self.assertEqual(model._interp_values.dtype, np.float32)
+        self.assertFalse(model._interp_values.flags.writeable)
+        self.assertFalse(model._interp_values.flags.owndata)
+        # The sliced tables' search keys are shared too, rather than rebuilt in each process.
+        self.assertFalse(model._slice_keys.flags.writeable)
+        self.assertFalse(model._slice_keys.flags.owndata)
+        self.assertIs(database[key], database[key])
+        np.testing.assert_array_equal(
+            copy[key]['strength_tensile_ultimate'].query_value(state),
+            database[key]['strength_tensile_ultimate'].query_value(state))
+
+    def test_not_mapped_database(self):
+        """Opening a file which was not written by export_database should raise a ValueError."""
+        with open(self.filename, 'wb') as bad_file:
+            bad_file.write(b'not a database, but long enough to map')
+        with self.assertRaises(ValueError):
+            MappedDatabase(self.filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
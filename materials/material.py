@@ -1,27 +1,105 @@
 """Representation of a material's engineering properties and other data."""
-import codecs
-import yaml
-import pkg_resources
+import collections.abc
+import contextlib
+import os
+import threading
+import numpy as np
+from materials.path_magic import get_database_dir
 from materials.property import Property, StateDependentProperty
+from materials.record_cache import load_record
+import materials.variation_with_state as vstate
 
 
-def build_properties(properties_dict_yaml):
+def build_property(property_name, property_dict, table_dtype=np.double):
+    """Create a Property from a (YAML-derived) dictionary.
+
+    Arguments:
+        property_name (string): Name of the property.
+        property_dict (dict): The property's data, derived from a YAML file.
+        table_dtype: Floating point type in which tables are stored, see
+            `VariationWithStateTable`.
+
+    Returns:
+        Property: a StateDependentProperty if the property has `variations_with_state`,
+            otherwise a Property.
+    """
+    if 'variations_with_state' in property_dict:
+        return StateDependentProperty(property_name, property_dict, table_dtype=table_dtype)
+    # TODO check that the property was properly constructed.
+    return Property(property_name, property_dict)
+
+
+class LazyProperties(collections.abc.Mapping):
+    """A read-only dict of Property, which builds each property the first time it is accessed.
+
+    Building a state-dependent property builds all of its interpolation tables,
+    so building only the properties which are used makes loading faster.
+
+    Arguments:
+        properties_dict_yaml (dict): A dict of material property data derived from a YAML file.
+        table_dtype: See `build_property`.
+    """
+
+    def __init__(self, properties_dict_yaml, table_dtype=np.double):
+        self._properties_dict_yaml = properties_dict_yaml
+        self._table_dtype = table_dtype
+        self._properties = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        if key not in self._properties:
+            # Build the property outside of the lock, but if several threads build
+            # it at once, make sure they all get the same Property object.
+            prop = self._build(key)
+            with self._lock:
+                self._properties.setdefault(key, prop)
+        return self._properties[key]
+
+    def __contains__(self, key):
+        return key in self._properties_dict_yaml
+
+    def __iter__(self):
+        return iter(self._properties_dict_yaml)
+
+    def __len__(self):
+        return len(self._properties_dict_yaml)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def is_built(self, key):
+        """Check if property `key` has been built yet."""
+        return key in self._properties
+
+    def _build(self, key):
+        """Build property `key`."""
+        return build_property(key, self._properties_dict_yaml[key], table_dtype=self._table_dtype)
+
+
+def build_properties(properties_dict_yaml, lazy=False, table_dtype=np.double):
     """Create a dict of Property from a (YAML-derived) dictionary.
 
     Arguments:
         properties_dict_yaml (dict): A dict of material property data derived from a YAML file.
+        lazy (bool): If True, return a `LazyProperties`, which builds each property
+            the first time it is accessed.
+        table_dtype: See `build_property`.
 
     Returns:
         properties_dict_py (dict): keys are property name strings, values are Property objects.
     """
+    if lazy:
+        return LazyProperties(properties_dict_yaml, table_dtype=table_dtype)
     properties_dict_py = {}  # Dictionary of properties as python objects
     for property_name, property_dict in properties_dict_yaml.items():
-        if 'variations_with_state' in property_dict:
-            prop = StateDependentProperty(property_name, property_dict)
-        else:
-            prop = Property(property_name, property_dict)
-        # TODO check that the property was properly constructed.
-        properties_dict_py[property_name] = prop
+        properties_dict_py[property_name] = build_property(
+            property_name, property_dict, table_dtype=table_dtype)
     return properties_dict_py
 
 
@@ -29,7 +107,8 @@ class Material:
     """An engineering material, in a particular form and condition."""
 
     def __init__(self, name, form=None, condition=None, category=None, subcategory=None,
-                 references=None, properties_dict=None, elemental_composition=None):
+                 references=None, properties_dict=None, elemental_composition=None,
+                 table_dtype=np.double):
         """Create a Material.
 
         We don't recommend using this function directly, instead use
@@ -54,8 +133,11 @@ class Material:
             references (list of string): References from which the material property data was gathered.
                 Each string in the list should be a bibtex entry for one reference.
             properties_dict (dict): A dict of material property data derived from a YAML file.
+                Each property is built the first time it is accessed.
             elemental_composition (dict): A dict of material's elemental composition, as [min, max]
                 percent by mass.
+            table_dtype: Floating point type in which the properties' interpolation tables
+                are stored. `np.float32` halves the tables' memory, see `VariationWithStateTable`.
 
         References:
             [1] Richard C Rice and Jana L Jackson and John Bakuckas and Steven Thompson,
@@ -79,7 +161,7 @@ class Material:
                         + 'min = {:.3f} %, max = {:.3f} %'.format(*limits))
 
         if properties_dict is not None:
-            self.properties = build_properties(properties_dict)
+            self.properties = build_properties(properties_dict, lazy=True, table_dtype=table_dtype)
 
     def __getitem__(self, key):
         """Get a property of the material by name.
@@ -96,10 +178,120 @@ class Material:
         if key not in self.properties:
             raise KeyError(
                 'This Material does not have a {:s} property'.format(key)
-                + '\nThe valid keys are {}'.format(self.properties.keys())
+                + '\nThe valid keys are {}'.format(list(self.properties.keys()))
             )
         return self.properties[key]
 
+    def query_many(self, property_names, state, state_models=None, structured=False):
+        """Query several properties of the material at the same state.
+
+        The state is converted to float arrays (and, where a table needs it, to log scale)
+        once, and shared between all of the property queries.
+
+        Arguments:
+            property_names (list of string): Names of the properties to query.
+            state (dict): The state at which to query the values,
+                see `StateDependentProperty.query_value`.
+            state_models (dict): Optional, the name of the variation with state model
+                to use for each property. Properties not in `state_models` use their
+                default state model.
+            structured (bool): If True, return a numpy structured array with one
+                (float) field per property. Otherwise return a dict.
+
+        Returns:
+            dict or structured ndarray: The value(s) of each property at the provided
+                state(s), keyed by property name. Properties which do not depend on state
+                have their default value.
+        """
+        if state_models is None:
+            state_models = {}
+        properties = [self[name] for name in property_names]
+        state = vstate.PreparedState(state)
+        shape = np.broadcast_shapes(*[np.shape(value) for value in state.values()])
+
+        if structured:
+            values = np.empty(shape, dtype=[(name, np.double) for name in property_names])
+        else:
+            values = {}
+        for name, prop in zip(property_names, properties):
+            is_state_dependent = isinstance(prop, StateDependentProperty)
+            if structured and is_state_dependent:
+                model = prop.variations_with_state[state_models.get(name) or prop.default_state_model]
+                model_shape = np.broadcast_shapes(
+                    *[np.shape(state[var_name]) for var_name in model.state_vars if var_name in state])
+                if model_shape == shape:
+                    prop.query_value(state, state_models.get(name), out=values[name])
+                else:
+                    # The property ignores some of the state's arrays, so its values are
+                    # broadcast into the field.
+                    values[name][...] = prop.query_value(state, state_models.get(name))
+            elif is_state_dependent:
+                values[name] = prop.query_value(state, state_models.get(name))
+            else:
+                values[name] = prop.query_value()
+        return values
+
+    def enable_stats(self, property_names=None):
+        """Record statistics on the queries of the material's state-dependent properties.
+
+        See `StateDependentProperty.enable_stats`.
+
+        Arguments:
+            property_names (list of string): Names of the properties to record statistics for.
+                Defaults to all of the state-dependent properties (which builds all of them).
+        """
+        if property_names is None:
+            property_names = list(self.properties.keys())
+        for name in property_names:
+            prop = self[name]
+            if isinstance(prop, StateDependentProperty):
+                prop.enable_stats()
+
+    def disable_stats(self):
+        """Stop recording query statistics, and discard them."""
+        for prop in self._built_properties():
+            if isinstance(prop, StateDependentProperty):
+                prop.disable_stats()
+
+    def stats(self):
+        """Get the query statistics of the properties which are recording them.
+
+        Returns:
+            dict: for each property name, a dict of `StatsInfo` keyed by state model.
+        """
+        return {prop.name: prop.stats() for prop in self._built_properties()
+                if isinstance(prop, StateDependentProperty) and prop.stats() is not None}
+
+    @contextlib.contextmanager
+    def collect_stats(self, property_names=None):
+        """Context manager which records query statistics within a block.
+
+        e.g.\n
+            \twith matl.collect_stats() as stats:\n
+            \t    run_analysis(matl)\n
+            \tprint(stats['youngs_modulus']['thermal'].p99_s)\n
+
+        Arguments:
+            property_names (list of string): See `enable_stats`.
+
+        Returns:
+            dict: filled with the result of `stats()` when the block exits.
+        """
+        results = {}
+        self.enable_stats(property_names)
+        try:
+            yield results
+        finally:
+            results.update(self.stats())
+            self.disable_stats()
+
+    def _built_properties(self):
+        """Get the properties which have been built (see `LazyProperties`)."""
+        if isinstance(self.properties, LazyProperties):
+            return [self.properties[name] for name in self.properties
+                    if self.properties.is_built(name)]
+        return list(self.properties.values())
+
     def elements_table_str(self):
         """Create (as a string) a table of the elemental composition data."""
         ELEM_IND = 0
@@ -131,35 +323,29 @@ class Material:
         return string
 
 
-def load(name, form, condition):
-    """Load a material.
+def material_from_record(matl_dict, form, condition, source, table_dtype=np.double):
+    """Create a Material from a parsed material record.
 
     Arguments:
-        name (string): name of the material record (e.g. yaml file name, less .yaml).
+        matl_dict (dict): The material record, parsed from a YAML file.
         form : See `load_from_yaml`.
         condition : See `load_from_yaml`.
-    """
-    resource_name = 'materials_data/' + name
-    if '.yaml' not in resource_name:
-        resource_name += '.yaml'
-    if not pkg_resources.resource_exists('materials', resource_name):
-        avail_matls = [s.strip('.yaml') for s in
-                       pkg_resources.resource_listdir('materials', 'materials_data')]
-        raise ValueError(
-            'material "{:s}" not found in database.'.format(name)
-            + '\nAvailable materials are: {:s}'.format(str(avail_matls)))
-    utf8_reader = codecs.getreader('utf-8')
-    with utf8_reader(pkg_resources.resource_stream('materials', resource_name)) as yaml_stream:
-        matl_dict = yaml.full_load(yaml_stream)
+        source (string): Name of the record or file, for error messages.
+        table_dtype : See `load_from_yaml`.
 
+    Returns:
+        Material
+    """
     # Check that the reqested form and condition are present
     if not form in matl_dict['forms']:
-        raise ValueError('Form {:s} not present in {:s}'.format(form, name))
-    if not condition in matl_dict['forms'][form]['conditions']:
+        raise ValueError('Form {:s} not present in {:s}'.format(form, source))
+    # A form may be listed without any conditions (yet), e.g. `forged:` with no data.
+    conditions = (matl_dict['forms'][form] or {}).get('conditions') or {}
+    if not condition in conditions:
         raise ValueError('Condition {:s} not present in {:s}, {:s}'.format(
-            condition, form, name))
+            condition, form, source))
 
-    matl_name = matl_dict['name']
+    name = matl_dict['name']
     category = matl_dict['category']
     if 'subcategory' in matl_dict:
         subcategory = matl_dict['subcategory']
@@ -168,15 +354,40 @@ def load(name, form, condition):
     references = matl_dict['references']
     elemental_composition = matl_dict['elemental_composition']
 
-    properties_dict = matl_dict['forms'][form]['conditions'][condition]['properties']
+    properties_dict = conditions[condition]['properties']
 
-    matl = Material(matl_name, form, condition, category, subcategory,
-                    references, properties_dict, elemental_composition)
+    matl = Material(name, form, condition, category, subcategory,
+                    references, properties_dict, elemental_composition, table_dtype)
 
     return matl
 
 
-def load_from_yaml(filename, form, condition):
+def load(name, form, condition, use_cache=True, table_dtype=np.double):
+    """Load a material.
+
+    Arguments:
+        name (string): name of the material record (e.g. yaml file name, less .yaml).
+        form : See `load_from_yaml`.
+        condition : See `load_from_yaml`.
+        use_cache : See `load_from_yaml`.
+        table_dtype : See `load_from_yaml`.
+    """
+    resource_name = name
+    if '.yaml' not in resource_name:
+        resource_name += '.yaml'
+    data_dir = get_database_dir()
+    filename = os.path.join(data_dir, resource_name)
+    if not os.path.isfile(filename):
+        avail_matls = sorted(f[:-len('.yaml')] for f in os.listdir(data_dir) if f.endswith('.yaml'))
+        raise ValueError(
+            'material "{:s}" not found in database.'.format(name)
+            + '\nAvailable materials are: {:s}'.format(str(avail_matls)))
+    matl_dict = load_record(filename, use_cache=use_cache)
+
+    return material_from_record(matl_dict, form, condition, name, table_dtype)
+
+
+def load_from_yaml(filename, form, condition, use_cache=True, table_dtype=np.double):
     """Load a material from a YAML file.
 
     Arguments:
@@ -192,32 +403,17 @@ def load_from_yaml(filename, form, condition):
             these designations are described in MMPDS or the relevant materials standards.
             The condition can effect some properties of the material.
             Must be a key in the `conditions` section of the YAML file for the given form.
+        use_cache (bool): If True, keep a binary copy of the parsed YAML file in the
+            record cache (see `materials.record_cache`), and use it on later loads
+            while the YAML file is unchanged.
+        table_dtype: Floating point type in which the interpolation tables are stored.
+            `np.float32` halves the tables' memory, and rounds the table data to about
+            7 significant figures; queries are still computed in double precision.
+            Use `materials.storage_precision.compare_storage_precision` to check the effect.
 
     Returns:
         Material
     """
-    with open(filename, 'r') as yaml_stream:
-        matl_dict = yaml.full_load(yaml_stream)
-
-    # Check that the reqested form and condition are present
-    if not form in matl_dict['forms']:
-        raise ValueError('Form {:s} not present in {:s}'.format(form, filename))
-    if not condition in matl_dict['forms'][form]['conditions']:
-        raise ValueError('Condition {:s} not present in {:s}, {:s}'.format(
-            condition, form, filename))
-
-    name = matl_dict['name']
-    category = matl_dict['category']
-    if 'subcategory' in matl_dict:
-        subcategory = matl_dict['subcategory']
-    else:
-        subcategory = None
-    references = matl_dict['references']
-    elemental_composition = matl_dict['elemental_composition']
-
-    properties_dict = matl_dict['forms'][form]['conditions'][condition]['properties']
+    matl_dict = load_record(filename, use_cache=use_cache)
 
-    matl = Material(name, form, condition, category, subcategory,
-                    references, properties_dict, elemental_composition)
-
-    return matl
+    return material_from_record(matl_dict, form, condition, filename, table_dtype)
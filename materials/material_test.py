@@ -62,6 +62,53 @@ class TestBuildProperties(unittest.TestCase):
         self.assertEqual(result, 4. * dv)
 
 
+class TestLazyProperties(unittest.TestCase):
+    """Unit tests for LazyProperties."""
+
+    def test_lazy(self):
+        """Properties should be built when they are first accessed."""
+        # Setup
+        yaml_dict = {
+            'density': {
+                'default_value': 1000.,
+                'units': 'kg m^-3',
+                'reference': 'mmpds'
+            },
+            'strength': {
+                'default_value': 2.,
+                'units': 'MPa',
+                'reference': 'mmpds',
+                'variations_with_state': {
+                    'thermal': {
+                        'state_vars': ['temperature'],
+                        'state_vars_units': {'temperature': 'kelvin'},
+                        'value_type': 'multiplier',
+                        'representation': 'table',
+                        'reference': 'mmpds',
+                        'temperature': np.arange(4),
+                        'values': np.arange(4) ** 2,
+                    }
+                }
+            }
+        }
+
+        # Action
+        properties = build_properties(yaml_dict, lazy=True)
+
+        # Verification
+        self.assertEqual(len(properties), 2)
+        self.assertIn('strength', properties)
+        self.assertNotIn('fish', properties)
+        self.assertFalse(properties.is_built('strength'))
+        self.assertEqual(properties['density'].query_value(), 1000.)
+        self.assertFalse(properties.is_built('strength'))
+        self.assertIs(properties['density'], properties['density'])
+        self.assertEqual(properties['strength'].query_value({'temperature': 2}), 8.)
+        self.assertTrue(properties.is_built('strength'))
+        with self.assertRaises(KeyError):
+            properties['fish']  # pylint: disable=pointless-statement
+
+
 class TestMaterial(unittest.TestCase):
     """Unit tests for Material class."""
 
@@ -102,6 +149,61 @@ class TestMaterial(unittest.TestCase):
         # Verification
         self.assertTrue(issubclass(type(prop), Property))
 
+    def test_query_many(self):
+        """Unit test for query_many."""
+        # Setup
+        al6061 = load('Al_6061', 'extruded, thickness > 1 inch', 'T6')
+        names = ['youngs_modulus', 'strength_tensile_ultimate', 'solidus_temperature']
+        state = {'temperature': np.linspace(100., 500.), 'exposure time': 10.}
+
+        # Action
+        values = al6061.query_many(names, state)
+        values_structured = al6061.query_many(names, state, structured=True)
+
+        # Verification
+        for name in names[:2]:
+            expected = al6061[name].query_value(state)
+            np.testing.assert_array_equal(values[name], expected)
+            np.testing.assert_array_equal(values_structured[name], expected)
+        self.assertEqual(values['solidus_temperature'], 855.)
+        np.testing.assert_array_equal(values_structured['solidus_temperature'], 855.)
+        self.assertEqual(values_structured.shape, (50,))
+
+    def test_query_many_broadcast(self):
+        """Properties which ignore some of the state's arrays should be broadcast into their fields."""
+        # Setup
+        al6061 = load('Al_6061', 'extruded, thickness > 1 inch', 'T6')
+        names = ['youngs_modulus', 'strength_tensile_ultimate']
+        state = {'temperature': 300., 'exposure time': np.array([1., 10.])}
+
+        # Action
+        values = al6061.query_many(names, state)
+        values_structured = al6061.query_many(names, state, structured=True)
+
+        # Verification
+        self.assertEqual(np.shape(values['youngs_modulus']), ())
+        self.assertEqual(values_structured.shape, (2,))
+        for name in names:
+            np.testing.assert_array_equal(values_structured[name],
+                                          np.broadcast_to(values[name], (2,)))
+
+    def test_collect_stats(self):
+        """Unit test for collect_stats."""
+        # Setup
+        al6061 = load('Al_6061', 'extruded, thickness > 1 inch', 'T6')
+
+        # Action
+        with al6061.collect_stats(['youngs_modulus', 'solidus_temperature']) as stats:
+            al6061['youngs_modulus'].query_value({'temperature': np.linspace(100., 1000.)})
+            al6061['youngs_modulus'].query_value({'temperature': 300.})
+
+        # Verification
+        self.assertEqual(list(stats.keys()), ['youngs_modulus'])
+        self.assertEqual(stats['youngs_modulus']['thermal'].calls, 2)
+        self.assertEqual(stats['youngs_modulus']['thermal'].points, 51)
+        self.assertEqual(al6061.stats(), {})
+        self.assertFalse(al6061.properties.is_built('strength_tensile_ultimate'))
+
 
 class TestLoadFromYaml(unittest.TestCase):
     """Unit tests for load_from_yaml."""
@@ -137,6 +239,20 @@ class TestLoad(unittest.TestCase):
         self.assertAlmostEqual(result, 68.3, delta=0.5)
         print('\n' + str(al6061) + '\n')
 
+    def test_table_dtype(self):
+        """Tables may be stored in float32."""
+        # Action
+        al6061 = load('Al_6061', 'extruded, thickness > 1 inch', 'T6', table_dtype=np.float32)
+
+        # Verification
+        state = {'temperature': np.linspace(100., 600.), 'exposure time': 10.}
+        expected = load('Al_6061', 'extruded, thickness > 1 inch', 'T6')
+        for name in ['youngs_modulus', 'strength_tensile_ultimate']:
+            model = al6061[name].variations_with_state['thermal']
+            self.assertEqual(model._interp_values.dtype, np.float32)  # pylint: disable=protected-access
+            np.testing.assert_allclose(al6061[name].query_value(state),
+                                       expected[name].query_value(state), rtol=1e-6)
+
     def test_bogus(self):
         """Asking for a bogus material should raise an error."""
         with self.assertRaises(ValueError) as context:
@@ -1,7 +1,11 @@
 """classes for representing and querying properties of a material."""
+import time
 import numpy as np
 
 import materials.variation_with_state as vstate
+from materials.batch import DEFAULT_CHUNK_SIZE, query_batch, query_chunked
+from materials.query_cache import QueryCache
+from materials.query_stats import QueryStats
 
 
 class Property:
@@ -23,24 +27,250 @@ class Property:
 
 
 class StateDependentProperty(Property):
-    """A property of a material which depends on state (e.g. temperature)."""
+    """A property of a material which depends on state (e.g. temperature).
 
-    def __init__(self, name, yaml_dict):
+    Arguments:
+        name (string): Name of the property.
+        yaml_dict (dict): The property's data, derived from a YAML file. Each of its
+            `variations_with_state` is a YAML-derived dict, or a `VariationWithState`.
+        table_dtype: Floating point type in which tables are stored, see
+            `VariationWithStateTable`.
+    """
+
+    def __init__(self, name, yaml_dict, table_dtype=np.double):
         Property.__init__(self, name, yaml_dict)
         self.variations_with_state = {}
         for vs_name, vs_subdict in yaml_dict['variations_with_state'].items():
-            self.variations_with_state[vs_name] = vstate.build_from_yaml(vs_subdict)
+            if isinstance(vs_subdict, vstate.VariationWithState):
+                # Already built, e.g. by `materials.mapped_database`.
+                self.variations_with_state[vs_name] = vs_subdict
+            else:
+                self.variations_with_state[vs_name] = vstate.build_from_yaml(
+                    vs_subdict, table_dtype=table_dtype)
         self.default_state_model = list(self.variations_with_state.keys())[0]
+        # Optional cache of query results, see `enable_cache`.
+        self._cache = None
+        # Optional query statistics, see `enable_stats`.
+        self._stats = None
+
+    def __getstate__(self):
+        # The query cache and statistics are not pickled, as they describe this process's queries.
+        state = self.__dict__.copy()
+        state['_cache'] = None
+        state['_stats'] = None
+        return state
+
+    def enable_cache(self, maxsize=1024):
+        """Cache the results of scalar queries, in a least-recently-used cache.
+
+        This speeds up workloads which query the same few states over and over.
+        Array queries, and queries with an `out` array, are not cached.
+
+        Arguments:
+            maxsize (int): Maximum number of results to keep.
+        """
+        self._cache = QueryCache(maxsize)
+
+    def disable_cache(self):
+        """Stop caching query results, and discard the cache."""
+        self._cache = None
+
+    def cache_info(self):
+        """Get the query cache statistics (hits, misses, evictions, ...), or None if not enabled."""
+        if self._cache is None:
+            return None
+        return self._cache.info()
+
+    def enable_stats(self):
+        """Record statistics on the queries of this property, see `QueryStats`.
+
+        Recording the statistics adds a few microseconds to each query, and for array
+        queries, a pass over the result and the state to count NaN and out-of-domain points.
+        """
+        if self._stats is None:
+            self._stats = QueryStats()
+
+    def disable_stats(self):
+        """Stop recording query statistics, and discard them."""
+        self._stats = None
+
+    def stats(self):
+        """Get the query statistics, as a dict of `StatsInfo` keyed by state model.
+
+        Returns None if statistics are not enabled.
+        """
+        if self._stats is None:
+            return None
+        return self._stats.info()
 
-    def query_value(self, state, state_model=None, model_args_dict=None):
-        """Query the value of the property at a particular state."""
+    def query_value(self, state, state_model=None, model_args_dict=None, out=None):
+        """Query the value of the property at a particular state.
+
+        If `out` (a float array with the same shape as the query) is given,
+        the values are written into it, and it is returned.
+
+        Queries are thread-safe: several threads may query the same property at once.
+        """
         if state_model is None:
             state_model = self.default_state_model
         if model_args_dict is None:
             model_args_dict = {}
-        values = self.variations_with_state[state_model].query_value(state, **model_args_dict)
-        if self.variations_with_state[state_model].value_type == 'multiplier':
+        if self._stats is not None:
+            start = time.perf_counter()
+        if self._cache is not None and out is None:
+            key = QueryCache.make_key(state_model, state, model_args_dict)
+            values = self._cache.query(
+                key, lambda: self._query_value(state, state_model, model_args_dict, out))
+        else:
+            values = self._query_value(state, state_model, model_args_dict, out)
+        if self._stats is not None:
+            self._stats.record(state_model, self.variations_with_state[state_model], state,
+                               values, time.perf_counter() - start)
+        return values
+
+    def query_value_batch(self, state, state_model=None, model_args_dict=None,
+                          chunk_size=DEFAULT_CHUNK_SIZE, executor=None):
+        """Query the value of the property at many states, in parallel.
+
+        The query is split into chunks of `chunk_size` points, which are evaluated
+        by a thread pool, see `materials.batch.query_batch`.
+
+        Arguments:
+            state, state_model, model_args_dict: See `query_value`.
+            chunk_size (int): Number of points per chunk.
+            executor (concurrent.futures.Executor): Executor which runs the chunks.
+                Defaults to a shared thread pool with one thread per CPU.
+
+        Returns:
+            scalar or array: value(s) of the property at the provided state(s).
+        """
+        return query_batch(
+            lambda chunk_state, out: self.query_value(chunk_state, state_model, model_args_dict, out),
+            state, chunk_size, executor)
+
+    def query_value_chunked(self, state, state_model=None, model_args_dict=None, out=None,
+                            chunk_size=DEFAULT_CHUNK_SIZE):
+        """Query the value of the property at a long history of states, one chunk at a time.
+
+        The temporary arrays of the query are the size of one chunk, so with a
+        memory-mapped `out` the memory used does not depend on the number of states.
+        See `materials.batch.query_chunked`.
+
+        Arguments:
+            state, state_model, model_args_dict: See `query_value`.
+                The state arrays may be memory-mapped.
+            out (ndarray): Optional float array (which may be memory-mapped), with the
+                same shape as the query, into which the values are written.
+            chunk_size (int): Number of points per chunk.
+
+        Returns:
+            scalar or array: value(s) of the property at the provided state(s).
+                If `out` is given, returns `out`.
+        """
+        return query_chunked(
+            lambda chunk_state, chunk_out: self.query_value(
+                chunk_state, state_model, model_args_dict, chunk_out),
+            state, out, chunk_size)
+
+    def query_value_stream(self, states, state_model=None, model_args_dict=None):
+        """Query the value of the property for each state in a stream of states.
+
+        Arguments:
+            states (iterable of dict): The states at which to query the values, e.g.
+                chunks of a temperature history which are produced by a simulation.
+            state_model, model_args_dict: See `query_value`.
+
+        Yields:
+            scalar or array: value(s) of the property at each state of `states`.
+        """
+        for state in states:
+            yield self.query_value(state, state_model, model_args_dict)
+
+    def query_derivative(self, state, state_var, state_model=None):
+        """Query the value of the property, and its derivative with respect to a state variable.
+
+        The value and derivative are computed together, in one vectorized pass, see
+        `VariationWithState.query_derivative`.
+
+        Arguments:
+            state (dict): The state at which to query the values, see `query_value`.
+            state_var (string): Name of the state variable to differentiate with respect to.
+            state_model (string): Name of the variation with state model to use.
+
+        Returns:
+            scalar or array: value(s) of the property, in the property's units.
+            scalar or array: derivative(s) of the property with respect to `state_var`,
+                in the property's units per unit of `state_var`.
+        """
+        if state_model is None:
+            state_model = self.default_state_model
+        model = self.variations_with_state[state_model]
+        values, derivatives = model.query_derivative(state, state_var)
+        if model.value_type == 'multiplier':
             values = self.default_value * values
+            derivatives = self.default_value * derivatives
+        return values, derivatives
+
+    def query_integral(self, lower, upper, state_var, state=None, state_model=None):
+        """Integrate the property with respect to a state variable, with the other state variables fixed.
+
+        e.g. the thermal strain from 293 K, from the coefficient of thermal expansion::
+
+            prop.query_integral(293., temperature, 'temperature')
+
+        Arguments:
+            lower, upper (scalar or array): Limits of integration, in units of `state_var`.
+            state_var (string): Name of the state variable to integrate over.
+            state (dict): Values of the other state variables, broadcast against the limits.
+            state_model (string): Name of the variation with state model to use.
+
+        Returns:
+            scalar or array: the integral(s), in the property's units times units of `state_var`.
+                NaN where either limit is outside of the model's domain.
+        """
+        if state_model is None:
+            state_model = self.default_state_model
+        model = self.variations_with_state[state_model]
+        integrals = model.query_integral(lower, upper, state_var, state)
+        if model.value_type == 'multiplier':
+            integrals = self.default_value * integrals
+        return integrals
+
+    def query_state(self, value, state_var, state=None, state_model=None, **kwargs):
+        """Find the value of a state variable at which the property takes a target value.
+
+        e.g. the temperature at which the ultimate tensile strength falls to a design
+        allowable, after 100 hours of exposure::
+
+            prop.query_state(200e6, 'temperature', {'exposure time': 100.})
+
+        Arguments:
+            value (scalar or array): The target value(s) of the property, in the property's units.
+            state_var (string): Name of the state variable to solve for.
+            state (dict): Values of the other state variables, broadcast against `value`.
+            state_model (string): Name of the variation with state model to use.
+            kwargs: See `VariationWithState.query_state`.
+
+        Returns:
+            scalar or array: the lowest value of `state_var` at which the property equals
+                `value`, or NaN where it never does.
+        """
+        if state_model is None:
+            state_model = self.default_state_model
+        model = self.variations_with_state[state_model]
+        if model.value_type == 'multiplier':
+            value = np.asarray(value, dtype=np.double) / self.default_value
+        return model.query_state(value, state_var, state, **kwargs)
+
+    def _query_value(self, state, state_model, model_args_dict, out):
+        """Query the value of the property, without the cache."""
+        values = self.variations_with_state[state_model].query_value(
+            state, out=out, **model_args_dict)
+        if self.variations_with_state[state_model].value_type == 'multiplier':
+            if out is not None:
+                out *= self.default_value
+            else:
+                values = self.default_value * values
         return values
 
     def __getitem__(self, key):
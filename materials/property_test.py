@@ -63,6 +63,112 @@ class TestStateDependentProperty(unittest.TestCase):
         with self.assertRaises(ValueError):
             prop.query_value({'fish': 1.})  # fish is not a state variable.
 
+    def test_query_1d_out(self):
+        """Test query_value with an output array."""
+        # Setup
+        dv = 2.0
+        yaml_dict = {
+            'default_value': dv,
+            'units': 'MPa',
+            'reference': 'mmpds',
+            'variations_with_state': {
+                'thermal': {
+                    'state_vars': ['temperature'],
+                    'state_vars_units': {'temperature': 'kelvin'},
+                    'value_type': 'multiplier',
+                    'representation': 'table',
+                    'reference': 'mmpds',
+                    'temperature': np.arange(4),
+                    'values': np.arange(4) ** 2,
+                }
+            }
+        }
+        prop = StateDependentProperty('name', yaml_dict)
+        out = np.empty(2)
+
+        # Action
+        result = prop.query_value({'temperature': np.array([1., 2.5])}, out=out)
+
+        # Verification
+        self.assertIs(result, out)
+        np.testing.assert_allclose(out, [1. * dv, 6.5 * dv])
+
+    def test_query_cache(self):
+        """Test query_value with the query cache enabled."""
+        # Setup
+        dv = 2.0
+        yaml_dict = {
+            'default_value': dv,
+            'units': 'MPa',
+            'reference': 'mmpds',
+            'variations_with_state': {
+                'thermal': {
+                    'state_vars': ['temperature'],
+                    'state_vars_units': {'temperature': 'kelvin'},
+                    'value_type': 'multiplier',
+                    'representation': 'table',
+                    'reference': 'mmpds',
+                    'temperature': np.arange(4),
+                    'values': np.arange(4) ** 2,
+                }
+            }
+        }
+        prop = StateDependentProperty('name', yaml_dict)
+        self.assertIsNone(prop.cache_info())
+
+        # Action
+        prop.enable_cache(maxsize=8)
+        results = [prop.query_value({'temperature': t}) for t in [1, 2.5, 1, 2.5]]
+        array_result = prop.query_value({'temperature': [1, 2.5]})
+
+        # Verification
+        self.assertEqual(results, [1 ** 2 * dv, 6.5 * dv, 1 ** 2 * dv, 6.5 * dv])
+        np.testing.assert_allclose(array_result, [1 ** 2 * dv, 6.5 * dv])
+        info = prop.cache_info()
+        self.assertEqual(info.hits, 2)
+        self.assertEqual(info.misses, 2)
+        self.assertEqual(info.bypasses, 1)
+        prop.disable_cache()
+        self.assertIsNone(prop.cache_info())
+
+    def test_query_stats(self):
+        """Test query_value with query statistics enabled."""
+        # Setup
+        yaml_dict = {
+            'default_value': 2.0,
+            'units': 'MPa',
+            'reference': 'mmpds',
+            'variations_with_state': {
+                'thermal': {
+                    'state_vars': ['temperature'],
+                    'state_vars_units': {'temperature': 'kelvin'},
+                    'value_type': 'multiplier',
+                    'representation': 'table',
+                    'reference': 'mmpds',
+                    'temperature': np.arange(4),
+                    'values': np.arange(4) ** 2,
+                }
+            }
+        }
+        prop = StateDependentProperty('name', yaml_dict)
+        self.assertIsNone(prop.stats())
+
+        # Action
+        prop.enable_stats()
+        prop.query_value({'temperature': 1.5})
+        prop.query_value({'temperature': np.array([-1., 0., 2., 3.5, 5.])})
+
+        # Verification
+        info = prop.stats()['thermal']
+        self.assertEqual(info.calls, 2)
+        self.assertEqual(info.points, 6)
+        self.assertEqual(info.nan_points, 3)
+        self.assertEqual(info.out_of_domain_points, 3)
+        self.assertGreater(info.total_s, 0.)
+        self.assertTrue(info.min_s <= info.p50_s <= info.p90_s <= info.p99_s <= info.max_s)
+        prop.disable_stats()
+        self.assertIsNone(prop.stats())
+
     def test_init_2d(self):
         """Test init with a 2-d lookup table."""
         # Setup
@@ -158,6 +264,92 @@ class TestStateDependentProperty(unittest.TestCase):
         with self.assertRaises(ValueError):
             prop.query_value({'fish': 1., 'exposure time': 1})  # fish is not a state variable.
 
+    def test_query_derivative(self):
+        """Test query_derivative with a 1-d lookup table, whose values are multipliers."""
+        # Setup
+        dv = 2.0
+        yaml_dict = {
+            'default_value': dv,
+            'units': 'MPa',
+            'reference': 'mmpds',
+            'variations_with_state': {
+                'thermal': {
+                    'state_vars': ['temperature'],
+                    'state_vars_units': {'temperature': 'kelvin'},
+                    'value_type': 'multiplier',
+                    'representation': 'table',
+                    'reference': 'mmpds',
+                    'temperature': np.arange(4),
+                    'values': np.arange(4) ** 2,
+                }
+            }
+        }
+        prop = StateDependentProperty('name', yaml_dict)
+
+        # Action
+        values, derivatives = prop.query_derivative({'temperature': [0.5, 2.5]}, 'temperature')
+
+        # Verification
+        np.testing.assert_allclose(values, [0.5 * dv, 6.5 * dv])
+        np.testing.assert_allclose(derivatives, [1. * dv, 5. * dv])
+
+    def test_query_integral(self):
+        """Test query_integral with a 1-d equation, whose values are multipliers."""
+        # Setup
+        dv = 2.0
+        yaml_dict = {
+            'default_value': dv,
+            'units': 'MPa',
+            'reference': 'mmpds',
+            'variations_with_state': {
+                'thermal': {
+                    'state_vars': ['temperature'],
+                    'state_vars_units': {'temperature': 'kelvin'},
+                    'value_type': 'multiplier',
+                    'representation': 'equation',
+                    'reference': 'reference',
+                    'expression': 'value = temperature**2',
+                    'state_domain': {'temperature': (0, 1000)},
+                }
+            }
+        }
+        prop = StateDependentProperty('name', yaml_dict)
+
+        # Action and verification
+        np.testing.assert_allclose(
+            prop.query_integral(0., [3., 6.], 'temperature'), [9. * dv, 72. * dv])
+
+    def test_query_state(self):
+        """Test query_state with a 2-d lookup table, whose values are multipliers."""
+        # Setup
+        dv = 2.0
+        yaml_dict = {
+            'default_value': dv,
+            'units': 'MPa',
+            'reference': 'mmpds',
+            'variations_with_state': {
+                'thermal': {
+                    'state_vars': ['exposure time', 'temperature'],
+                    'state_vars_units': {'exposure time': 'hour', 'temperature': 'kelvin'},
+                    'value_type': 'multiplier',
+                    'representation': 'table',
+                    'reference': 'mmpds',
+                    'exposure time': {
+                        0.0: {'temperature': np.arange(4), 'values': 1. - 0.1 * np.arange(4)},
+                        0.1: {'temperature': np.arange(4), 'values': 1. - 0.2 * np.arange(4)},
+                    }
+                }
+            }}
+        prop = StateDependentProperty('name', yaml_dict)
+
+        # Action
+        result = prop.query_state(0.8 * dv, 'temperature', {'exposure time': [0., 0.05, 0.1]})
+
+        # Verification
+        np.testing.assert_allclose(result, [2., 2. / 1.5, 1.])
+        np.testing.assert_allclose(
+            prop.query_value({'exposure time': [0., 0.05, 0.1], 'temperature': result}), 0.8 * dv)
+
     def test_query_1d_eqn(self):
         """Test query_value with a single varaible equation."""
         # Setup
@@ -0,0 +1,97 @@
+"""A bounded least-recently-used cache for property queries."""
+import collections
+import threading
+import numpy as np
+
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', ['hits', 'misses', 'evictions', 'bypasses', 'maxsize', 'currsize'])
+
+
+class QueryCache:
+    """
+    A bounded least-recently-used (LRU) cache of query results.
+
+    Only queries at a single (scalar) state are cached. Array queries bypass
+    the cache, because hashing a large array costs about as much as querying it.
+
+    Arguments:
+        maxsize (int): Maximum number of results to keep. When the cache is full,
+            the least recently used result is evicted.
+
+    """
+
+    def __init__(self, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1.')
+        self.maxsize = maxsize
+        self._results = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._bypasses = 0
+
+    @staticmethod
+    def make_key(state_model, state, model_args_dict):
+        """
+        Make a cache key for a query.
+
+        Returns:
+            tuple: the key, or None if the query cannot be cached (i.e. it is an array query).
+
+        """
+        state_items = []
+        for name, value in state.items():
+            if np.ndim(value) != 0:
+                return None
+            state_items.append((name, float(value)))
+        return (state_model, tuple(sorted(state_items)),
+                tuple(sorted(model_args_dict.items())))
+
+    def query(self, key, compute):
+        """
+        Get the result for `key` from the cache, or compute it and add it to the cache.
+
+        Arguments:
+            key (tuple): The key from `make_key`. If None, `compute` is called
+                and the result is not cached.
+            compute (callable): Computes the result, called with no arguments.
+
+        Returns:
+            The result of the query.
+
+        """
+        if key is None:
+            with self._lock:
+                self._bypasses += 1
+            return compute()
+        with self._lock:
+            if key in self._results:
+                self._hits += 1
+                self._results.move_to_end(key)
+                return self._results[key]
+            self._misses += 1
+        result = compute()
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+                self._evictions += 1
+        return result
+
+    def info(self):
+        """Get the cache statistics, as a `CacheInfo` named tuple."""
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions, self._bypasses,
+                             self.maxsize, len(self._results))
+
+    def clear(self):
+        """Remove all results from the cache, and reset the statistics."""
+        with self._lock:
+            self._results.clear()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+            self._bypasses = 0
@@ -0,0 +1,54 @@
+"""Unit tests for query_cache."""
+import unittest
+import numpy as np
+
+from materials.query_cache import QueryCache
+
+
+class TestQueryCache(unittest.TestCase):
+    """Unit tests for QueryCache."""
+
+    def test_make_key(self):
+        """Scalar states make equal keys, array states cannot be cached."""
+        key_1 = QueryCache.make_key('thermal', {'temperature': 300, 'pressure': 1.}, {})
+        key_2 = QueryCache.make_key('thermal', {'pressure': 1, 'temperature': np.float64(300.)}, {})
+        self.assertEqual(key_1, key_2)
+        self.assertEqual(hash(key_1), hash(key_2))
+        self.assertNotEqual(key_1, QueryCache.make_key('thermal', {'temperature': 301}, {}))
+        self.assertNotEqual(key_1, QueryCache.make_key(
+            'thermal', {'temperature': 300, 'pressure': 1.}, {'method': 'nearest'}))
+        self.assertIsNone(QueryCache.make_key('thermal', {'temperature': [300, 400]}, {}))
+
+    def test_lru(self):
+        """Test hits, misses and least-recently-used eviction."""
+        # Setup
+        cache = QueryCache(maxsize=2)
+        calls = []
+
+        def compute(x):
+            calls.append(x)
+            return x ** 2
+
+        # Action
+        for x in [1, 2, 1, 3, 2, 1]:
+            result = cache.query(('key', x), lambda: compute(x))  # pylint: disable=cell-var-from-loop
+            self.assertEqual(result, x ** 2)
+        cache.query(None, lambda: compute(4))
+
+        # Verification
+        # 1 miss, 2 miss, 1 hit, 3 miss (evicts 2), 2 miss (evicts 1), 1 miss (evicts 3)
+        self.assertEqual(calls, [1, 2, 3, 2, 1, 4])
+        info = cache.info()
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.misses, 5)
+        self.assertEqual(info.evictions, 3)
+        self.assertEqual(info.bypasses, 1)
+        self.assertEqual(info.currsize, 2)
+
+        cache.clear()
+        self.assertEqual(cache.info().currsize, 0)
+        self.assertEqual(cache.info().hits, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""Statistics on the queries of a property: call counts, latency and out-of-domain counts."""
+import collections
+import threading
+import numpy as np
+
+
+StatsInfo = collections.namedtuple(
+    'StatsInfo', ['calls', 'points', 'nan_points', 'out_of_domain_points',
+                  'total_s', 'min_s', 'max_s', 'p50_s', 'p90_s', 'p99_s'])
+
+
+# Latencies are counted in a histogram with logarithmically spaced bins, so that the
+# memory used does not grow with the number of queries. The bins span 100 ns to 100 s
+# with 20 bins per decade, so percentiles are accurate to about 12 %.
+_BINS_PER_DECADE = 20
+_MIN_LATENCY = 1e-7
+_N_BINS = 9 * _BINS_PER_DECADE
+
+
+def _latency_bin(seconds):
+    """Get the index of the histogram bin for a latency."""
+    if seconds <= _MIN_LATENCY:
+        return 0
+    return min(int(np.log10(seconds / _MIN_LATENCY) * _BINS_PER_DECADE), _N_BINS - 1)
+
+
+def _bin_center(index):
+    """Get the (geometric) center latency of a histogram bin."""
+    return _MIN_LATENCY * 10**((index + 0.5) / _BINS_PER_DECADE)
+
+
+class _ModelStats:
+    """Statistics on the queries of one variation with state model."""
+
+    def __init__(self):
+        self.calls = 0
+        self.points = 0
+        self.nan_points = 0
+        self.out_of_domain_points = 0
+        self.total_s = 0.
+        self.min_s = np.inf
+        self.max_s = 0.
+        self.histogram = np.zeros(_N_BINS, dtype=np.int64)
+
+    def percentile(self, q):
+        """Estimate the `q`th percentile latency from the histogram."""
+        rank = q / 100. * self.calls
+        index = int(np.searchsorted(np.cumsum(self.histogram), rank))
+        # The estimate is clipped to the exactly known minimum and maximum.
+        return min(max(_bin_center(min(index, _N_BINS - 1)), self.min_s), self.max_s)
+
+    def info(self):
+        return StatsInfo(self.calls, self.points, self.nan_points, self.out_of_domain_points,
+                         self.total_s, self.min_s, self.max_s,
+                         self.percentile(50), self.percentile(90), self.percentile(99))
+
+
+def count_out_of_domain(model, state):
+    """Count the query points which are outside of a model's state domain.
+
+    Arguments:
+        model (VariationWithState): The variation with state model.
+        state (dict): The query state, see `VariationWithState.query_value`.
+
+    Returns:
+        int: number of (broadcast) query points at which any state variable is
+            outside of `model.get_state_domain()`.
+    """
+    shape = np.broadcast_shapes(*[np.shape(state[name]) for name in model.state_vars])
+    in_domain = np.broadcast_to(model.get_domain_mask(state), shape)
+    return int(in_domain.size - np.count_nonzero(in_domain))
+
+
+class QueryStats:
+    """
+    Statistics on the queries of a property, kept separately for each state model.
+
+    For each state model, this records the number of calls, the number of points
+    evaluated, the number of points which were NaN or outside of the model's state
+    domain, and the cumulative, minimum, maximum and percentile latency of the calls.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def record(self, state_model, model, state, values, seconds):
+        """
+        Record one query.
+
+        Arguments:
+            state_model (string): Name of the state model which was queried.
+            model (VariationWithState): The state model which was queried.
+            state (dict): The query state.
+            values (scalar or ndarray): The query result.
+            seconds (float): Time taken by the query.
+
+        """
+        points = int(np.size(values))
+        nan_points = int(np.count_nonzero(np.isnan(values)))
+        out_of_domain_points = count_out_of_domain(model, state)
+        with self._lock:
+            if state_model not in self._models:
+                self._models[state_model] = _ModelStats()
+            stats = self._models[state_model]
+            stats.calls += 1
+            stats.points += points
+            stats.nan_points += nan_points
+            stats.out_of_domain_points += out_of_domain_points
+            stats.total_s += seconds
+            stats.min_s = min(stats.min_s, seconds)
+            stats.max_s = max(stats.max_s, seconds)
+            stats.histogram[_latency_bin(seconds)] += 1
+
+    def info(self):
+        """Get the statistics, as a dict of `StatsInfo` named tuples keyed by state model."""
+        with self._lock:
+            return {state_model: stats.info() for state_model, stats in self._models.items()}
+
+    def clear(self):
+        """Reset the statistics."""
+        with self._lock:
+            self._models.clear()
@@ -0,0 +1,51 @@
+"""Unit tests for query_stats."""
+import unittest
+import numpy as np
+
+from materials.query_stats import QueryStats, count_out_of_domain
+import materials.variation_with_state as vstate
+
+
+class TestQueryStats(unittest.TestCase):
+    """Unit tests for QueryStats."""
+
+    def setUp(self):
+        self.model = vstate.VariationWithStateEquation(
+            ['temperature', 'pressure'], {'temperature': 'kelvin', 'pressure': 'pascal'},
+            'override', 'ref', 'value = temperature * pressure',
+            {'temperature': (200., 400.), 'pressure': (0., 1e5)})
+
+    def test_count_out_of_domain(self):
+        """Points outside of the domain in any state variable should be counted."""
+        state = {'temperature': np.array([100., 300., 300.]), 'pressure': np.array([1., 1., 2e5])}
+        self.assertEqual(count_out_of_domain(self.model, state), 2)
+        # Scalars are broadcast against the arrays.
+        state = {'temperature': 100., 'pressure': np.array([1., 1., 2e5])}
+        self.assertEqual(count_out_of_domain(self.model, state), 3)
+        self.assertEqual(count_out_of_domain(self.model, {'temperature': 300., 'pressure': 1.}), 0)
+
+    def test_percentiles(self):
+        """Latency percentiles should be estimated to within the histogram bin width."""
+        # Setup
+        stats = QueryStats()
+        state = {'temperature': 300., 'pressure': 1.}
+        latencies = np.linspace(1e-6, 1e-4, 1000)
+
+        # Action
+        for seconds in latencies:
+            stats.record('thermal', self.model, state, 300., seconds)
+
+        # Verification
+        info = stats.info()['thermal']
+        self.assertEqual(info.calls, 1000)
+        self.assertEqual(info.min_s, latencies[0])
+        self.assertEqual(info.max_s, latencies[-1])
+        self.assertAlmostEqual(info.total_s, np.sum(latencies))
+        for percentile, estimate in [(50, info.p50_s), (90, info.p90_s), (99, info.p99_s)]:
+            self.assertAlmostEqual(estimate / np.percentile(latencies, percentile), 1., delta=0.13)
+        stats.clear()
+        self.assertEqual(stats.info(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+"""On-disk cache of parsed material records.
+
+Parsing a material's YAML file is slow (PyYAML's parser is pure python), and
+is repeated by every process which loads the material. This module keeps a
+binary copy of each parsed record in a cache directory:
+
+    * The numeric lists in the record (e.g. table points and values) are
+      concatenated into one float array.
+    * The rest of the record is stored as a small JSON header, in which each
+      numeric list is replaced by its offset and length in the float array.
+
+Both are stored in one `.npz` file per YAML file, together with the SHA-256
+hash of the YAML file's contents. When the YAML file changes, its hash no
+longer matches and the cache entry is rebuilt.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+from materials.yaml_io import load_yaml
+
+
+# Increment this when the cache file layout changes, to invalidate old cache files.
+CACHE_FORMAT_VERSION = 1
+
+
+def get_cache_dir():
+    """Get the directory in which parsed records are cached.
+
+    This is `$MATERIALS_CACHE_DIR` if that environment variable is set,
+    otherwise `~/.cache/materials`.
+
+    Returns:
+        string
+    """
+    cache_dir = os.environ.get('MATERIALS_CACHE_DIR')
+    if cache_dir:
+        return cache_dir
+    return os.path.join(os.path.expanduser('~'), '.cache', 'materials')
+
+
+def _is_numeric_list(obj):
+    """Check if `obj` is a (non-empty) list of numbers."""
+    return (isinstance(obj, list) and len(obj) > 0
+            and all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in obj))
+
+
+def _encode(obj, arrays, size):
+    """Encode a parsed record as JSON-compatible objects, moving numeric lists into `arrays`.
+
+    Arguments:
+        obj: (part of) the parsed record.
+        arrays (list of list): numeric lists which have been moved out of the record.
+        size (list of int): one-element list holding the total length of `arrays`.
+
+    Returns:
+        A JSON-compatible object.
+    """
+    if _is_numeric_list(obj):
+        arrays.append(obj)
+        encoded = {'array': [size[0], len(obj)]}
+        size[0] += len(obj)
+        return encoded
+    if isinstance(obj, dict):
+        # YAML keys may be numbers (e.g. the exposure times of a 2d table),
+        # so store the keys as values rather than as JSON object keys.
+        return {'dict': [[key, _encode(value, arrays, size)] for key, value in obj.items()]}
+    if isinstance(obj, list):
+        return {'list': [_encode(value, arrays, size) for value in obj]}
+    return {'value': obj}
+
+
+def _decode(obj, data):
+    """Rebuild a parsed record from `_encode`'s output and the float array `data`."""
+    if 'array' in obj:
+        start, length = obj['array']
+        return data[start:start + length]
+    if 'dict' in obj:
+        return {key: _decode(value, data) for key, value in obj['dict']}
+    if 'list' in obj:
+        return [_decode(value, data) for value in obj['list']]
+    return obj['value']
+
+
+def _get_cache_filename(filename, cache_dir):
+    """Get the name of the cache file for YAML file `filename`."""
+    path_hash = hashlib.sha256(os.path.abspath(filename).encode('utf-8')).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(cache_dir, '{:s}-{:s}.npz'.format(stem, path_hash))
+
+
+def read_cache(cache_filename, source_hash):
+    """Read a parsed record from a cache file.
+
+    Returns:
+        dict: the parsed record, or None if the cache file does not exist, or is
+            not for the current format version and YAML file contents.
+    """
+    try:
+        with np.load(cache_filename, allow_pickle=False) as npz:
+            header = json.loads(bytes(npz['header']).decode('utf-8'))
+            if (header['version'] != CACHE_FORMAT_VERSION
+                    or header['source_hash'] != source_hash):
+                return None
+            data = npz['data']
+    except (OSError, ValueError, KeyError):
+        return None
+    return _decode(header['record'], data)
+
+
+def _pack(record, source_hash):
+    """Split a parsed record into a JSON header and a float array.
+
+    Returns:
+        dict: the header.
+        ndarray: the numeric lists in the record, concatenated.
+    """
+    arrays = []
+    size = [0]
+    header = {
+        'version': CACHE_FORMAT_VERSION,
+        'source_hash': source_hash,
+        'record': _encode(record, arrays, size),
+    }
+    if arrays:
+        data = np.concatenate([np.asarray(a, dtype=np.double) for a in arrays])
+    else:
+        data = np.empty(0)
+    return header, data
+
+
+def write_cache(cache_filename, header, data):
+    """Write a packed record to a cache file.
+
+    The file is written to a temporary file and then moved into place, so that
+    processes which read the cache concurrently never see a partial file.
+    """
+    header_bytes = np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8)
+    os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+    fd, temp_filename = tempfile.mkstemp(dir=os.path.dirname(cache_filename), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            np.savez(temp_file, header=header_bytes, data=data)
+        os.replace(temp_filename, cache_filename)
+    except BaseException:
+        os.remove(temp_filename)
+        raise
+
+
+def load_record(filename, cache_dir=None, use_cache=True):
+    """Load a material record from a YAML file, using the on-disk cache if possible.
+
+    Arguments:
+        filename (string): Path to the YAML file containing the material data.
+        cache_dir (string): Directory for the cache files. Defaults to `get_cache_dir()`.
+        use_cache (bool): If False, always parse the YAML file.
+
+    Returns:
+        dict: The parsed record. When the cache is used, numeric lists are
+            float ndarrays rather than lists.
+    """
+    with open(filename, 'rb') as yaml_file:
+        source = yaml_file.read()
+    if not use_cache:
+        return load_yaml(source)
+
+    source_hash = hashlib.sha256(source).hexdigest()
+    cache_filename = _get_cache_filename(filename, cache_dir or get_cache_dir())
+    record = read_cache(cache_filename, source_hash)
+    if record is not None:
+        return record
+
+    record = load_yaml(source)
+    try:
+        header, data = _pack(record, source_hash)
+        write_cache(cache_filename, header, data)
+    except (TypeError, ValueError):
+        # The record holds something which JSON cannot store, so it cannot be cached.
+        return record
+    except OSError:
+        # The cache is an optimization, loading should still work if it cannot be written.
+        pass
+    # Return the record in the same form as it would be read from the cache.
+    return _decode(header['record'], data)
@@ -0,0 +1,94 @@
+"""Unit tests for record_cache."""
+import os.path
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import yaml
+
+from materials import get_database_dir, load_from_yaml
+from materials.record_cache import load_record
+
+
+class TestLoadRecord(unittest.TestCase):
+    """Unit tests for load_record."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def assert_records_equal(self, record, expected):
+        """Check that a (possibly cached) record matches the parsed YAML."""
+        if isinstance(expected, dict):
+            self.assertEqual(list(record.keys()), list(expected.keys()))
+            for key in expected:
+                self.assert_records_equal(record[key], expected[key])
+        elif isinstance(expected, list) and isinstance(record, np.ndarray):
+            np.testing.assert_array_equal(record, expected)
+        elif isinstance(expected, list):
+            self.assertEqual(len(record), len(expected))
+            for item, expected_item in zip(record, expected):
+                self.assert_records_equal(item, expected_item)
+        else:
+            self.assertEqual(record, expected)
+
+    def test_database(self):
+        """Records of every material in the database should survive the cache."""
+        for filename in os.listdir(get_database_dir()):
+            filename = os.path.join(get_database_dir(), filename)
+            with open(filename, 'r', encoding='utf-8') as yaml_stream:
+                expected = yaml.full_load(yaml_stream)
+
+            # Action: the first load writes the cache, the second reads it.
+            record_write = load_record(filename, cache_dir=self.cache_dir)
+            record_read = load_record(filename, cache_dir=self.cache_dir)
+
+            # Verification
+            self.assert_records_equal(record_write, expected)
+            self.assert_records_equal(record_read, expected)
+        self.assertEqual(len(os.listdir(self.cache_dir)), len(os.listdir(get_database_dir())))
+
+    def test_invalidate(self):
+        """The cache should be rebuilt when the YAML file changes."""
+        # Setup
+        filename = os.path.join(self.temp_dir, 'record.yaml')
+        with open(filename, 'w', encoding='utf-8') as yaml_file:
+            yaml_file.write('name: a\nvalues: [1, 2, 3]\n')
+        record = load_record(filename, cache_dir=self.cache_dir)
+        self.assertEqual(record['name'], 'a')
+
+        # Action
+        with open(filename, 'w', encoding='utf-8') as yaml_file:
+            yaml_file.write('name: b\nvalues: [4, 5]\n')
+        record = load_record(filename, cache_dir=self.cache_dir)
+
+        # Verification
+        self.assertEqual(record['name'], 'b')
+        np.testing.assert_array_equal(record['values'], [4., 5.])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_load_from_yaml(self):
+        """A material loaded through the cache should give the same property values."""
+        # Setup
+        filename = os.path.join(get_database_dir(), 'Al_6061.yaml')
+        state = {'temperature': np.linspace(100., 500.), 'exposure time': 10.}
+
+        # Action
+        al6061 = load_from_yaml(filename, 'extruded, thickness > 1 inch', 'T6', use_cache=False)
+        with mock.patch.dict(os.environ, {'MATERIALS_CACHE_DIR': self.cache_dir}):
+            load_from_yaml(filename, 'extruded, thickness > 1 inch', 'T6')
+            al6061_cached = load_from_yaml(filename, 'extruded, thickness > 1 inch', 'T6')
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        # Verification
+        for name in ['youngs_modulus', 'strength_tensile_ultimate']:
+            np.testing.assert_array_equal(al6061[name].query_value(state),
+                                          al6061_cached[name].query_value(state))
+
+
+if __name__ == '__main__':
+    unittest.main()
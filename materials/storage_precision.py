@@ -0,0 +1,68 @@
+"""Report the effect of storing a material's tables in reduced precision (e.g. float32)."""
+import collections
+import numpy as np
+
+from materials.property import StateDependentProperty
+import materials.variation_with_state as vstate
+
+
+PrecisionReport = collections.namedtuple(
+    'PrecisionReport', ['nbytes', 'converted_nbytes', 'max_abs_error', 'max_rel_error'])
+
+
+def compare_model_precision(model, dtype=np.float32, num_points=201):
+    """
+    Compare a table stored in double precision with a copy stored in `dtype`.
+
+    Arguments:
+        model (VariationWithStateTable or VariationWithStateGrid): A table, stored in
+            double precision.
+        dtype: The reduced-precision floating point type.
+        num_points (int): Number of query points in each state variable,
+            spanning the table's domain.
+
+    Returns:
+        PrecisionReport: the table's memory in double precision and in `dtype` [units: byte],
+            and the maximum absolute and relative difference between their query results.
+
+    """
+    converted = model.astype(dtype)
+    # Compare the tables on a grid spanning the domain, as `VariationWithState.resample` does.
+    # pylint: disable=protected-access
+    domain = model.get_state_domain()
+    domain = [(float(domain[name][0]), float(domain[name][1])) for name in model.state_vars]
+    axes = vstate._uniform_axes(domain, model._state_vars_interp_scales, num_points)
+    error = vstate._resampling_error(model._query_grid(axes), converted._query_grid(axes))
+    return PrecisionReport(model.nbytes, converted.nbytes, error.max_abs_error, error.max_rel_error)
+
+
+def compare_storage_precision(material, dtype=np.float32, num_points=201):
+    """
+    Report the effect of storing a material's tables in `dtype` instead of double precision.
+
+    e.g. to check the effect of `load(..., table_dtype=np.float32)`::
+
+        matl = load('Al_6061', 'extruded, thickness > 1 inch', 'T6')
+        for key, report in compare_storage_precision(matl).items():
+            print(key, report)
+
+    Arguments:
+        material (Material): The material, loaded with double precision tables
+            (the default). All of its properties are built.
+        dtype: The reduced-precision floating point type.
+        num_points (int): See `compare_model_precision`.
+
+    Returns:
+        dict: a `PrecisionReport` for each table, keyed by (property name, state model name).
+            The property values' units are those of the property, or of the multiplier
+            for 'multiplier' type models.
+
+    """
+    reports = {}
+    for name, prop in material.properties.items():
+        if not isinstance(prop, StateDependentProperty):
+            continue
+        for state_model, model in prop.variations_with_state.items():
+            if isinstance(model, (vstate.VariationWithStateTable, vstate.VariationWithStateGrid)):
+                reports[(name, state_model)] = compare_model_precision(model, dtype, num_points)
+    return reports
@@ -0,0 +1,29 @@
+"""Unit tests for storage_precision."""
+import unittest
+import numpy as np
+
+from materials import load
+from materials.storage_precision import compare_storage_precision
+
+
+class TestCompareStoragePrecision(unittest.TestCase):
+    """Unit tests for compare_storage_precision."""
+
+    def test_al6061(self):
+        """float32 tables should halve the memory, with errors near float32 resolution."""
+        # Setup
+        al6061 = load('Al_6061', 'extruded, thickness > 1 inch', 'T6')
+
+        # Action
+        reports = compare_storage_precision(al6061, np.float32)
+
+        # Verification
+        self.assertEqual(set(reports.keys()), {('youngs_modulus', 'thermal'),
+                                               ('strength_tensile_ultimate', 'thermal')})
+        for report in reports.values():
+            self.assertEqual(report.converted_nbytes, report.nbytes // 2)
+            self.assertLess(report.max_rel_error, 1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
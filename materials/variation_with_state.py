@@ -1,15 +1,26 @@
 """Classes for represernting the variaton of material properties with state."""
 
-import copy
+import collections
+import functools
+import itertools
+import sys
+import threading
 import numpy as np
-import scipy.interpolate
-import asteval
+
+from materials.compiled_expression import compile_derivative, compile_expression
+
+
+ResamplingError = collections.namedtuple(
+    'ResamplingError', ['max_abs_error', 'max_rel_error', 'check_points', 'lost_points'])
 
 
 def _create_interp_arrays_from_yaml_table_2d(yaml_dict, state_vars, state_vars_interp_scales):
     """
     Create 2d interpolation arrays for `griddata` from a YAML dict.
 
+    The arrays are allocated once, at their final size, and filled slice by slice,
+    so the time taken is linear in the number of points.
+
     Arguments:
         yaml_dict (dict): variation with state subdictionary extracted from a YAML file.
         state_vars (list of string): State variable names.
@@ -19,39 +30,35 @@ def _create_interp_arrays_from_yaml_table_2d(yaml_dict, state_vars, state_vars_i
     Returns:
         ndarray: interpolation points.
         ndarray: interpolation values.
+        ndarray of int: index of the first point of each slice in the interpolation points,
+            followed by the total number of points (see `VariationWithStateSlicedTable`).
 
     """
     if len(state_vars) != 2:
         raise ValueError()
-    # TODO there has got to be a less awful way to represent a 2+ dimensional
-    # interpolation table in YAML and load it.
-    interp_points = np.empty((0, 2))
-    interp_values = np.array([])
     tbl_dict = yaml_dict[state_vars[0]]
-    interp_points_0 = np.array(list(tbl_dict.keys()))
-    interp_points_0.sort()
-    interp_points_1 = np.array(
-        [tbl_dict[p0][state_vars[1]] for p0 in interp_points_0])
-    # From the yaml dictionary 2d table, build an array compatible with
-    # scipy.interpolate.griddata
-    for i in range(len(interp_points_0)):
-        # The value of the 0th state variable for this slice of the interpolation table.
-        point_0 = interp_points_0[i]
-        interp_points = np.append(
-            interp_points,
-            np.stack(
-                (
-                    np.full_like(interp_points_1[i], point_0, dtype=np.double),
-                    interp_points_1[i]
-                ),
-                axis=1),
-            axis=0)
-        interp_values = np.append(interp_values, tbl_dict[point_0]['values'])
+    interp_points_0 = sorted(tbl_dict.keys())
+    # The slices may have different lengths, so find the offset of each slice
+    # in the flattened arrays.
+    slice_lengths = [len(tbl_dict[p0][state_vars[1]]) for p0 in interp_points_0]
+    slice_offsets = np.zeros(len(interp_points_0) + 1, dtype=np.intp)
+    np.cumsum(slice_lengths, out=slice_offsets[1:])
+
+    interp_points = np.empty((slice_offsets[-1], 2))
+    interp_values = np.empty(slice_offsets[-1])
+    for point_0, start, stop in zip(interp_points_0, slice_offsets[:-1], slice_offsets[1:]):
+        slice_dict = tbl_dict[point_0]
+        if len(slice_dict['values']) != stop - start:
+            raise ValueError('The slice at {:s} = {} has {:d} points but {:d} values.'.format(
+                state_vars[0], point_0, stop - start, len(slice_dict['values'])))
+        interp_points[start:stop, 0] = point_0
+        interp_points[start:stop, 1] = slice_dict[state_vars[1]]
+        interp_values[start:stop] = slice_dict['values']
     for j in range(2):
         if state_vars_interp_scales[j] == 'log':
             interp_points[:, j] = np.log(interp_points[:, j])
 
-    return interp_points, interp_values
+    return interp_points, interp_values, slice_offsets
 
 
 def _create_interp_arrays_from_yaml_table(yaml_dict, state_vars, state_vars_interp_scales):
@@ -76,14 +83,258 @@ def _create_interp_arrays_from_yaml_table(yaml_dict, state_vars, state_vars_inte
         if state_vars_interp_scales[0] == 'log':
             interp_points = np.log(interp_points)
     elif len(state_vars) == 2:
-        interp_points, interp_values = _create_interp_arrays_from_yaml_table_2d(
+        interp_points, interp_values, _ = _create_interp_arrays_from_yaml_table_2d(
             yaml_dict, state_vars, state_vars_interp_scales)
     else:
-        raise NotImplementedError('More than two state variables not supported.')
+        raise NotImplementedError('More than two state variables are not supported by tables,'
+                                  + ' use the grid representation.')
 
     return interp_points, interp_values
 
 
+def _build_interpolator(interp_points, interp_values, method, rescale):
+    """
+    Build an interpolator over a table, equivalent to `scipy.interpolate.griddata`.
+
+    `griddata` builds a new interpolator (and, for 2d tables, a new Delaunay
+    triangulation) every time it is called. Building the interpolator once
+    and re-using it for each query is much faster.
+
+    The returned interpolator gives NaN outside of the table's domain (except for
+    the 'nearest' method, which never goes out of domain).
+
+    Arguments:
+        interp_points (ndarray): interpolation points.
+        interp_values (ndarray): interpolation values.
+        method (string): 'linear', 'nearest' or 'cubic', as in `griddata`.
+        rescale (bool): Rescale points to a unit cube before interpolating, as in `griddata`.
+            Only used for 2d tables.
+
+    Returns:
+        callable: maps an array of query points to an array of values.
+
+    """
+    if np.ndim(interp_points) == 1 and method == 'linear':
+        # Sort the points, like griddata does for 1d interpolation. Tables which are
+        # already sorted are used as they are, so they may be shared (e.g. memory-mapped).
+        if np.any(np.diff(interp_points) < 0):
+            order = np.argsort(interp_points)
+            interp_points, interp_values = interp_points[order], interp_values[order]
+        return functools.partial(np.interp, xp=interp_points, fp=interp_values,
+                                 left=np.nan, right=np.nan)
+    # scipy is slow to import, so only import it when it is needed.
+    import scipy.interpolate  # pylint: disable=import-outside-toplevel
+    if np.ndim(interp_points) == 1:
+        order = np.argsort(interp_points)
+        fill_value = 'extrapolate' if method == 'nearest' else np.nan
+        return scipy.interpolate.interp1d(
+            interp_points[order], interp_values[order], kind=method,
+            bounds_error=False, fill_value=fill_value)
+    if method == 'nearest':
+        return scipy.interpolate.NearestNDInterpolator(
+            interp_points, interp_values, rescale=rescale)
+    if method == 'linear':
+        return scipy.interpolate.LinearNDInterpolator(
+            interp_points, interp_values, fill_value=np.nan, rescale=rescale)
+    if method == 'cubic' and interp_points.shape[1] == 2:
+        return scipy.interpolate.CloughTocher2DInterpolator(
+            interp_points, interp_values, fill_value=np.nan, rescale=rescale)
+    raise ValueError('Unknown interpolation method {:s} for {:d}d data'.format(
+        method, interp_points.shape[1]))
+
+
+def _uniform_axes(domain, scales, n):
+    """Get `n` points spanning the domain of each state variable, uniformly spaced in its scale."""
+    axes = []
+    for (smin, smax), scale in zip(domain, scales):
+        if scale == 'log':
+            axes.append(np.exp(np.linspace(np.log(smin), np.log(smax), n)))
+        else:
+            axes.append(np.linspace(smin, smax, n))
+    return axes
+
+
+def _resampling_error(exact, approx):
+    """Compare a model's values to its resampled values on a grid of check points.
+
+    Returns:
+        ResamplingError: the maximum absolute and relative errors over the check points
+            where both are finite, the number of check points, and the number of check
+            points where the model is finite but the resampled model is NaN (e.g. near the
+            edges of ragged tables).
+    """
+    both = np.isfinite(exact) & np.isfinite(approx)
+    abs_error = np.abs(approx[both] - exact[both])
+    max_abs_error = float(np.max(abs_error)) if abs_error.size else 0.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rel_error = abs_error / np.abs(exact[both])
+    rel_error = rel_error[np.isfinite(rel_error)]
+    max_rel_error = float(np.max(rel_error)) if rel_error.size else 0.
+    lost_points = int(np.count_nonzero(np.isfinite(exact) & np.isnan(approx)))
+    return ResamplingError(max_abs_error, max_rel_error, exact.size, lost_points)
+
+
+def _monotone_runs(curve):
+    """Split a piecewise-linear curve into monotone runs of finite points.
+
+    Returns:
+        list of tuple: `(start, stop, direction)` of each run, where the run is the points
+            `curve[start:stop]` (at least 2), and `direction` is 1 if they are non-decreasing
+            and -1 if they are non-increasing. Consecutive runs share their end point.
+    """
+    finite = np.isfinite(curve)
+    steps = np.sign(np.diff(curve))
+    runs = []
+    start, direction = None, 0
+    for j, step in enumerate(steps):
+        if not (finite[j] and finite[j + 1]):
+            if start is not None:
+                runs.append((start, j + 1, direction or 1))
+                start = None
+        elif start is None:
+            start, direction = j, step
+        elif step and direction and step != direction:
+            runs.append((start, j + 1, direction))
+            start, direction = j, step
+        elif step:
+            direction = step
+    if start is not None:
+        runs.append((start, len(curve), direction or 1))
+    return runs
+
+
+def _find_crossings(curve, target):
+    """
+    Find the first segment of a piecewise-linear curve which crosses each target value.
+
+    The curve is split into monotone runs, and each run is searched with a binary search,
+    so the cost per target grows with log(number of points) and the number of runs.
+
+    Arguments:
+        curve (ndarray): Values of the curve at its points, shape (m,). NaN values
+            break the curve.
+        target (ndarray): Target values.
+
+    Returns:
+        ndarray of int: index of the first segment which crosses each target, with the
+            shape of `target`, or -1 where no segment crosses it.
+        ndarray: fractional position of the crossing within the segment, in [0, 1].
+
+    """
+    index = np.full(target.shape, -1, dtype=np.intp)
+    fraction = np.full(target.shape, np.nan)
+    for start, stop, direction in _monotone_runs(curve):
+        run = curve[start:stop] * direction
+        run_target = target * direction
+        found = (index < 0) & (run[0] <= run_target) & (run_target <= run[-1])
+        t = run_target[found]
+        # The first point of the run at or above each target.
+        i = np.searchsorted(run, t, side='left')
+        segment = np.maximum(i - 1, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction[found] = np.where(
+                i == 0, 0., (t - run[segment]) / (run[segment + 1] - run[segment]))
+        index[found] = start + segment
+    return index, fraction
+
+
+def _find_first_crossings(curves, target):
+    """
+    Find the first segment of each of several piecewise-linear curves which crosses its target.
+
+    Arguments:
+        curves (ndarray): Values of the curves at their points, shape (..., m).
+        target (ndarray): Target value of each curve, shape (...).
+
+    Returns:
+        See `_find_crossings`.
+
+    """
+    start = curves[..., :-1]
+    stop = curves[..., 1:]
+    t = target[..., np.newaxis]
+    crosses = ((start <= t) & (t <= stop)) | ((stop <= t) & (t <= start))
+    index = np.argmax(crosses, axis=-1)
+    start = np.take_along_axis(start, index[..., np.newaxis], axis=-1)[..., 0]
+    stop = np.take_along_axis(stop, index[..., np.newaxis], axis=-1)[..., 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(stop == start, 0., (target - start) / (stop - start))
+    found = np.any(crosses, axis=-1)
+    return np.where(found, index, -1), np.where(found, fraction, np.nan)
+
+
+def _interp_with_slope(x, xp, fp):
+    """
+    Piecewise-linear interpolation, which also returns the slope at each query point.
+
+    Arguments:
+        x (ndarray): query points.
+        xp (ndarray): points, in ascending order.
+        fp (ndarray): values at the points.
+
+    Returns:
+        ndarray: values at the query points, NaN outside of `[xp[0], xp[-1]]`.
+        ndarray: slope of the segment containing each query point. Points which lie
+            on an interior point take the slope of the segment above it.
+
+    """
+    index = np.clip(np.searchsorted(xp, x, side='right') - 1, 0, len(xp) - 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (fp[index + 1] - fp[index]) / (xp[index + 1] - xp[index])
+    values = fp[index] + (x - xp[index]) * slope
+    outside = ~((x >= xp[0]) & (x <= xp[-1]))
+    return np.where(outside, np.nan, values), np.where(outside, np.nan, slope)
+
+
+def _segment_integral(start, width, value_start, value_stop, fraction, log_scale):
+    """
+    Integrate a linearly interpolated segment from its start to a fraction of its width.
+
+    Arguments:
+        start (ndarray): start of the segment, in the interpolation scale.
+        width (ndarray): width of the segment, in the interpolation scale.
+        value_start, value_stop (ndarray): values at the start and end of the segment.
+        fraction (ndarray): position of the upper limit of integration within the segment, in [0, 1].
+        log_scale (bool): If True, the interpolation scale is the log of the state variable.
+
+    Returns:
+        ndarray: integral of the value with respect to the state variable (not its log).
+
+    """
+    if not log_scale:
+        return width * fraction * (value_start + 0.5 * fraction * (value_stop - value_start))
+    # The value is linear in u = log(x): f = f0 + slope * (u - u0). An antiderivative
+    # of f * exp(u) with respect to u is exp(u) * (f - slope).
+    slope = (value_stop - value_start) / width
+    value = value_start + fraction * (value_stop - value_start)
+    return np.exp(start + fraction * width) * (value - slope) - np.exp(start) * (value_start - slope)
+
+
+class PreparedState(dict):
+    """
+    A state which has been prepared for querying several variation with state models.
+
+    The state values are converted to float arrays once, and the log of each state
+    variable is computed the first time a log-scale table needs it, then shared
+    with the other tables which are queried at this state.
+
+    Arguments:
+        state (dict): The state, see `VariationWithStateTable.query_value`.
+
+    """
+
+    def __init__(self, state):
+        dict.__init__(self, {name: np.asarray(value, dtype=np.double)
+                             for name, value in state.items()})
+        self._logs = {}
+
+    def log(self, name):
+        """Get the (natural) log of state variable `name`."""
+        if name not in self._logs:
+            self._logs[name] = np.log(self[name])
+        return self._logs[name]
+
+
 class VariationWithState:
     """
     A model of a material property's variation with state.
@@ -113,8 +364,11 @@ class VariationWithState:
         self.value_type = value_type
         self.reference = reference
 
-    def query_value(self, state):
-        """Query the variation with state model at a particular state."""
+    def query_value(self, state, *, out=None):
+        """Query the variation with state model at a particular state.
+
+        If `out` is given, the values are written into it, and it is returned.
+        """
         pass
 
     def get_state_domain(self):
@@ -134,14 +388,293 @@ class VariationWithState:
             if var_name not in state.keys():
                 raise ValueError('{:s} not provided for query'.format(var_name))
 
+        return bool(np.all(self.get_domain_mask(state)))
+
+    def get_domain_mask(self, state):
+        """
+        Check which points of a query are within the valid domain.
+
+        Arguments:
+            state (dict): The query state, see `query_value`.
+
+        Returns:
+            bool or ndarray of bool: True where the state is in the valid domain for the model.
+                Broadcasts against the query's state arrays (it has their broadcast shape,
+                unless it is a scalar).
+
+        """
         state_domain = self.get_state_domain()  # pylint: disable=assignment-from-no-return
-        for state_name in state:
-            value = state[state_name]
+        mask = True
+        for state_name in self.state_vars:
+            value = np.asarray(state[state_name])
             smin = state_domain[state_name][0]
             smax = state_domain[state_name][1]
-            if np.any(value < smin) or np.any(value > smax):
-                return False
-        return True
+            mask = mask & (smin <= value) & (value <= smax)
+        return mask
+
+    def resample(self, num_points=None, tolerance=None, state_domain=None, max_points=2**20):
+        """
+        Resample the model onto a uniform grid, for fast queries.
+
+        Queries of the resampled model find the grid cell of each point by index
+        arithmetic, rather than a search, and (multi)linearly interpolate within the cell.
+        The resampled model only approximates this model: the two models are compared on
+        a grid several times finer than the resampled grid, and the maximum error is
+        reported in the resampled model's `resampling_error`. Tables and grids are
+        (multi)linear between their points, as is the resampled model between its grid
+        points, so their points are added to the check grid, and the reported error is
+        exact (except in the gaps between ragged slices). For other models, it is an estimate.
+
+        Arguments:
+            num_points (int): Number of grid points in each state variable.
+            tolerance (float): If `num_points` is not given, the number of grid points is
+                doubled (starting from 17) until the maximum absolute error is at most
+                `tolerance`, in the units of the model's values.
+            state_domain (dict): The domain to resample over, as in `get_state_domain`.
+                Defaults to the model's domain. Use a narrower domain if the queries
+                are known to lie in it. Queries outside of it give NaN.
+            max_points (int): Maximum total number of grid points. If the tolerance is
+                not met within this many points, raises ValueError.
+
+        Returns:
+            VariationWithStateUniformTable: the resampled model.
+
+        """
+        if (num_points is None) == (tolerance is None):
+            raise ValueError('Give exactly one of num_points or tolerance.')
+        if state_domain is None:
+            state_domain = self.get_state_domain()  # pylint: disable=assignment-from-no-return
+        domain = [(float(state_domain[name][0]), float(state_domain[name][1]))
+                  for name in self.state_vars]
+        # Tables with a log interpolation scale are resampled uniformly in log scale.
+        scales = getattr(self, '_state_vars_interp_scales', ['linear'] * len(self.state_vars))
+
+        n = num_points if num_points is not None else 17
+        while True:
+            if n < 2 or n ** len(domain) > max_points:
+                raise ValueError('Cannot resample onto {:d} grid points per state variable, '.format(n)
+                                 + 'at least 2 and at most {:d} points in total are allowed.'.format(
+                                     max_points))
+            resampled = VariationWithStateUniformTable(
+                self.state_vars, self.state_vars_units, self.value_type, self.reference,
+                domain, self._query_grid(_uniform_axes(domain, scales, n)), scales)
+            check_axes = self._resampling_check_axes(domain, scales, n, max_points)
+            resampled.resampling_error = _resampling_error(
+                self._query_grid(check_axes),
+                resampled._query_grid(check_axes))  # pylint: disable=protected-access
+            if num_points is not None or resampled.resampling_error.max_abs_error <= tolerance:
+                return resampled
+            n = 2 * n - 1
+
+    def _resampling_check_axes(self, domain, scales, n, max_points):
+        """Get the axes of the grid on which `resample` checks a resampled model with `n`
+        points per state variable."""
+        # Check the error on a grid about 8 times finer (in each state variable), with
+        # at most `max_points` check points.
+        n_check = max(min(8 * (n - 1) + 1, int(max_points ** (1 / len(domain)))), n)
+        check_axes = _uniform_axes(domain, scales, n_check)
+        # Where this model is linear between its points (in the interpolation scale),
+        # the error is largest at one of its points or the resampled grid's points.
+        points = {}
+        for k, ((smin, smax), scale) in enumerate(zip(domain, scales)):
+            axis, exact = self._inverse_axis(k, n_check)
+            if exact:
+                axis = np.exp(axis) if scale == 'log' else axis
+                points[k] = axis[(axis >= smin) & (axis <= smax)]
+                check_axes[k] = np.union1d(check_axes[k], points[k])
+        if np.prod([len(axis) for axis in check_axes], dtype=float) > max_points:
+            # Keep only the points where the error can be largest.
+            resampled_axes = _uniform_axes(domain, scales, n)
+            for k, axis in points.items():
+                check_axes[k] = np.union1d(resampled_axes[k], axis)
+        return check_axes
+
+    def query_state(self, value, state_var, state=None, num_points=257, max_iter=50):
+        """
+        Find the value of a state variable at which the model takes a target value.
+
+        e.g. the temperature at which a strength multiplier falls to 0.5, at fixed exposure time::
+
+            model.query_state(0.5, 'temperature', {'exposure time': 10.})
+
+        The model is treated as a piecewise-linear curve in `state_var` (in its interpolation
+        scale), and the first segment of the curve which crosses the target is found. Tables
+        and grids are piecewise-linear between their points, so the result is exact. Other
+        models (e.g. equations) are sampled at `num_points` points across their domain, and
+        the crossing within the segment is refined by the Illinois (false position) method.
+
+        Arguments:
+            value (scalar or array): The target value(s) of the model.
+            state_var (string): Name of the state variable to solve for.
+            state (dict): Values of the other state variables, see `query_value`.
+                They are broadcast against `value`.
+            num_points (int): Number of points at which models which are not piecewise-linear
+                are sampled. A target which is crossed more than once within one sample
+                interval may be missed.
+            max_iter (int): Maximum number of refinement iterations.
+
+        Returns:
+            scalar or array: the lowest value of `state_var` within the model's domain at which
+                the model equals `value`, or NaN where it never does.
+
+        """
+        if state_var not in self.state_vars:
+            raise ValueError('{:s} is not a state variable of this model.'.format(state_var))
+        if state is None:
+            state = {}
+        fixed = {}
+        for name in self.state_vars:
+            if name == state_var:
+                continue
+            if name not in state.keys():
+                raise ValueError('{:s} not provided for query'.format(name))
+            fixed[name] = np.asarray(state[name], dtype=np.double)
+        value = np.asarray(value, dtype=np.double)
+        shape = np.broadcast_shapes(value.shape, *[v.shape for v in fixed.values()])
+        k = self.state_vars.index(state_var)
+        log_scale = getattr(self, '_state_vars_interp_scales', ['linear'] * len(self.state_vars))[k] == 'log'
+        axis, exact = self._inverse_axis(k, num_points)
+        axis_state = np.exp(axis) if log_scale else axis
+
+        if all(v.ndim == 0 for v in fixed.values()):
+            # Every target is on the same curve, so search its monotone runs.
+            curve = np.asarray(self.query_value(dict(fixed, **{state_var: axis_state})), dtype=np.double)
+            index, fraction = _find_crossings(curve, np.broadcast_to(value, shape))
+        else:
+            fixed = {name: v[..., np.newaxis] for name, v in fixed.items()}
+            curves = np.asarray(self.query_value(dict(fixed, **{state_var: axis_state})), dtype=np.double)
+            curves = np.broadcast_to(curves, shape + (len(axis),))
+            index, fraction = _find_first_crossings(curves, np.broadcast_to(value, shape))
+            fixed = {name: v[..., 0] for name, v in fixed.items()}
+        found = index >= 0
+        segment = np.where(found, index, 0)
+        lower, upper = np.asarray(axis[segment]), np.asarray(axis[segment + 1])
+        result = np.array(lower + fraction * (upper - lower))
+
+        if not exact and np.any(found):
+            result[found] = self._refine_state(
+                value, fixed, state_var, log_scale, shape, found, lower, upper, max_iter)
+        result = np.where(found, result, np.nan)
+        if log_scale:
+            result = np.exp(result)
+        if shape == ():
+            return result[()]
+        return result
+
+    def _inverse_axis(self, k, num_points):
+        """Get the points at which `query_state` samples state variable `k`.
+
+        Returns:
+            ndarray: points in ascending order, in the state variable's interpolation scale.
+            bool: True if the model is linear in that scale between the points, with the
+                other state variables fixed.
+        """
+        smin, smax = self.get_state_domain()[self.state_vars[k]]  # pylint: disable=unsubscriptable-object
+        scale = getattr(self, '_state_vars_interp_scales', ['linear'] * len(self.state_vars))[k]
+        if scale == 'log':
+            return np.linspace(np.log(smin), np.log(smax), num_points), False
+        return np.linspace(smin, smax, num_points), False
+
+    def _refine_state(self, value, fixed, state_var, log_scale, shape, found, lower, upper, max_iter):
+        """Refine the crossings found by `query_state` within their segments, by the Illinois method."""
+        target = np.broadcast_to(value, shape)[found]
+        fixed = {name: np.broadcast_to(v, shape)[found] for name, v in fixed.items()}
+
+        def residual(x, active):
+            x_state = np.exp(x) if log_scale else x
+            return np.asarray(self.query_value(
+                dict({name: v[active] for name, v in fixed.items()}, **{state_var: x_state})),
+                dtype=np.double) - target[active]
+
+        everywhere = np.ones(target.shape, dtype=bool)
+        a, b = lower[found], upper[found]
+        fa, fb = residual(a, everywhere), residual(b, everywhere)
+        x = np.where(fa == 0, a, b)
+        active = (fa != 0) & (fb != 0)
+        xtol = 4 * sys.float_info.epsilon * np.maximum(np.abs(a), np.abs(b)) + 1e-300
+        for _ in range(max_iter):
+            if not np.any(active):
+                break
+            aa, bb, ffa, ffb = a[active], b[active], fa[active], fb[active]
+            c = bb - ffb * (bb - aa) / (ffb - ffa)
+            fc = residual(c, active)
+            # Keep the root bracketed between a and b; halve the retained end's residual
+            # when the same end is kept twice (Illinois), so that both ends converge.
+            swap = np.sign(fc) != np.sign(ffb)
+            aa = np.where(swap, bb, aa)
+            ffa = np.where(swap, ffb, 0.5 * ffa)
+            done = (fc == 0) | (np.abs(c - bb) <= xtol[active])
+            a[active], b[active], fa[active], fb[active] = aa, c, ffa, fc
+            x[active] = c
+            active[active] = ~done
+        return x
+
+    def query_derivative(self, state, state_var):
+        """
+        Query the value of the model, and its derivative with respect to a state variable.
+
+        Arguments:
+            state (dict): The state at which to query the values, see `query_value`.
+            state_var (string): Name of the state variable to differentiate with respect to.
+
+        Returns:
+            scalar or array: value(s) of the model at the provided state(s).
+            scalar or array: derivative(s) of the value(s) with respect to `state_var`,
+                in units of the value per unit of `state_var`.
+
+        """
+        raise NotImplementedError('{:s} models do not support derivatives.'.format(self.representation))
+
+    def query_integral(self, lower, upper, state_var, state=None):
+        """
+        Integrate the model with respect to a state variable, with the other state variables fixed.
+
+        e.g. the thermal strain from a coefficient of thermal expansion model::
+
+            model.query_integral(293., temperature, 'temperature')
+
+        Arguments:
+            lower, upper (scalar or array): Limits of integration, in units of `state_var`.
+            state_var (string): Name of the state variable to integrate over.
+            state (dict): Values of the other state variables, see `query_value`.
+                They are broadcast against `lower` and `upper`.
+
+        Returns:
+            scalar or array: the integral(s), in units of the value times units of `state_var`.
+                NaN where either limit is outside of the model's domain.
+
+        """
+        if state_var not in self.state_vars:
+            raise ValueError('{:s} is not a state variable of this model.'.format(state_var))
+        state = {} if state is None else state
+        for var_name in self.state_vars:
+            if var_name != state_var and var_name not in state.keys():
+                raise ValueError('{:s} not provided for query'.format(var_name))
+        state = {name: value for name, value in state.items() if name != state_var}
+        return (self._antiderivative(dict(state, **{state_var: upper}), state_var)
+                - self._antiderivative(dict(state, **{state_var: lower}), state_var))
+
+    def _antiderivative(self, state, state_var):
+        """Evaluate an antiderivative of the model with respect to `state_var`, for `query_integral`.
+
+        Only differences between its values at the same values of the other state
+        variables are meaningful.
+        """
+        raise NotImplementedError('{:s} models do not support integrals.'.format(self.representation))
+
+    def _chain_log_scale(self, k, derivative, column):
+        """Convert a derivative with respect to the interpolation scale of state variable `k`
+        to a derivative with respect to the state variable, given the query points `column`
+        in the interpolation scale."""
+        if getattr(self, '_state_vars_interp_scales', ['linear'] * len(self.state_vars))[k] == 'log':
+            # d/dx = d/d(log x) / x
+            return derivative / np.exp(column)
+        return derivative
+
+    def _query_grid(self, axes):
+        """Query the model at every point of the grid with `axes`, as an array of shape (n_0, n_1, ...)."""
+        grid = np.meshgrid(*axes, indexing='ij')
+        return np.asarray(self.query_value(dict(zip(self.state_vars, grid))), dtype=np.double)
 
     def __str__(self):
         state_var_str = ', '.join(self.state_vars)
@@ -157,16 +690,130 @@ class VariationWithState:
 
 
 class VariationWithStateTable(VariationWithState):
-    """A material property's variation with state, represented as a table."""
+    """
+    A material property's variation with state, represented as a table.
+
+    Arguments:
+        interp_points (ndarray): interpolation points.
+        interp_values (ndarray): interpolation values.
+        state_vars_interp_scales (list of string): Interpolation scale for each state
+            variable. Should be 'log' or 'linear'.
+        dtype: Floating point type in which the table is stored. `np.float32` halves
+            the table's memory, at the cost of rounding the points and values to about
+            7 significant figures. The interpolation is still done in double precision.
+
+    Other arguments are the same as for `VariationWithState`.
+
+    """
 
     def __init__(self, state_vars, state_vars_units, value_type, reference,
-                 interp_points, interp_values, state_vars_interp_scales):
+                 interp_points, interp_values, state_vars_interp_scales, dtype=np.double):
         VariationWithState.__init__(self, 'table', state_vars, state_vars_units, value_type, reference)
-        self._interp_points = interp_points
-        self._interp_values = interp_values
+        self._interp_points = np.asarray(interp_points, dtype=dtype)
+        self._interp_values = np.asarray(interp_values, dtype=dtype)
         self._state_vars_interp_scales = state_vars_interp_scales
+        # Interpolators are built on first use and cached, keyed by (method, rescale).
+        self._interpolators = {}
+        # Cumulative integrals of the table, built on first use by `_get_cumulative`.
+        self._cumulative = None
+
+    @property
+    def nbytes(self):
+        """Memory used by the table's points and values, in bytes."""
+        return self._interp_points.nbytes + self._interp_values.nbytes
+
+    def astype(self, dtype):
+        """Get a copy of the table, stored in floating point type `dtype`."""
+        return VariationWithStateTable(
+            self.state_vars, self.state_vars_units, self.value_type, self.reference,
+            self._interp_points, self._interp_values, self._state_vars_interp_scales, dtype=dtype)
+
+    def __getstate__(self):
+        # The interpolators are re-built on first use, rather than pickled.
+        state = self.__dict__.copy()
+        state['_interpolators'] = {}
+        return state
+
+    def _get_interpolator(self, method, rescale):
+        """Get the interpolator for `method` and `rescale`, building it if needed."""
+        key = (method, rescale)
+        if key not in self._interpolators:
+            # If several threads build the same interpolator at once, they all use the first one.
+            self._interpolators.setdefault(key, _build_interpolator(
+                self._interp_points, self._interp_values, method, rescale))
+        return self._interpolators[key]
 
-    def query_value(self, state, method='linear', fill_value=np.nan, rescale=True):
+    def _get_query_points(self, state):
+        """
+        Form the arrays of points at which to query the interpolation.
+
+        The state arrays are only read: they are not copied (unless they need to be
+        converted to float) or modified.
+
+        Arguments:
+            state (dict): The state at which to query the values, see `query_value`.
+
+        Returns:
+            list of ndarray: query points for each state variable, in the same (possibly log)
+                scales as `self._interp_points`. The arrays are broadcast against each other,
+                and are at least 1d.
+            tuple: The shape of the query, () if `state` is a single (scalar) state.
+
+        """
+        # Check that all the state variables have been provided in `state`.
+        for var_name in self.state_vars:
+            if var_name not in state.keys():
+                raise ValueError('{:s} not provided for query'.format(var_name))
+
+        # If one of the state variables is interpolated on a log scale,
+        # take its log in the query.
+        columns = []
+        for var_name, scale in zip(self.state_vars, self._state_vars_interp_scales):
+            if scale == 'log' and isinstance(state, PreparedState):
+                columns.append(state.log(var_name))
+            elif scale == 'log':
+                columns.append(np.log(np.asarray(state[var_name], dtype=np.double)))
+            else:
+                columns.append(np.asarray(state[var_name], dtype=np.double))
+
+        # Handle cases with array and scalar states by broadcasting the scalar states
+        # (without copying them) to the shape of the array states.
+        try:
+            columns = np.broadcast_arrays(*columns)
+        except ValueError as exc:
+            raise ValueError('Query arrays must be of equal length for each state.') from exc
+        shape = columns[0].shape
+        columns = [np.atleast_1d(column) for column in columns]
+        return columns, shape
+
+    def _interpolate(self, columns, method, rescale, out=None):
+        """
+        Interpolate the table at the query points. Out-of-domain points give NaN.
+
+        Arguments:
+            columns (list of ndarray): query points for each state variable,
+                see `_get_query_points`.
+            method (string): Interpolation method.
+            rescale (bool): Rescale points to a unit cube before interpolating.
+            out (ndarray): If given, the values are written into this array.
+
+        Returns:
+            ndarray: values at the query points, with the same shape as the columns.
+
+        """
+        interpolator = self._get_interpolator(method, rescale)
+        if len(columns) == 1:
+            values = interpolator(columns[0])
+        else:
+            # The scattered-data interpolators need an (n, ndim) array of points.
+            query_points = np.stack([np.ravel(column) for column in columns], axis=-1)
+            values = interpolator(query_points).reshape(columns[0].shape)
+        if out is None:
+            return values
+        np.copyto(out, values)
+        return out
+
+    def query_value(self, state, method='linear', fill_value=np.nan, rescale=True, *, out=None):
         """
         Query the value of the property at a particular state.
 
@@ -179,67 +826,116 @@ class VariationWithStateTable(VariationWithState):
                     \t`state={'s1': 0, 's2': [1, 2, 3]}`\n
                     \tand\n
                     \t`state={'s1': [5, 6, 7], 's2': [1, 2, 3]}`\n
-                are all valid.
+                are all valid. The state arrays are not copied or modified,
+                so they may be read-only.
+
+            `method`, `fill_value`, and `rescale`: have the same meaning as in
+                `scipy.interpolate.griddata`. The interpolator for each `method` and
+                `rescale` is built once, on the first query, and re-used afterwards.
 
-            `method`, `fill_value`, and `rescale`: are passed through to `scipy.interpolate.griddata`.
+            out (ndarray): Optional float array, with the same shape as the query,
+                into which the values are written. Re-using an output array avoids
+                allocating a new result array on each query.
 
         Returns:
             scalar or array: value(s) of the property at the provided state(s).
+                If `out` is given, returns `out`.
 
         """
-        # Check that all the state variables have been provided in `state`.
-        for var_name in self.state_vars:
-            if var_name not in state.keys():
-                raise ValueError('{:s} not provided for query'.format(var_name))
+        columns, shape = self._get_query_points(state)
+        if out is not None and out.shape != shape:
+            raise ValueError('out has shape {}, but the query has shape {}'.format(
+                out.shape, shape))
+        # Let the interpolation write directly into `out`. For scalar queries,
+        # the interpolation needs a 1d view of `out`.
+        values = self._interpolate(
+            columns, method, rescale, out=None if out is None else out.reshape(columns[0].shape))
+        if not np.isnan(fill_value):
+            np.copyto(values, fill_value, where=np.isnan(values))
+        if out is not None:
+            return out
+        values = values.reshape(shape)
+        if shape == ():
+            return values[()]
+        return values
 
-        # Copy the state argument - we might need to mutate it.
-        state = copy.deepcopy(state)
+    def query_derivative(self, state, state_var):
+        """
+        Query the value of the table, and its derivative with respect to a state variable.
 
-        # Form an array of points at which to query the interpolation.
-        is_state_scalar = True
-        if len(self.state_vars) == 1:
-            query_points = np.array(state[self.state_vars[0]])
-            if np.ndim(query_points) > 0:
-                is_state_scalar = False
-            if self._state_vars_interp_scales[0] == 'log':
-                query_points = np.log(query_points)
-        elif len(self.state_vars) == 2:
-            # Handle cases with 1 array and 1 scalar state
-            # by using `np.full_like` to convert the scalar state to an array
-            if np.ndim(state[self.state_vars[0]]) > 0 \
-                    and np.ndim(state[self.state_vars[1]]) == 0:
-                state[self.state_vars[1]] = np.full_like(
-                    state[self.state_vars[0]], state[self.state_vars[1]])
-            if np.ndim(state[self.state_vars[0]]) == 0 \
-                    and np.ndim(state[self.state_vars[1]]) > 0:
-                state[self.state_vars[0]] = np.full_like(
-                    state[self.state_vars[1]], state[self.state_vars[0]])
-            # Handle case where both state queries are arrays
-            # This is intentionally *not* an `elif` - the above cases should
-            # flow into this.
-            if np.ndim(state[self.state_vars[0]]) > 0 \
-                    and np.ndim(state[self.state_vars[1]]) > 0:
-                if len(state[self.state_vars[0]]) != len(state[self.state_vars[1]]):
-                    raise ValueError('Query arrays must be of equal length for each state.')
-                is_state_scalar = False
-                query_points = np.stack(
-                    (state[self.state_vars[0]], state[self.state_vars[1]]), axis=1)
-            # Handle case where both state queries are scalars
-            else:
-                query_points = np.array([[state[self.state_vars[0]], state[self.state_vars[1]]]])
+        Linear interpolation is piecewise-linear (in the interpolation scales), so the
+        derivative is the exact slope of the table segment containing each query point.
+        At a table point, the slope of the segment above it is used.
 
-            # If one of the state variables is interpolated on a log scale,
-            # take its log in the query.
-            for j in range(len(self.state_vars)):
-                if self._state_vars_interp_scales[j] == 'log':
-                    query_points[:, j] = np.log(query_points[:, j])
+        Arguments:
+            state (dict): The state at which to query the values, see `query_value`.
+            state_var (string): Name of the state variable to differentiate with respect to.
 
-        values = scipy.interpolate.griddata(self._interp_points, self._interp_values,
-                                            query_points,
-                                            method=method, fill_value=fill_value, rescale=rescale)
-        if is_state_scalar and np.ndim(values) > 0:
-            return values[0]
-        return values
+        Returns:
+            See `VariationWithState.query_derivative`. Out-of-domain points give NaN.
+
+        """
+        if state_var not in self.state_vars:
+            raise ValueError('{:s} is not a state variable of this model.'.format(state_var))
+        columns, shape = self._get_query_points(state)
+        values, derivatives = self._interpolate_with_slope(columns, self.state_vars.index(state_var))
+        if shape == ():
+            return values[0], derivatives[0]
+        return values.reshape(shape), derivatives.reshape(shape)
+
+    def _interpolate_with_slope(self, columns, k):
+        """Linearly interpolate the table, and its slope with respect to state variable `k`,
+        at the query points `columns` (see `_get_query_points`)."""
+        if len(self.state_vars) != 1:
+            raise NotImplementedError('Derivatives of scattered-data tables are not supported.')
+        order = np.argsort(self._interp_points)
+        values, slopes = _interp_with_slope(
+            columns[0], np.asarray(self._interp_points[order], dtype=np.double),
+            np.asarray(self._interp_values[order], dtype=np.double))
+        return values, self._chain_log_scale(k, slopes, columns[k])
+
+    def _get_cumulative(self):
+        """Get the table's points in ascending order, the values, and the cumulative integral
+        of the values (with respect to the state variable) at each point.
+
+        The cumulative integral is computed on first use, in one pass over the table.
+        """
+        if self._cumulative is None:
+            if len(self.state_vars) != 1:
+                raise NotImplementedError('Integrals of scattered-data tables are not supported.')
+            order = np.argsort(self._interp_points)
+            points = np.asarray(self._interp_points[order], dtype=np.double)
+            values = np.asarray(self._interp_values[order], dtype=np.double)
+            cumulative = np.zeros(len(points))
+            np.cumsum(_segment_integral(points[:-1], np.diff(points), values[:-1], values[1:], 1.,
+                                        self._state_vars_interp_scales[0] == 'log'),
+                      out=cumulative[1:])
+            self._cumulative = (points, values, cumulative)
+        return self._cumulative
+
+    def _antiderivative(self, state, state_var):
+        """Evaluate the integral of the table from the start of its domain, see
+        `VariationWithState._antiderivative`. Costs one binary search per point."""
+        columns, shape = self._get_query_points(state)
+        points, values, cumulative = self._get_cumulative()
+        query = columns[0]
+        index = np.clip(np.searchsorted(points, query, side='right') - 1, 0, len(points) - 2)
+        width = points[index + 1] - points[index]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = cumulative[index] + _segment_integral(
+                points[index], width, values[index], values[index + 1],
+                (query - points[index]) / width, self._state_vars_interp_scales[0] == 'log')
+        result = np.where((query >= points[0]) & (query <= points[-1]), result, np.nan)
+        return result[0] if shape == () else result.reshape(shape)
+
+    def _inverse_axis(self, k, num_points):
+        """Get the points at which `query_state` samples state variable `k`, see `VariationWithState`.
+
+        1d tables are linear between their points.
+        """
+        if len(self.state_vars) == 1:
+            return np.unique(np.asarray(self._interp_points, dtype=np.double)), True
+        return VariationWithState._inverse_axis(self, k, num_points)
 
     def get_state_domain(self):
         """
@@ -273,6 +969,339 @@ class VariationWithStateTable(VariationWithState):
         return result
 
 
+class VariationWithStateSlicedTable(VariationWithStateTable):
+    """
+    A material property's variation with two state variables, represented as a stack of 1d tables.
+
+    Each slice of the table is a 1d table in the second state variable, at a fixed value of
+    the first state variable (e.g. a strength vs. temperature curve for one exposure time).
+    A linear query brackets the first state variable with a binary search, interpolates
+    within the two neighbouring slices (one binary search over all of the slices), and
+    blends the results. This needs no triangulation, and costs O(log n) per query point.
+    Other interpolation methods fall back to scattered-data interpolation over all points.
+
+    If the slices are ragged (do not all cover the same range of the second state
+    variable), a query which one of its neighbouring slices does not cover also falls
+    back to scattered-data interpolation, so that the table covers the same points as
+    a `VariationWithStateTable`. `get_state_domain` reports the bounding box of the
+    table, so some points in the domain may still give NaN. Derivatives and integrals
+    are only given where both neighbouring slices cover the query, and are NaN elsewhere.
+
+    Arguments:
+        interp_points (ndarray): interpolation points, shape (n, 2), ordered slice by slice.
+        interp_values (ndarray): interpolation values, shape (n,).
+        state_vars_interp_scales (list of string): Interpolation scale for each state
+            variable. Should be 'log' or 'linear'.
+        slice_offsets (array of int): Index of the first point of each slice in `interp_points`,
+            followed by the total number of points. If None, the slices are found from
+            changes in the first state variable.
+        slice_keys (ndarray): The search keys of the table's points, which are computed
+            from the table if None. A table built from the same (sorted) points and
+            offsets can pass them (e.g. from a memory-mapped file, see
+            `materials.mapped_database`), rather than allocating its own.
+
+    Other arguments are the same as for `VariationWithStateTable`.
+
+    """
+
+    def __init__(self, state_vars, state_vars_units, value_type, reference,
+                 interp_points, interp_values, state_vars_interp_scales, slice_offsets=None,
+                 dtype=np.double, slice_keys=None):
+        if len(state_vars) != 2:
+            raise ValueError('A sliced table must have exactly two state variables.')
+        interp_points = np.asarray(interp_points, dtype=dtype)
+        interp_values = np.asarray(interp_values, dtype=dtype)
+        if slice_offsets is None:
+            slice_offsets = np.concatenate((
+                [0], np.flatnonzero(np.diff(interp_points[:, 0])) + 1, [len(interp_points)]))
+        slice_offsets = np.asarray(slice_offsets, dtype=np.intp)
+        # The binary searches within each slice need the slice to be in ascending order.
+        unsorted = [(start, stop) for start, stop in zip(slice_offsets[:-1], slice_offsets[1:])
+                    if np.any(np.diff(interp_points[start:stop, 1]) < 0)]
+        if unsorted:
+            # Sort copies of the arrays, rather than the caller's arrays.
+            interp_points = interp_points.copy()
+            interp_values = interp_values.copy()
+        for start, stop in unsorted:
+            order = np.argsort(interp_points[start:stop, 1], kind='stable')
+            interp_points[start:stop] = interp_points[start:stop][order]
+            interp_values[start:stop] = interp_values[start:stop][order]
+        VariationWithStateTable.__init__(
+            self, state_vars, state_vars_units, value_type, reference,
+            interp_points, interp_values, state_vars_interp_scales, dtype=dtype)
+        self._slice_offsets = slice_offsets
+        self._slice_points = interp_points[slice_offsets[:-1], 0]
+        if np.any(np.diff(self._slice_points) <= 0):
+            raise ValueError('Slices must be in strictly ascending order of {:s}.'.format(
+                state_vars[0]))
+        # Search keys for all of the slices at once: the slice index, plus the second state
+        # variable mapped into [0, 0.5]. The keys are in ascending order, so one binary search
+        # finds the segment of a query point within any slice.
+        points_1 = interp_points[:, 1]
+        self._range_1 = (float(points_1.min()), float(points_1.max())) if len(points_1) else (0., 0.)
+        self._key_origin = self._range_1[0]
+        key_range = self._range_1[1] - self._range_1[0]
+        self._key_scale = 0.5 / key_range if key_range > 0 else 0.
+        if slice_keys is None:
+            slice_keys = self._slice_key(
+                np.repeat(np.arange(len(self._slice_points)), np.diff(slice_offsets)),
+                np.asarray(points_1, dtype=np.double))
+        elif len(slice_keys) != len(interp_points):
+            raise ValueError('slice_keys must have one key for each point of the table.')
+        self._slice_keys = slice_keys
+
+    def get_state_domain(self):
+        """
+        Get the domain over which the property's variation with state model is valid.
+
+        Returns:
+            dict: the bounding box of the table, see `VariationWithStateTable.get_state_domain`.
+                The slices may be ragged, so it spans the widest range of the second
+                state variable over all of the slices.
+
+        """
+        bounds = [(self._slice_points[0], self._slice_points[-1]), self._range_1]
+        result = {}
+        for name, (smin, smax), scale in zip(self.state_vars, bounds, self._state_vars_interp_scales):
+            if scale == 'log':
+                smin = np.exp(smin)
+                smax = np.exp(smax)
+            result[name] = (smin, smax)
+        return result
+
+    def astype(self, dtype):
+        """Get a copy of the table, stored in floating point type `dtype`."""
+        return VariationWithStateSlicedTable(
+            self.state_vars, self.state_vars_units, self.value_type, self.reference,
+            self._interp_points, self._interp_values, self._state_vars_interp_scales,
+            slice_offsets=self._slice_offsets, dtype=dtype)
+
+    def _inverse_axis(self, k, num_points):
+        """Get the points at which `query_state` samples state variable `k`, see `VariationWithState`.
+
+        Between the slices, and between the points of all of the slices in the second state
+        variable, a linear query is linear in each state variable.
+        """
+        if k == 0:
+            return np.asarray(self._slice_points, dtype=np.double), True
+        return np.unique(np.asarray(self._interp_points[:, 1], dtype=np.double)), True
+
+    def _get_cumulative(self):
+        """Get the cumulative integral of each slice with respect to the second state variable,
+        from the start of the slice, at each point of the table."""
+        if self._cumulative is None:
+            points = np.asarray(self._interp_points[:, 1], dtype=np.double)
+            values = np.asarray(self._interp_values, dtype=np.double)
+            # The segments between the end of one slice and the start of the next are not used.
+            with np.errstate(divide='ignore', invalid='ignore'):
+                segments = _segment_integral(points[:-1], np.diff(points), values[:-1], values[1:], 1.,
+                                             self._state_vars_interp_scales[1] == 'log')
+            cumulative = np.zeros(len(points))
+            for start, stop in zip(self._slice_offsets[:-1], self._slice_offsets[1:]):
+                np.cumsum(segments[start:stop - 1], out=cumulative[start + 1:stop])
+            self._cumulative = cumulative
+        return self._cumulative
+
+    def _antiderivative(self, state, state_var):
+        """Evaluate an antiderivative of the table with respect to the second state variable,
+        see `VariationWithState._antiderivative`.
+
+        The antiderivative of each slice, from the start of the slice, is blended in the
+        same way as the values, so differences at the same value of the first state
+        variable are exact. Costs two binary searches per point.
+        """
+        if state_var != self.state_vars[1]:
+            raise NotImplementedError('Sliced tables can only be integrated over {:s}.'.format(
+                self.state_vars[1]))
+        columns, shape = self._get_query_points(state)
+        query_0, query_1 = columns
+        cumulative = self._get_cumulative()
+        lower, upper, weight, _ = self._bracket_slices(query_0)
+        # Integrate within the lower and upper slices together.
+        query_1 = np.concatenate((query_1, query_1))
+        segment, segment_stop, inside = self._locate_in_slices(np.concatenate((lower, upper)), query_1)
+        point_start = np.asarray(self._interp_points[segment, 1], dtype=np.double)
+        width = self._interp_points[segment_stop, 1] - point_start
+        values = np.asarray(self._interp_values, dtype=np.double)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            integrals = cumulative[segment] + _segment_integral(
+                point_start, width, values[segment], values[segment_stop],
+                (query_1 - point_start) / width, self._state_vars_interp_scales[1] == 'log')
+        # A slice with a single point has no integral.
+        integrals[width == 0] = 0.
+        integrals[~inside] = np.nan
+        integrals = integrals[:len(lower)], integrals[len(lower):]
+        with np.errstate(invalid='ignore'):
+            result = np.where(weight == 0., integrals[0], np.where(
+                weight == 1., integrals[1], integrals[0] + weight * (integrals[1] - integrals[0])))
+        result = np.where((weight >= 0.) & (weight <= 1.), result, np.nan)
+        return result[0] if shape == () else result.reshape(shape)
+
+    def _get_slice(self, i):
+        """Get the points (in the second state variable) and values of slice `i`."""
+        start, stop = self._slice_offsets[i], self._slice_offsets[i + 1]
+        return self._interp_points[start:stop, 1], self._interp_values[start:stop]
+
+    def _interpolate(self, columns, method, rescale, out=None):
+        """Interpolate the table at the query points, see `VariationWithStateTable._interpolate`."""
+        if method != 'linear':
+            return VariationWithStateTable._interpolate(self, columns, method, rescale, out)
+        query_0, query_1 = columns
+        if out is None:
+            out = np.empty(query_0.shape)
+        if out.size == 1:
+            out[...] = self._interpolate_point(float(query_0[0]), float(query_1[0]))
+            if not np.isnan(out[0]):
+                return out
+        lower, upper, weight, _ = self._bracket_slices(query_0)
+        values_lower, values_upper = self._query_slices(lower, upper, query_1)
+
+        # Blend the slices. Queries which lie exactly on a slice only need that slice.
+        np.subtract(values_upper, values_lower, out=out)
+        out *= weight
+        out += values_lower
+        np.copyto(out, values_lower, where=weight == 0.)
+        np.copyto(out, values_upper, where=weight == 1.)
+        in_range = (weight >= 0.) & (weight <= 1.)
+        np.copyto(out, np.nan, where=~in_range)
+
+        # Where a neighbouring slice does not cover the query (between ragged slices), fall
+        # back to scattered-data interpolation, so that these points are not lost from the domain.
+        gaps = np.isnan(out) & in_range & (query_1 >= self._range_1[0]) & (query_1 <= self._range_1[1])
+        if np.any(gaps):
+            out[gaps] = VariationWithStateTable._interpolate(
+                self, [query_0[gaps], query_1[gaps]], method, rescale)
+        return out
+
+    def _interpolate_point(self, query_0, query_1):
+        """Linearly interpolate the table at a single point, without the overhead of array
+        operations. Gives NaN where the vectorized path of `_interpolate` is needed."""
+        slice_points = self._slice_points
+        n_slices = len(slice_points)
+        lower = min(max(int(slice_points.searchsorted(query_0, side='right')) - 1, 0),
+                    max(n_slices - 2, 0))
+        upper = min(lower + 1, n_slices - 1)
+        start = float(slice_points[lower])
+        span = float(slice_points[upper]) - start
+        if span > 0:
+            weight = (query_0 - start) / span
+        else:
+            weight = 0. if query_0 == start else np.nan
+        if not 0. <= weight <= 1.:
+            return np.nan
+        value = self._interp_slice(lower, query_1) if weight < 1. else 0.
+        if weight > 0.:
+            value_upper = self._interp_slice(upper, query_1)
+            value = value_upper if weight == 1. else value + weight * (value_upper - value)
+        return value
+
+    def _interp_slice(self, i, query_1):
+        """Linearly interpolate slice `i` at a single value of the second state variable."""
+        slice_points, slice_values = self._get_slice(i)
+        return float(np.interp(query_1, slice_points, slice_values, left=np.nan, right=np.nan))
+
+    def _bracket_slices(self, query_0):
+        """Bracket the first state variable of the query points between a lower and upper slice.
+
+        Returns:
+            ndarray of int: index of the lower slice.
+            ndarray of int: index of the upper slice.
+            ndarray: weight of the upper slice, in [0, 1] within the table's domain.
+            ndarray: distance between the lower and upper slices, in the interpolation scale.
+        """
+        n_slices = len(self._slice_points)
+        lower = np.clip(np.searchsorted(self._slice_points, query_0, side='right') - 1,
+                        0, max(n_slices - 2, 0))
+        upper = np.minimum(lower + 1, n_slices - 1)
+        span = self._slice_points[upper] - self._slice_points[lower]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = np.where(
+                span > 0, (query_0 - self._slice_points[lower]) / span,
+                np.where(query_0 == self._slice_points[lower], 0., np.nan))
+        return lower, upper, weight, span
+
+    def _slice_key(self, index, query_1):
+        """Map slice indices and values of the second state variable to search keys."""
+        fraction = (query_1 - self._key_origin) * self._key_scale
+        return index + np.minimum(np.maximum(fraction, 0.), 0.5)
+
+    def _locate_in_slices(self, index, query_1):
+        """Find the segment of slice `index` which contains each query point, with one
+        binary search over all of the slices.
+
+        Returns:
+            ndarray of int: index (in the table) of the point at the start of the segment.
+            ndarray of int: index of the point at the end of the segment. For a slice
+                with a single point, this is the same point.
+            ndarray of bool: whether the query point lies within the slice.
+        """
+        start = self._slice_offsets[index]
+        stop = self._slice_offsets[index + 1]
+        segment = self._slice_keys.searchsorted(self._slice_key(index, query_1), side='right') - 1
+        segment = np.maximum(np.minimum(segment, stop - 2), start)
+        segment_stop = np.minimum(segment + 1, stop - 1)
+        points_1 = self._interp_points[:, 1]
+        inside = (query_1 >= points_1[start]) & (query_1 <= points_1[stop - 1])
+        return segment, segment_stop, inside
+
+    def _query_slices(self, lower, upper, query_1, slopes=False):
+        """Interpolate within the lower and upper slice of each query point.
+
+        Returns:
+            ndarray: values in the lower slice, and in the upper slice.
+            If `slopes`, also the slopes (with respect to the second state variable, in its
+            interpolation scale) in the lower and upper slices.
+        """
+        # Search the lower and upper slices together.
+        query_1 = np.concatenate((query_1, query_1))
+        segment, segment_stop, inside = self._locate_in_slices(np.concatenate((lower, upper)), query_1)
+        point_start = self._interp_points[segment, 1]
+        point_stop = self._interp_points[segment_stop, 1]
+        value_start = self._interp_values[segment]
+        value_stop = self._interp_values[segment_stop]
+        width = point_stop - point_start
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.asarray(value_stop - value_start, dtype=np.double) / width
+            values = value_start + (query_1 - point_start) * slope
+        # Points of the slices give their values exactly, and a slice with a single point
+        # has a value only at that point.
+        np.copyto(values, value_start, where=(query_1 == point_start) | (width == 0))
+        np.copyto(values, value_stop, where=query_1 == point_stop)
+        values[~inside] = np.nan
+        half = len(lower)
+        if not slopes:
+            return values[:half], values[half:]
+        slope[~inside] = np.nan
+        return values[:half], values[half:], slope[:half], slope[half:]
+
+    def _interpolate_with_slope(self, columns, k):
+        """Linearly interpolate the table, and its slope with respect to state variable `k`,
+        see `VariationWithStateTable._interpolate_with_slope`.
+
+        Between two slices, the value is linear in the first state variable; within the
+        segments of the slices, it is linear in the second state variable.
+        """
+        query_0, query_1 = columns
+        lower, upper, weight, span = self._bracket_slices(query_0)
+        values_lower, values_upper, slopes_lower, slopes_upper = self._query_slices(
+            lower, upper, query_1, slopes=True)
+        on_lower = weight == 0.
+        on_upper = weight == 1.
+        with np.errstate(invalid='ignore'):
+            values = np.where(on_lower, values_lower, np.where(
+                on_upper, values_upper, values_lower + weight * (values_upper - values_lower)))
+            if k == 0:
+                with np.errstate(divide='ignore'):
+                    slopes = (values_upper - values_lower) / span
+            else:
+                slopes = np.where(on_lower, slopes_lower, np.where(
+                    on_upper, slopes_upper, slopes_lower + weight * (slopes_upper - slopes_lower)))
+        outside = ~((weight >= 0.) & (weight <= 1.)) | np.isnan(values)
+        values = np.where(outside, np.nan, values)
+        slopes = np.where(outside, np.nan, slopes)
+        return values, self._chain_log_scale(k, slopes, columns[k])
+
+
 class VariationWithStateEquation(VariationWithState):
     """
     A material property's variation with state, represented as an equation.
@@ -291,20 +1320,22 @@ class VariationWithStateEquation(VariationWithState):
         state_domain (dict): each key is the name of a state variable.
             Values are tuples \'(smin, smax)\' where \'smin\' is the minimum bound
             of the valid domain in that state variable and \'smax\' is the maximum bound.
+        compiled (bool): If True, compile the expression into a vectorized python function
+            (see `materials.compiled_expression`), which is much faster than asteval on
+            large arrays. Expressions which cannot be compiled safely are run by asteval.
 
     """
 
     def __init__(self, state_vars, state_vars_units, value_type, reference,
-                 expression, state_domain):
+                 expression, state_domain, compiled=True):
         VariationWithState.__init__(self, 'equation', state_vars, state_vars_units, value_type, reference)
-        # Create an asteval Procedure which evaluates the `expression`
         if 'value' not in expression:
             raise ValueError('`expression` must set value equal to a function of the state varaibles.')
-        aeval = asteval.Interpreter()
-        args_str = ', '.join(state_vars)
-        func_str = 'def f({:s}):\n    {:s}\n    return value'.format(args_str, expression)
-        aeval(func_str)
-        self.procedure = aeval('f')
+        self.expression = expression
+        # asteval procedures keep their state in the interpreter, so each thread has its own.
+        self._thread_local = threading.local()
+        self._compiled = compiled
+        self._compile()
 
         # Check that `state_domain` provides a valid domain for each state.
         for name in state_vars:
@@ -313,7 +1344,53 @@ class VariationWithStateEquation(VariationWithState):
                                  + ' have a domain for state {:s}'.format(name))
         self.state_domain = state_domain
 
-    def query_value(self, state):
+    def _compile(self):
+        """Set `compiled_procedure`, the compiled version of `expression`, or None if it is run by asteval."""
+        # Compiled derivatives of `expression`, keyed by state variable, built on first use.
+        self._derivative_procedures = {}
+        # Tabulated antiderivatives of `expression`, keyed by state variable, built on first use.
+        self._antiderivatives = {}
+        self.compiled_procedure = None
+        if self._compiled:
+            try:
+                self.compiled_procedure = compile_expression(self.expression, self.state_vars)
+            except (ValueError, SyntaxError):
+                pass
+
+    def __getstate__(self):
+        # Compiled functions and asteval procedures cannot be pickled, they are re-created instead.
+        state = self.__dict__.copy()
+        del state['compiled_procedure']
+        del state['_derivative_procedures']
+        del state['_antiderivatives']
+        del state['_thread_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._thread_local = threading.local()
+        self._compile()
+
+    @property
+    def procedure(self):
+        """An asteval Procedure which evaluates the `expression`.
+
+        It is created the first time it is used, as importing and running asteval
+        is slow, and compiled expressions do not need it. An asteval interpreter
+        is not thread-safe, so each thread gets its own procedure.
+        """
+        procedure = getattr(self._thread_local, 'procedure', None)
+        if procedure is None:
+            import asteval  # pylint: disable=import-outside-toplevel
+            aeval = asteval.Interpreter()
+            args_str = ', '.join(self.state_vars)
+            func_str = 'def f({:s}):\n    {:s}\n    return value'.format(args_str, self.expression)
+            aeval(func_str)
+            procedure = aeval('f')
+            self._thread_local.procedure = procedure
+        return procedure
+
+    def query_value(self, state, *, out=None):
         """
         Query the value of the property at a particular state.
 
@@ -327,9 +1404,12 @@ class VariationWithStateEquation(VariationWithState):
                     \tand\n
                     \t`state={'s1': np.array([5, 6, 7]), 's2': np.array([1, 2, 3])}`\n
                 are all valid.
+            out (ndarray): Optional float array, with the same shape as the query,
+                into which the values are written.
 
         Returns:
             scalar or array: value(s) of the property at the provided state(s).
+                If `out` is given, returns `out`.
 
         """
 
@@ -338,11 +1418,164 @@ class VariationWithStateEquation(VariationWithState):
             if var_name not in state.keys():
                 raise ValueError('{:s} not provided for query'.format(var_name))
 
-        if not self.is_state_in_domain(state):
-            return np.nan
+        # Evaluate the expression with numpy floats, so that every query (e.g. of lists) is
+        # evaluated the same way, and points where the expression is undefined (e.g. divide
+        # by zero) give NaN or inf rather than raising.
+        state = {var_name: np.asarray(state[var_name], dtype=np.double) for var_name in self.state_vars}
+        shape = np.broadcast_shapes(*[value.shape for value in state.values()])
+        if out is not None and out.shape != shape:
+            raise ValueError('out has shape {}, but the query has shape {}'.format(
+                out.shape, shape))
 
-        result = self.procedure(**state)
-        return result
+        # Evaluate the expression at every point, then set the points which are
+        # outside of the domain to NaN.
+        in_domain = self.get_domain_mask(state)
+        all_in_domain = bool(np.all(in_domain))
+        procedure = self.compiled_procedure if self.compiled_procedure is not None else self.procedure
+        if all_in_domain:
+            result = procedure(**state)
+        else:
+            with np.errstate(all='ignore'):
+                result = procedure(**state)
+        if out is None and all_in_domain:
+            result = np.asarray(result, dtype=np.double)
+            if result.shape != shape or any(result is value for value in state.values()):
+                # e.g. a constant expression, which does not depend on the query's shape, or
+                # `value = temperature`, which would return the caller's array.
+                result = np.array(np.broadcast_to(result, shape))
+            return result[()] if shape == () else result
+        values = np.empty(shape) if out is None else out
+        np.copyto(values, result)
+        np.copyto(values, np.nan, where=np.logical_not(in_domain))
+        if out is None and shape == ():
+            return values[()]
+        return values
+
+    def query_derivative(self, state, state_var):
+        """
+        Query the value of the equation, and its derivative with respect to a state variable.
+
+        The derivative is found by automatic differentiation of the expression (see
+        `materials.compiled_expression.compile_derivative`), so the value and derivative
+        are computed together, in one vectorized pass.
+
+        Arguments:
+            state (dict): The state at which to query the values, see `query_value`.
+            state_var (string): Name of the state variable to differentiate with respect to.
+
+        Returns:
+            See `VariationWithState.query_derivative`. Out-of-domain points give NaN.
+
+        Raises:
+            ValueError: if the expression cannot be compiled (see `compile_expression`).
+
+        """
+        for var_name in self.state_vars:
+            if var_name not in state.keys():
+                raise ValueError('{:s} not provided for query'.format(var_name))
+        if state_var not in self._derivative_procedures:
+            # If several threads compile the same derivative at once, they all use the first one.
+            self._derivative_procedures.setdefault(
+                state_var, compile_derivative(self.expression, self.state_vars, state_var))
+        procedure = self._derivative_procedures[state_var]
+
+        state = {var_name: np.asarray(state[var_name], dtype=np.double) for var_name in self.state_vars}
+        shape = np.broadcast_shapes(*[value.shape for value in state.values()])
+        in_domain = self.get_domain_mask(state)
+        with np.errstate(all='ignore'):
+            values, derivatives = procedure(**state)
+        values = np.where(in_domain, np.broadcast_to(values, shape), np.nan)
+        derivatives = np.where(in_domain, np.broadcast_to(derivatives, shape), np.nan)
+        if shape == ():
+            return values[()], derivatives[()]
+        return values, derivatives
+
+    def query_integral(self, lower, upper, state_var, state=None, num_points=1025):
+        """
+        Integrate the equation with respect to a state variable, with the other state variables fixed.
+
+        For an equation of one state variable, the antiderivative is tabulated once, at
+        `num_points` points across the domain, by Gauss-Legendre quadrature, and cached.
+        Each integral then costs two lookups, which interpolate the antiderivative with
+        cubic Hermite polynomials (using the equation's values as its slopes). For
+        equations of several state variables, each integral is evaluated directly by
+        Gauss-Legendre quadrature.
+
+        Arguments:
+            num_points (int): Number of points in a tabulated antiderivative.
+
+        Other arguments and the return value are the same as for
+        `VariationWithState.query_integral`.
+
+        """
+        if state_var not in self.state_vars:
+            raise ValueError('{:s} is not a state variable of this model.'.format(state_var))
+        if len(self.state_vars) > 1:
+            return self._quadrature(lower, upper, state_var, state)
+        key = (state_var, num_points)
+        if key not in self._antiderivatives:
+            # If several threads tabulate the same antiderivative at once, they all use the first one.
+            self._antiderivatives.setdefault(key, self._tabulate_antiderivative(state_var, num_points))
+        points, values, antiderivative = self._antiderivatives[key]
+
+        def lookup(x):
+            x = np.asarray(x, dtype=np.double)
+            step = points[1] - points[0]
+            index = np.clip(((x - points[0]) / step).astype(np.intp), 0, len(points) - 2)
+            t = (x - points[index]) / step
+            # Cubic Hermite interpolation between the antiderivative's points.
+            result = ((1. + 2. * t) * (1. - t)**2 * antiderivative[index]
+                      + t * (1. - t)**2 * step * values[index]
+                      + t**2 * (3. - 2. * t) * antiderivative[index + 1]
+                      - t**2 * (1. - t) * step * values[index + 1])
+            return np.where((x >= points[0]) & (x <= points[-1]), result, np.nan)
+
+        with np.errstate(invalid='ignore'):
+            result = lookup(upper) - lookup(lower)
+        return result[()] if result.shape == () else result
+
+    def _antiderivative(self, state, state_var):
+        """Evaluate the integral of the equation from the lower bound of its domain in `state_var`."""
+        smin = float(self.state_domain[state_var][0])
+        return self.query_integral(smin, state[state_var], state_var, state)
+
+    # Gauss-Legendre nodes on [0, 1] and their weights.
+    _GAUSS_NODES, _GAUSS_WEIGHTS = np.polynomial.legendre.leggauss(8)
+    _GAUSS_NODES = 0.5 * (_GAUSS_NODES + 1.)
+    _GAUSS_WEIGHTS = 0.5 * _GAUSS_WEIGHTS
+
+    def _tabulate_antiderivative(self, state_var, num_points):
+        """Tabulate the points, values and antiderivative of a one-variable equation across its domain."""
+        smin, smax = (float(x) for x in self.state_domain[state_var])
+        points = np.linspace(smin, smax, num_points)
+        step = points[1] - points[0]
+        values = np.asarray(self.query_value({state_var: points}), dtype=np.double)
+        nodes = points[:-1, np.newaxis] + step * self._GAUSS_NODES
+        panels = step * np.dot(self.query_value({state_var: nodes}), self._GAUSS_WEIGHTS)
+        antiderivative = np.zeros(num_points)
+        np.cumsum(panels, out=antiderivative[1:])
+        return points, values, antiderivative
+
+    def _quadrature(self, lower, upper, state_var, state, panels=8):
+        """Integrate the equation from `lower` to `upper` by composite Gauss-Legendre quadrature."""
+        state = {} if state is None else state
+        for var_name in self.state_vars:
+            if var_name != state_var and var_name not in state.keys():
+                raise ValueError('{:s} not provided for query'.format(var_name))
+        lower = np.asarray(lower, dtype=np.double)
+        upper = np.asarray(upper, dtype=np.double)
+        fixed = {name: np.asarray(state[name], dtype=np.double)[..., np.newaxis]
+                 for name in self.state_vars if name != state_var}
+        nodes = (np.arange(panels)[:, np.newaxis] + self._GAUSS_NODES).ravel() / panels
+        width = upper - lower
+        values = self.query_value(dict(fixed, **{
+            state_var: lower[..., np.newaxis] + width[..., np.newaxis] * nodes}))
+        result = width * np.dot(values, np.tile(self._GAUSS_WEIGHTS, panels)) / panels
+        domain = self.get_state_domain()[state_var]
+        in_domain = ((lower >= domain[0]) & (lower <= domain[1])
+                     & (upper >= domain[0]) & (upper <= domain[1]))
+        result = np.where(in_domain, result, np.nan)
+        return result[()] if result.shape == () else result
 
     def get_state_domain(self):
         """
@@ -358,8 +1591,372 @@ class VariationWithStateEquation(VariationWithState):
         return self.state_domain
 
 
-def build_from_yaml(yaml_dict):
-    """Construct a variation with state object from a YAML-derived dictionary."""
+class VariationWithStateGrid(VariationWithState):
+    """
+    A material property's variation with any number of state variables, represented as
+    a table on a rectilinear grid.
+
+    The grid is the outer product of a 1d array of points for each state variable,
+    and has a value at each grid point. A query finds its grid cell with a binary
+    search in each state variable, and then interpolates (multi)linearly between the
+    cell's corners. The cost per query point grows with log(n) in each state variable,
+    and with 2**(number of state variables).
+
+    In a YAML file, a grid has `representation: grid`, a list of points for each state
+    variable, and `values` as nested lists, with one level of nesting per state variable::
+
+        state_vars: ['temperature', 'exposure time', 'neutron dose']
+        state_vars_interp_scales: ['linear', 'log', 'log']
+        representation: grid
+        temperature: [300, 500, 700]
+        'exposure time': [0.5, 10, 100, 1000]
+        'neutron dose': [1.e+19, 1.e+20]
+        values: [[[...], ...], ...]    # shape (3, 4, 2)
+
+    Arguments:
+        state_vars (list of string): Names of the state variables.
+        state_vars_units (dict of string): Units of measure for each state variable.
+        value_type (string): Is the stored value a multiplier on the default value, or does it override the default?
+        reference (string): Bibtex tag for the source of the data.
+        grid_points (list of array): The grid points of each state variable,
+            in strictly ascending order. At least 2 points per state variable.
+        grid_values (ndarray): Values at the grid points, of shape (n_0, n_1, ...).
+        state_vars_interp_scales (list of string): 'linear' or 'log' for each state variable.
+            Defaults to 'linear'.
+        dtype: Floating point type in which the values are stored, see `VariationWithStateTable`.
+
+    """
+
+    def __init__(self, state_vars, state_vars_units, value_type, reference, grid_points,
+                 grid_values, state_vars_interp_scales=None, dtype=np.double):
+        VariationWithState.__init__(self, 'grid', state_vars, state_vars_units,
+                                    value_type, reference)
+        grid_points = [np.asarray(points, dtype=np.double) for points in grid_points]
+        grid_values = np.ascontiguousarray(grid_values, dtype=dtype)
+        if len(grid_points) != len(state_vars) or grid_values.ndim != len(state_vars):
+            raise ValueError('The grid must have one dimension per state variable.')
+        if grid_values.shape != tuple(len(points) for points in grid_points):
+            raise ValueError('The grid values have shape {}, but the grid points have shape {}'.format(
+                grid_values.shape, tuple(len(points) for points in grid_points)))
+        if min(grid_values.shape) < 2:
+            raise ValueError('The grid must have at least 2 points in each state variable.')
+        for name, points in zip(state_vars, grid_points):
+            if np.any(np.diff(points) <= 0):
+                raise ValueError('The grid points of {:s} must be in strictly ascending order.'.format(
+                    name))
+        if state_vars_interp_scales is None:
+            state_vars_interp_scales = ['linear'] * len(state_vars)
+        self._state_vars_interp_scales = state_vars_interp_scales
+        self._grid_points = grid_points
+        self._domain = [(float(points[0]), float(points[-1])) for points in grid_points]
+        # The grid points and inverse cell widths of each state variable, in its scale.
+        self._axes = [np.log(points) if scale == 'log' else points
+                      for points, scale in zip(grid_points, state_vars_interp_scales)]
+        self._inv_widths = [1. / np.diff(axis) for axis in self._axes]
+        self._grid_values = grid_values
+        # Flattened values, the offset between neighbouring grid points in each dimension,
+        # and (for 1d grids) the slope of each cell.
+        self._flat_values = grid_values.ravel()
+        self._strides = [stride // grid_values.itemsize for stride in grid_values.strides]
+        self._slopes = np.diff(grid_values) if grid_values.ndim == 1 else None
+        # Cumulative integrals along each dimension, built on first use by `_get_cumulative`.
+        self._cumulative = {}
+
+    @property
+    def nbytes(self):
+        """Memory used by the grid's points and values, in bytes."""
+        return self._grid_values.nbytes + sum(points.nbytes for points in self._grid_points)
+
+    def astype(self, dtype):
+        """Get a copy of the grid, with its values stored in floating point type `dtype`."""
+        return VariationWithStateGrid(
+            self.state_vars, self.state_vars_units, self.value_type, self.reference,
+            self._grid_points, self._grid_values, self._state_vars_interp_scales, dtype=dtype)
+
+    def _inverse_axis(self, k, num_points):
+        """Get the points at which `query_state` samples state variable `k`, see `VariationWithState`."""
+        return self._axes[k], True
+
+    def _scaled(self, k, value):
+        """Convert query points of state variable `k` to its interpolation scale."""
+        value = np.asarray(value, dtype=np.double)
+        if self._state_vars_interp_scales[k] == 'log':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                value = np.log(value)
+        return value
+
+    def _locate(self, k, value):
+        """Find the grid cells of the query points in dimension `k`.
+
+        Returns:
+            ndarray of int: cell index.
+            ndarray: fractional position within the cell, in [0, 1].
+            ndarray of bool: True where the point is outside of the grid.
+        """
+        axis = self._axes[k]
+        value = self._scaled(k, value)
+        outside = ~((value >= axis[0]) & (value <= axis[-1]))
+        index = np.clip(np.searchsorted(axis, value, side='right') - 1, 0, len(axis) - 2)
+        fraction = (value - axis[index]) * self._inv_widths[k][index]
+        return index, fraction, outside
+
+    def query_value(self, state, *, out=None):
+        """
+        Query the value of the property at a particular state.
+
+        Arguments:
+            state (dict): The state at which to query the values, see
+                `VariationWithStateTable.query_value`. Points outside of the grid give NaN.
+            out (ndarray): Optional float array, with the same shape as the query,
+                into which the values are written.
+
+        Returns:
+            scalar or array: value(s) of the property at the provided state(s).
+                If `out` is given, returns `out`.
+
+        """
+        for var_name in self.state_vars:
+            if var_name not in state.keys():
+                raise ValueError('{:s} not provided for query'.format(var_name))
+        shape = np.broadcast_shapes(*[np.shape(state[name]) for name in self.state_vars])
+        if out is not None and out.shape != shape:
+            raise ValueError('out has shape {}, but the query has shape {}'.format(
+                out.shape, shape))
+
+        if len(self.state_vars) == 1:
+            index, fraction, outside = self._locate(0, state[self.state_vars[0]])
+            values = self._flat_values[index] + fraction * self._slopes[index]
+        else:
+            # Multilinear interpolation: sum the corner values of each cell, weighted by
+            # the product of (fraction) or (1 - fraction) in each dimension.
+            flat_index = 0
+            fractions = []
+            outside = False
+            for k, name in enumerate(self.state_vars):
+                index, fraction, outside_k = self._locate(k, state[name])
+                flat_index = flat_index + index * self._strides[k]
+                fractions.append(fraction)
+                outside = outside | outside_k
+            values = 0.
+            for corner in itertools.product((0, 1), repeat=len(self.state_vars)):
+                weight = 1.
+                offset = 0
+                for k, upper in enumerate(corner):
+                    weight = weight * (fractions[k] if upper else 1. - fractions[k])
+                    offset += upper * self._strides[k]
+                values = values + weight * self._flat_values[flat_index + offset]
+        values = np.broadcast_to(values, shape)
+
+        if out is None:
+            out = np.array(values, dtype=np.double)
+        else:
+            np.copyto(out, values)
+        np.copyto(out, np.nan, where=np.broadcast_to(outside, shape))
+        if shape == ():
+            return out[()]
+        return out
+
+    def query_derivative(self, state, state_var):
+        """
+        Query the value of the grid, and its derivative with respect to a state variable.
+
+        The interpolation is linear in each state variable (in its interpolation scale)
+        within a grid cell, so the derivative is exact. On a grid point, the slope of the
+        cell above it is used.
+
+        Arguments:
+            state (dict): The state at which to query the values, see `query_value`.
+            state_var (string): Name of the state variable to differentiate with respect to.
+
+        Returns:
+            See `VariationWithState.query_derivative`. Points outside of the grid give NaN.
+
+        """
+        if state_var not in self.state_vars:
+            raise ValueError('{:s} is not a state variable of this model.'.format(state_var))
+        for var_name in self.state_vars:
+            if var_name not in state.keys():
+                raise ValueError('{:s} not provided for query'.format(var_name))
+        shape = np.broadcast_shapes(*[np.shape(state[name]) for name in self.state_vars])
+        k_wrt = self.state_vars.index(state_var)
+
+        flat_index = 0
+        indices = []
+        fractions = []
+        outside = False
+        for k, name in enumerate(self.state_vars):
+            index, fraction, outside_k = self._locate(k, state[name])
+            flat_index = flat_index + index * self._strides[k]
+            indices.append(index)
+            fractions.append(fraction)
+            outside = outside | outside_k
+        inv_width = self._inv_widths[k_wrt][indices[k_wrt]]
+        # The derivative of the corner weights with respect to dimension k_wrt (in its
+        # scale) replaces the factor (fraction) with (inv_width), and (1 - fraction) with
+        # (-inv_width).
+        values = 0.
+        derivatives = 0.
+        for corner in itertools.product((0, 1), repeat=len(self.state_vars)):
+            weight = 1.
+            weight_derivative = 1.
+            offset = 0
+            for k, upper in enumerate(corner):
+                factor = fractions[k] if upper else 1. - fractions[k]
+                weight = weight * factor
+                if k == k_wrt:
+                    weight_derivative = weight_derivative * (inv_width if upper else -inv_width)
+                else:
+                    weight_derivative = weight_derivative * factor
+                offset += upper * self._strides[k]
+            corner_values = self._flat_values[flat_index + offset]
+            values = values + weight * corner_values
+            derivatives = derivatives + weight_derivative * corner_values
+        outside = np.broadcast_to(outside, shape)
+        values = np.where(outside, np.nan, np.broadcast_to(values, shape))
+        derivatives = np.where(outside, np.nan, np.broadcast_to(derivatives, shape))
+        if self._state_vars_interp_scales[k_wrt] == 'log':
+            # d/dx = d/d(log x) / x
+            derivatives = derivatives / np.asarray(state[state_var], dtype=np.double)
+        if shape == ():
+            return values[()], derivatives[()]
+        return values, derivatives
+
+    def _get_cumulative(self, k):
+        """Get the cumulative integral of the grid values along dimension `k`, from the first
+        grid point of that dimension, at every grid point. It is computed on first use."""
+        if k not in self._cumulative:
+            values = np.moveaxis(np.asarray(self._grid_values, dtype=np.double), k, -1)
+            axis = self._axes[k]
+            cumulative = np.zeros(values.shape)
+            np.cumsum(_segment_integral(axis[:-1], np.diff(axis), values[..., :-1], values[..., 1:], 1.,
+                                        self._state_vars_interp_scales[k] == 'log'),
+                      axis=-1, out=cumulative[..., 1:])
+            self._cumulative.setdefault(k, np.moveaxis(cumulative, -1, k).ravel())
+        return self._cumulative[k]
+
+    def _antiderivative(self, state, state_var):
+        """Evaluate the integral of the grid from its first point in `state_var`, see
+        `VariationWithState._antiderivative`.
+
+        The integral along one dimension is linear in the grid values, so interpolating the
+        cumulative integrals (and the integral within the cell) in the other dimensions is exact.
+        """
+        for var_name in self.state_vars:
+            if var_name not in state.keys():
+                raise ValueError('{:s} not provided for query'.format(var_name))
+        shape = np.broadcast_shapes(*[np.shape(state[name]) for name in self.state_vars])
+        k_wrt = self.state_vars.index(state_var)
+        cumulative = self._get_cumulative(k_wrt)
+
+        flat_index = 0
+        indices = []
+        fractions = []
+        outside = False
+        for k, name in enumerate(self.state_vars):
+            index, fraction, outside_k = self._locate(k, state[name])
+            flat_index = flat_index + index * self._strides[k]
+            indices.append(index)
+            fractions.append(fraction)
+            outside = outside | outside_k
+        start = self._axes[k_wrt][indices[k_wrt]]
+        width = 1. / self._inv_widths[k_wrt][indices[k_wrt]]
+        stride = self._strides[k_wrt]
+        log_scale = self._state_vars_interp_scales[k_wrt] == 'log'
+        result = 0.
+        others = [k for k in range(len(self.state_vars)) if k != k_wrt]
+        for corner in itertools.product((0, 1), repeat=len(others)):
+            weight = 1.
+            offset = 0
+            for k, upper in zip(others, corner):
+                weight = weight * (fractions[k] if upper else 1. - fractions[k])
+                offset += upper * self._strides[k]
+            corner_index = flat_index + offset
+            result = result + weight * (cumulative[corner_index] + _segment_integral(
+                start, width, self._flat_values[corner_index], self._flat_values[corner_index + stride],
+                fractions[k_wrt], log_scale))
+        result = np.where(np.broadcast_to(outside, shape), np.nan, np.broadcast_to(result, shape))
+        return result[()] if shape == () else result
+
+    def get_state_domain(self):
+        """
+        Get the domain of the grid.
+
+        Returns:
+            dict: each key is the name of a state variable.
+            Values are tuples `(smin, smax)`.
+
+        """
+        return dict(zip(self.state_vars, self._domain))
+
+
+class VariationWithStateUniformTable(VariationWithStateGrid):
+    """
+    A material property's variation with state, represented as a table on a uniform grid.
+
+    These are created by `VariationWithState.resample`. Because the grid is uniform,
+    a query finds its grid cell by index arithmetic instead of a search, and then
+    interpolates (multi)linearly between the cell's corners.
+
+    Arguments:
+        state_vars (list of string): Names of the state variables.
+        state_vars_units (dict of string): Units of measure for each state variable.
+        value_type (string): Is the stored value a multiplier on the default value, or does it override the default?
+        reference (string): Bibtex tag for the source of the data.
+        domain (list of tuple): `(smin, smax)` of the grid for each state variable.
+        grid_values (ndarray): Values at the grid points, of shape (n_0, n_1, ...).
+        state_vars_interp_scales (list of string): 'linear' or 'log' for each state variable.
+            The grid points of state variable k are uniformly spaced in this scale,
+            from `domain[k][0]` to `domain[k][1]`. Defaults to 'linear'.
+        dtype: Floating point type in which the values are stored, see `VariationWithStateTable`.
+
+    """
+
+    def __init__(self, state_vars, state_vars_units, value_type, reference, domain, grid_values,
+                 state_vars_interp_scales=None, dtype=np.double):
+        if state_vars_interp_scales is None:
+            state_vars_interp_scales = ['linear'] * len(state_vars)
+        if len(domain) != len(state_vars) or np.ndim(grid_values) != len(state_vars):
+            raise ValueError('grid_values and domain must have one dimension per state variable.')
+        VariationWithStateGrid.__init__(
+            self, state_vars, state_vars_units, value_type, reference,
+            [_uniform_axes([bounds], [scale], n)[0] for bounds, scale, n
+             in zip(domain, state_vars_interp_scales, np.shape(grid_values))],
+            grid_values, state_vars_interp_scales, dtype)
+        self.representation = 'uniform table'
+        self._domain = [(float(smin), float(smax)) for smin, smax in domain]
+        # The grid start and inverse grid step of each state variable, in its scale.
+        self._starts = [axis[0] for axis in self._axes]
+        self._inv_steps = [(len(axis) - 1) / (axis[-1] - axis[0]) for axis in self._axes]
+        # Set by `VariationWithState.resample`.
+        self.resampling_error = None
+
+    def astype(self, dtype):
+        """Get a copy of the table, with its values stored in floating point type `dtype`."""
+        return VariationWithStateUniformTable(
+            self.state_vars, self.state_vars_units, self.value_type, self.reference,
+            self._domain, self._grid_values, self._state_vars_interp_scales, dtype=dtype)
+
+    def _locate(self, k, value):
+        """Find the grid cells of the query points in dimension `k`, by index arithmetic.
+
+        See `VariationWithStateGrid._locate`.
+        """
+        n = self._grid_values.shape[k]
+        position = (self._scaled(k, value) - self._starts[k]) * self._inv_steps[k]
+        outside = ~((position >= 0) & (position <= n - 1))
+        if np.any(outside):
+            position = np.where(outside, 0., position)
+        index = np.minimum(position.astype(np.intp), n - 2)
+        return index, position - index, outside
+
+
+def build_from_yaml(yaml_dict, table_dtype=np.double):
+    """Construct a variation with state object from a YAML-derived dictionary.
+
+    Arguments:
+        yaml_dict (dict): variation with state subdictionary extracted from a YAML file.
+        table_dtype: Floating point type in which tables are stored, see `VariationWithStateTable`.
+    """
     state_vars = yaml_dict['state_vars']
     state_vars_units = yaml_dict['state_vars_units']
     value_type = yaml_dict['value_type']
@@ -368,11 +1965,25 @@ def build_from_yaml(yaml_dict):
     if yaml_dict['representation'] == 'table':
         state_vars_interp_scales = yaml_dict.get(
             'state_vars_interp_scales', ['linear'] * len(state_vars))
+        if len(state_vars) == 2:
+            interp_points, interp_values, slice_offsets = _create_interp_arrays_from_yaml_table_2d(
+                yaml_dict, state_vars, state_vars_interp_scales)
+            return VariationWithStateSlicedTable(
+                state_vars, state_vars_units, value_type, reference,
+                interp_points, interp_values, state_vars_interp_scales,
+                slice_offsets=slice_offsets, dtype=table_dtype)
         interp_points, interp_values = _create_interp_arrays_from_yaml_table(
             yaml_dict, state_vars, state_vars_interp_scales)
         return VariationWithStateTable(
             state_vars, state_vars_units, value_type, reference,
-            interp_points, interp_values, state_vars_interp_scales)
+            interp_points, interp_values, state_vars_interp_scales, dtype=table_dtype)
+    elif yaml_dict['representation'] == 'grid':
+        state_vars_interp_scales = yaml_dict.get(
+            'state_vars_interp_scales', ['linear'] * len(state_vars))
+        return VariationWithStateGrid(
+            state_vars, state_vars_units, value_type, reference,
+            [yaml_dict[name] for name in state_vars], yaml_dict['values'],
+            state_vars_interp_scales, dtype=table_dtype)
     elif yaml_dict['representation'] == 'equation':
         expression = yaml_dict['expression']
         state_domain = yaml_dict['state_domain']
@@ -381,5 +1992,5 @@ def build_from_yaml(yaml_dict):
             value_type, reference,
             expression, state_domain)
     else:
-        raise NotImplementedError('Representations other than table or equation are'
+        raise NotImplementedError('Representations other than table, grid or equation are'
                                   + ' not yet supported.')
@@ -51,6 +51,45 @@ class TestCreatInterpArrays(unittest.TestCase):
         self.assertEqual(interp_values[4], 0.1 ** 2)
         self.assertEqual(interp_values[7], (3.1) ** 2)
 
+    def test_2d_ragged(self):
+        """Test with a large 2-d lookup table, with slices of different lengths."""
+        # Setup
+        n_slices = 500
+        yaml_dict = {
+            'state_vars': ['exposure time', 'temperature'],
+            'exposure time': {
+                # Listed in descending order, to check that the slices are sorted.
+                float(n_slices - i): {
+                    'temperature': np.arange(100 + i % 7),
+                    'values': np.full(100 + i % 7, float(n_slices - i)),
+                } for i in range(n_slices)
+            }
+        }
+
+        # Action
+        # pylint: disable=protected-access
+        interp_points, interp_values, slice_offsets = vstate._create_interp_arrays_from_yaml_table_2d(
+            yaml_dict, yaml_dict['state_vars'], ['log', 'linear'])
+
+        # Verification
+        lengths = [100 + (n_slices - p0) % 7 for p0 in range(1, n_slices + 1)]
+        np.testing.assert_array_equal(slice_offsets, np.concatenate(([0], np.cumsum(lengths))))
+        self.assertEqual(interp_points.shape, (sum(lengths), 2))
+        for i, (start, stop) in enumerate(zip(slice_offsets[:-1], slice_offsets[1:])):
+            np.testing.assert_array_equal(interp_points[start:stop, 0], np.log(i + 1.))
+            np.testing.assert_array_equal(interp_points[start:stop, 1], np.arange(stop - start))
+            np.testing.assert_array_equal(interp_values[start:stop], i + 1.)
+
+    def test_2d_mismatched_slice(self):
+        """A slice with a different number of points and values should raise a ValueError."""
+        yaml_dict = {
+            'state_vars': ['exposure time', 'temperature'],
+            'exposure time': {0.: {'temperature': [0., 1., 2.], 'values': [0., 1.]}},
+        }
+        with self.assertRaises(ValueError):
+            vstate._create_interp_arrays_from_yaml_table_2d(  # pylint: disable=protected-access
+                yaml_dict, yaml_dict['state_vars'], ['linear', 'linear'])
+
 
 class TestBuildFromYaml(unittest.TestCase):
     """Unit tests for build_from_yaml."""
@@ -221,6 +260,71 @@ class TestVariationWithStateTable(unittest.TestCase):
             # fish is not a state variable.
             state_model.query_value({'exposure time': [0, 0.05], 'temperature': [1, 2, 3]})
 
+    def test_query_out(self):
+        """Test queries which write into an output array, with read-only state arrays."""
+        # Setup
+        yaml_dict = {
+            'state_vars': ['exposure time', 'temperature'],
+            'state_vars_units': {'exposure time': 'hour', 'temperature': 'kelvin'},
+            'value_type': 'multiplier',
+            'representation': 'table',
+            'reference': 'reference',
+            'exposure time': {
+                0.0: {
+                    'temperature': np.arange(4),
+                    'values': np.arange(4) ** 2
+                },
+                0.1: {
+                    'temperature': np.arange(4),
+                    'values': (np.arange(4) + 0.5) ** 2
+                },
+            }
+        }
+        state_model = vstate.build_from_yaml(yaml_dict)
+        temperature = np.array([1., 2., 5.])
+        temperature.setflags(write=False)
+        out = np.empty(3)
+
+        # The nearest method never goes out of the domain.
+        for method, expected in [('linear', [1., 4., -1.]), ('nearest', [1., 4., 9.])]:
+            # Action
+            result = state_model.query_value(
+                {'exposure time': 0., 'temperature': temperature}, method=method, fill_value=-1., out=out)
+
+            # Verification
+            self.assertIs(result, out)
+            np.testing.assert_array_equal(out, expected)
+            np.testing.assert_array_equal(temperature, [1., 2., 5.])
+
+        # Scalar query into a 0-d array
+        out = np.empty(())
+        state_model.query_value({'exposure time': 0.05, 'temperature': 2}, out=out)
+        self.assertAlmostEqual(out[()], (2 ** 2 + 2.5 ** 2) / 2)
+
+        # Output array of the wrong shape
+        with self.assertRaises(ValueError):
+            state_model.query_value({'exposure time': 0., 'temperature': temperature}, out=np.empty(2))
+
+    def test_interpolator_reused(self):
+        """The interpolator should be built once and re-used for later queries."""
+        # Setup
+        state_model = vstate.VariationWithStateTable(
+            ['temperature'], {'temperature': 'kelvin'}, 'multiplier', 'reference',
+            np.arange(4), np.arange(4) ** 2,
+            ['linear'])
+
+        # Action
+        state_model.query_value({'temperature': 1.5})
+        interpolator = state_model._get_interpolator('linear', True)  # pylint: disable=protected-access
+        result = state_model.query_value({'temperature': [0.5, 5.]}, fill_value=-1.)
+
+        # Verification
+        # pylint: disable=protected-access
+        self.assertIs(state_model._get_interpolator('linear', True), interpolator)
+        self.assertEqual(len(state_model._interpolators), 1)
+        self.assertAlmostEqual(result[0], 0.5)
+        self.assertEqual(result[1], -1.)
+
     def test_domain_1d(self):
         """Test get_state_domain on a 1-d lookup table."""
         # Setup
@@ -311,6 +415,515 @@ class TestVariationWithStateTable(unittest.TestCase):
         self.assertEqual(string, desired_string)
 
 
+class TestVariationWithStateGrid(unittest.TestCase):
+    """Unit tests for VariationWithStateGrid."""
+
+    def setUp(self):
+        # A trilinear function of temperature, log(exposure time) and log(neutron dose),
+        # on a non-uniform grid.
+        self.yaml_dict = {
+            'state_vars': ['temperature', 'exposure time', 'neutron dose'],
+            'state_vars_units': {'temperature': 'kelvin', 'exposure time': 'hour',
+                                 'neutron dose': 'neutron centimeter**-2'},
+            'state_vars_interp_scales': ['linear', 'log', 'log'],
+            'value_type': 'multiplier',
+            'representation': 'grid',
+            'reference': 'reference',
+            'temperature': [300., 500., 700.],
+            'exposure time': [0.5, 10., 100., 1000.],
+            'neutron dose': [1.e19, 1.e20],
+        }
+        temperature, time, dose = np.meshgrid(
+            self.yaml_dict['temperature'], self.yaml_dict['exposure time'],
+            self.yaml_dict['neutron dose'], indexing='ij')
+        self.yaml_dict['values'] = self.function(temperature, time, dose).tolist()
+        self.state_model = vstate.build_from_yaml(self.yaml_dict)
+
+    @staticmethod
+    def function(temperature, time, dose):
+        """The trilinear function tabulated by the grid."""
+        return (1. + 1e-3 * temperature) * (2. - 0.1 * np.log(time)) * (1. + 0.01 * np.log(dose / 1e19))
+
+    def test_build(self):
+        """build_from_yaml should build a grid."""
+        self.assertEqual(type(self.state_model), vstate.VariationWithStateGrid)
+        self.assertEqual(self.state_model.representation, 'grid')
+        self.assertEqual(self.state_model.get_state_domain(), {
+            'temperature': (300., 700.), 'exposure time': (0.5, 1000.),
+            'neutron dose': (1.e19, 1.e20)})
+
+    def test_query(self):
+        """Queries should match the trilinear function, within each grid cell."""
+        # Setup
+        rng = np.random.default_rng(0)
+        temperature = rng.uniform(300., 700., 1000)
+        time = np.exp(rng.uniform(np.log(0.5), np.log(1000.), 1000))
+        dose = np.exp(rng.uniform(np.log(1e19), np.log(1e20), 1000))
+
+        # Action
+        result = self.state_model.query_value(
+            {'temperature': temperature, 'exposure time': time, 'neutron dose': dose})
+
+        # Verification
+        np.testing.assert_allclose(result, self.function(temperature, time, dose), rtol=1e-12)
+        self.assertAlmostEqual(
+            self.state_model.query_value({'temperature': 400., 'exposure time': 10., 'neutron dose': 1e19}),
+            self.function(400., 10., 1e19))
+
+    def test_query_out(self):
+        """Queries should write into `out`, which must be passed by keyword."""
+        # Setup
+        state = {'temperature': [400., 600.], 'exposure time': 10., 'neutron dose': 1e19}
+        out = np.empty(2)
+
+        # Action
+        result = self.state_model.query_value(state, out=out)
+
+        # Verification
+        self.assertIs(result, out)
+        np.testing.assert_allclose(out, self.function(np.array([400., 600.]), 10., 1e19))
+        with self.assertRaises(TypeError):
+            self.state_model.query_value(state, out)
+
+    def test_query_out_of_domain(self):
+        """Points outside of the grid should give NaN."""
+        result = self.state_model.query_value({
+            'temperature': [300., 299., 700., 500.],
+            'exposure time': [0.5, 1., 1000., 1001.],
+            'neutron dose': 1e19})
+        self.assertEqual(result.shape, (4,))
+        np.testing.assert_array_equal(np.isnan(result), [False, True, False, True])
+        np.testing.assert_allclose(result[[0, 2]], self.function(
+            np.array([300., 700.]), np.array([0.5, 1000.]), 1e19))
+
+    def test_query_1d(self):
+        """Test querying a 1d grid, with non-uniform points."""
+        # Setup
+        state_model = vstate.VariationWithStateGrid(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            [[0., 1., 3.]], [0., 1., 9.])
+
+        # Action and verification
+        self.assertEqual(state_model.query_value({'temperature': 2.}), 5.)
+        np.testing.assert_equal(
+            state_model.query_value({'temperature': [0., 0.5, 3., 3.5]}), [0., 0.5, 9., np.nan])
+
+    def test_invalid(self):
+        """Unsorted points, or values of the wrong shape, should raise a ValueError."""
+        with self.assertRaises(ValueError):
+            vstate.VariationWithStateGrid(
+                ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+                [[0., 2., 1.]], [0., 1., 2.])
+        with self.assertRaises(ValueError):
+            vstate.VariationWithStateGrid(
+                ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+                [[0., 1., 2.]], [0., 1.])
+
+    def test_float32(self):
+        """A float32 copy of the grid should match to single precision."""
+        state = {'temperature': 350., 'exposure time': 3., 'neutron dose': 2e19}
+        converted = self.state_model.astype(np.float32)
+        self.assertLess(converted.nbytes, self.state_model.nbytes)
+        self.assertAlmostEqual(converted.query_value(state) / self.state_model.query_value(state),
+                               1., places=6)
+
+
+class TestQueryState(unittest.TestCase):
+    """Unit tests for query_state, the inverse of query_value."""
+
+    def test_table_1d(self):
+        """The first crossing of a non-monotone 1d table should be found."""
+        # Setup
+        state_model = vstate.VariationWithStateTable(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            np.arange(5.), np.array([0., 2., 1., 1., 3.]), ['linear'])
+
+        # Action
+        result = state_model.query_state([0.5, 1.5, 1., 2.5, 4., -1.], 'temperature')
+
+        # Verification
+        np.testing.assert_allclose(result, [0.25, 0.75, 0.5, 3.75, np.nan, np.nan])
+        self.assertEqual(state_model.query_state(2., 'temperature'), 1.)
+
+    def test_sliced_table(self):
+        """Test solving for each state variable of a 2d table, with fixed arrays of the other."""
+        # Setup
+        state_model = vstate.build_from_yaml({
+            'state_vars': ['exposure time', 'temperature'],
+            'state_vars_units': {'exposure time': 'hour', 'temperature': 'kelvin'},
+            'state_vars_interp_scales': ['log', 'linear'],
+            'value_type': 'multiplier',
+            'representation': 'table',
+            'reference': 'reference',
+            'exposure time': {
+                1.: {'temperature': [300., 400., 500.], 'values': [1., 0.9, 0.6]},
+                100.: {'temperature': [300., 350., 400., 500.], 'values': [1., 0.9, 0.7, 0.4]},
+            }
+        })
+        time = np.array([1., 10., 100.])
+        target = np.array([[0.8], [0.95]])
+
+        # Action
+        temperature = state_model.query_state(target, 'temperature', {'exposure time': time})
+        exposure_time = state_model.query_state(0.8, 'exposure time', {'temperature': 400.})
+
+        # Verification
+        self.assertEqual(temperature.shape, (2, 3))
+        np.testing.assert_allclose(
+            state_model.query_value({'exposure time': time, 'temperature': temperature}),
+            np.broadcast_to(target, (2, 3)))
+        self.assertAlmostEqual(temperature[0, 0], 400. + 100. / 3.)
+        self.assertAlmostEqual(exposure_time, 10.)
+
+    def test_grid(self):
+        """Test solving for a log-scale state variable of a 3d grid."""
+        # Setup
+        time = np.array([1., 10., 100.])
+        state_model = vstate.VariationWithStateGrid(
+            ['temperature', 'exposure time', 'neutron dose'],
+            {'temperature': 'kelvin', 'exposure time': 'hour', 'neutron dose': 'neutron centimeter**-2'},
+            'multiplier', 'reference',
+            [[300., 500.], time, [1e19, 1e20]],
+            1. - 0.1 * np.log10(time)[np.newaxis, :, np.newaxis] * np.ones((2, 3, 2)),
+            ['linear', 'log', 'linear'])
+
+        # Action
+        result = state_model.query_state(
+            [1., 0.9, 0.85, 0.5], 'exposure time', {'temperature': 400., 'neutron dose': 5e19})
+
+        # Verification
+        np.testing.assert_allclose(result, [1., 10., np.sqrt(1000.), np.nan])
+
+    def test_equation(self):
+        """Test solving an equation, which is refined within the sampled segments."""
+        # Setup
+        state_model = vstate.VariationWithStateEquation(
+            ['temperature', 'dose'], {'temperature': 'kelvin', 'dose': 'gray'},
+            'override', 'reference', 'value = temperature**3 / (1 + dose)',
+            {'temperature': (0., 10.), 'dose': (0., 100.)})
+        dose = np.array([0., 1., 3.])
+
+        # Action
+        result = state_model.query_state(
+            [8., 8., 2000.], 'temperature', {'dose': dose})
+        scalar = state_model.query_state(1., 'temperature', {'dose': 1.}, num_points=5)
+
+        # Verification
+        np.testing.assert_allclose(result, [2., 2. * 2.**(1. / 3.), np.nan], rtol=1e-12)
+        self.assertAlmostEqual(scalar, 2.**(1. / 3.), places=12)
+
+    def test_bad_state(self):
+        """Solving for an unknown state variable, or without the other state variables, should fail."""
+        state_model = vstate.VariationWithStateGrid(
+            ['temperature', 'exposure time'], {'temperature': 'kelvin', 'exposure time': 'hour'},
+            'override', 'reference', [[0., 1.], [0., 1.]], [[0., 1.], [2., 3.]])
+        with self.assertRaises(ValueError):
+            state_model.query_state(1., 'fish', {'exposure time': 0.})
+        with self.assertRaises(ValueError):
+            state_model.query_state(1., 'temperature')
+
+
+class TestQueryDerivative(unittest.TestCase):
+    """Unit tests for query_derivative."""
+
+    def test_table_1d(self):
+        """A 1d table's derivative is the slope of its segments, also in log scale."""
+        # Setup
+        state_model = vstate.VariationWithStateTable(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            np.log([1., 10., 100.]), np.array([0., 1., 3.]), ['log'])
+
+        # Action
+        values, derivatives = state_model.query_derivative(
+            {'temperature': [1., 5., 10., 50., 100., 200.]}, 'temperature')
+
+        # Verification
+        np.testing.assert_allclose(values, state_model.query_value(
+            {'temperature': [1., 5., 10., 50., 100., 200.]}))
+        slopes = np.array([1., 1., 2., 2., 2.]) / np.log(10.)
+        np.testing.assert_allclose(derivatives[:5], slopes / [1., 5., 10., 50., 100.])
+        self.assertTrue(np.isnan(derivatives[5]))
+        self.assertEqual(state_model.query_derivative({'temperature': 10.}, 'temperature')[0], 1.)
+
+    def test_sliced_table(self):
+        """Derivatives of a 2d table with respect to each state variable."""
+        # Setup
+        state_model = vstate.build_from_yaml({
+            'state_vars': ['exposure time', 'temperature'],
+            'state_vars_units': {'exposure time': 'hour', 'temperature': 'kelvin'},
+            'value_type': 'multiplier',
+            'representation': 'table',
+            'reference': 'reference',
+            'exposure time': {
+                0.: {'temperature': [0., 1., 2.], 'values': [1., 0.8, 0.2]},
+                2.: {'temperature': [0., 2., 3.], 'values': [1., 0.6, 0.]},
+            }
+        })
+        state = {'exposure time': [0., 1., 1., 2., 3.], 'temperature': [0.5, 0.5, 1.5, 2.5, 1.]}
+
+        # Action
+        values, d_temperature = state_model.query_derivative(state, 'temperature')
+        _, d_time = state_model.query_derivative(state, 'exposure time')
+
+        # Verification
+        np.testing.assert_allclose(values, state_model.query_value(state))
+        np.testing.assert_allclose(d_temperature, [-0.2, -0.2, -0.4, -0.6, np.nan])
+        np.testing.assert_allclose(d_time, [0., 0., (0.7 - 0.5) / 2., np.nan, np.nan])
+
+    def test_grid(self):
+        """Derivatives of a grid, which is multilinear in each cell."""
+        # Setup
+        state_model = vstate.VariationWithStateGrid(
+            ['temperature', 'exposure time'], {'temperature': 'kelvin', 'exposure time': 'hour'},
+            'override', 'reference', [[0., 1., 3.], [0., 2.]], [[0., 2.], [1., 5.], [3., 11.]])
+        state = {'temperature': [0.5, 2., 4.], 'exposure time': 1.}
+
+        # Action
+        values, d_temperature = state_model.query_derivative(state, 'temperature')
+        _, d_time = state_model.query_derivative(state, 'exposure time')
+
+        # Verification: value = temperature + temperature * exposure time + exposure time
+        np.testing.assert_allclose(values, [2., 5., np.nan])
+        np.testing.assert_allclose(d_temperature, [2., 2., np.nan])
+        np.testing.assert_allclose(d_time, [1.5, 3., np.nan])
+
+    def test_equation(self):
+        """Derivatives of an equation, which is differentiated automatically."""
+        # Setup
+        state_model = vstate.VariationWithStateEquation(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            'value = 2 * temperature**3', {'temperature': (0., 10.)})
+
+        # Action
+        values, derivatives = state_model.query_derivative({'temperature': [1., 2., 11.]}, 'temperature')
+
+        # Verification
+        np.testing.assert_allclose(values, [2., 16., np.nan])
+        np.testing.assert_allclose(derivatives, [6., 24., np.nan])
+        self.assertEqual(state_model.query_derivative({'temperature': 1.}, 'temperature'), (2., 6.))
+
+
+class TestQueryIntegral(unittest.TestCase):
+    """Unit tests for query_integral."""
+
+    def test_table_1d(self):
+        """Integrals of a 1d table should be exact, in linear and log scale."""
+        # Setup
+        linear = vstate.VariationWithStateTable(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            np.array([2., 0., 1.]), np.array([3., 0., 1.]), ['linear'])
+        log = vstate.VariationWithStateTable(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            np.log([1., np.e]), np.array([0., 1.]), ['log'])
+
+        # Action and verification
+        # Points given out of order are sorted; the value is x on [0, 1] and 2x - 1 on [1, 2].
+        np.testing.assert_allclose(
+            linear.query_integral([0., 0.5, 2., 0.], [2., 1.5, 1., 3.], 'temperature'),
+            [2.5, 1.125, -2., np.nan])
+        # The value is log(x) on [1, e], whose integral is x log(x) - x.
+        self.assertAlmostEqual(log.query_integral(1., np.e, 'temperature'), 1.)
+        self.assertAlmostEqual(log.query_integral(2., 2.5, 'temperature'),
+                               2.5 * np.log(2.5) - 2.5 - 2. * np.log(2.) + 2.)
+
+    def test_sliced_table(self):
+        """Integrals of a 2d table over its second state variable, at fixed values of the first."""
+        # Setup
+        state_model = vstate.build_from_yaml({
+            'state_vars': ['exposure time', 'temperature'],
+            'state_vars_units': {'exposure time': 'hour', 'temperature': 'kelvin'},
+            'value_type': 'multiplier',
+            'representation': 'table',
+            'reference': 'reference',
+            'exposure time': {
+                0.: {'temperature': [0., 1., 2.], 'values': [1., 1., 1.]},
+                2.: {'temperature': [0., 3.], 'values': [0., 3.]},
+            }
+        })
+
+        # Action
+        result = state_model.query_integral(
+            0., [2., 2., 2., 3.], 'temperature', {'exposure time': [0., 1., 2., 1.]})
+
+        # Verification
+        np.testing.assert_allclose(result, [2., 0.5 * 2. + 0.5 * 2., 2., np.nan])
+        with self.assertRaises(NotImplementedError):
+            state_model.query_integral(0., 1., 'exposure time', {'temperature': 1.})
+
+    def test_grid(self):
+        """Integrals of a grid over each of its state variables."""
+        # Setup: value = temperature * exposure time, exact on the grid.
+        time = np.array([1., 2., 4.])
+        state_model = vstate.VariationWithStateGrid(
+            ['temperature', 'exposure time'], {'temperature': 'kelvin', 'exposure time': 'hour'},
+            'override', 'reference', [[0., 1., 3.], time], np.outer([0., 1., 3.], time))
+
+        # Action and verification
+        np.testing.assert_allclose(
+            state_model.query_integral(0.5, [2.5, 4.], 'temperature', {'exposure time': [1.5, 2.]}),
+            [1.5 * (2.5**2 - 0.5**2) / 2., np.nan])
+        self.assertAlmostEqual(
+            state_model.query_integral(1., 3., 'exposure time', {'temperature': 2.}), 2. * 4.)
+
+    def test_equation(self):
+        """Integrals of equations, of one (tabulated) and two (quadrature) state variables."""
+        # Setup
+        one = vstate.VariationWithStateEquation(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            'value = exp(temperature / 300)', {'temperature': (0., 1000.)})
+        two = vstate.VariationWithStateEquation(
+            ['temperature', 'dose'], {'temperature': 'kelvin', 'dose': 'gray'}, 'override', 'reference',
+            'value = temperature**3 * dose', {'temperature': (0., 10.), 'dose': (0., 10.)})
+        lower = np.array([0., 123.4, 500.])
+        upper = np.array([1000., 567.8, 1200.])
+
+        # Action and verification
+        np.testing.assert_allclose(
+            one.query_integral(lower, upper, 'temperature'),
+            [300. * (np.exp(1000. / 300.) - 1.), 300. * (np.exp(567.8 / 300.) - np.exp(123.4 / 300.)), np.nan],
+            rtol=1e-10)
+        np.testing.assert_allclose(
+            two.query_integral(1., [2., 3.], 'temperature', {'dose': [2., 3.]}),
+            [2. * (2.**4 - 1.) / 4., 3. * (3.**4 - 1.) / 4.])
+        self.assertAlmostEqual(two.query_integral(0., 2., 'dose', {'temperature': 2.}), 16.)
+        # The antiderivative starts from the lower bound of the domain.
+        self.assertAlmostEqual(
+            two._antiderivative({'temperature': 2., 'dose': 3.}, 'temperature'),  # pylint: disable=protected-access
+            3. * 2.**4 / 4.)
+
+
+class TestVariationWithStateSlicedTable(unittest.TestCase):
+    """Unit tests for VariationWithStateSlicedTable."""
+
+    def setUp(self):
+        yaml_dict = {
+            'state_vars': ['exposure time', 'temperature'],
+            'state_vars_units': {'exposure time': 'hour', 'temperature': 'kelvin'},
+            'value_type': 'multiplier',
+            'representation': 'table',
+            'reference': 'reference',
+            'exposure time': {
+                0.0: {
+                    'temperature': np.arange(4),
+                    'values': np.arange(4) ** 2
+                },
+                0.1: {
+                    'temperature': np.arange(3),
+                    'values': (np.arange(3) + 0.5) ** 2
+                },
+                0.3: {
+                    'temperature': np.arange(5),
+                    'values': np.arange(5) + 1.
+                },
+            }
+        }
+        self.state_model = vstate.build_from_yaml(yaml_dict)
+
+    def test_build(self):
+        """build_from_yaml should keep the slices of a 2-d table."""
+        self.assertEqual(type(self.state_model), vstate.VariationWithStateSlicedTable)
+        # pylint: disable=protected-access
+        np.testing.assert_array_equal(self.state_model._slice_offsets, [0, 4, 7, 12])
+        np.testing.assert_array_equal(self.state_model._slice_points, [0., 0.1, 0.3])
+
+    def test_query(self):
+        """Test queries on and between slices."""
+        # On a slice
+        self.assertEqual(self.state_model.query_value({'exposure time': 0.1, 'temperature': 1}), 1.5 ** 2)
+        self.assertEqual(self.state_model.query_value({'exposure time': 0.3, 'temperature': 4}), 5.)
+        # Between slices
+        result = self.state_model.query_value({'exposure time': 0.2, 'temperature': 1.5})
+        self.assertAlmostEqual(result, 0.5 * (1.5 ** 2 + 2.5 ** 2) / 2 + 0.5 * 2.5)
+        # Array query, with one scalar state
+        result = self.state_model.query_value({'exposure time': 0.05, 'temperature': [0, 1, 2]})
+        np.testing.assert_allclose(result, [0.125, 1.625, 5.125])
+
+    def test_query_out_of_domain(self):
+        """Queries outside of the slices should give the fill value."""
+        result = self.state_model.query_value(
+            {'exposure time': [-0.1, 0.4, 0.05, 0.05, 0.3], 'temperature': [1, 1, 3.5, -1, 5]})
+        self.assertTrue(np.all(np.isnan(result)))
+        result = self.state_model.query_value(
+            {'exposure time': 0.4, 'temperature': 1}, fill_value=-1.)
+        self.assertEqual(result, -1.)
+
+    def test_query_ragged(self):
+        """Queries which a neighbouring slice does not cover should fall back to scattered
+        interpolation."""
+        # Setup
+        # pylint: disable=protected-access
+        table = vstate.VariationWithStateTable(
+            self.state_model.state_vars, self.state_model.state_vars_units, 'multiplier', 'reference',
+            self.state_model._interp_points, self.state_model._interp_values, ['linear', 'linear'])
+        state = {'exposure time': [0.05, 0.2, 0.05], 'temperature': [3., 2.5, 1.]}
+
+        # Action
+        result = self.state_model.query_value(state)
+
+        # Verification
+        np.testing.assert_allclose(result[:2], table.query_value(state)[:2])
+        self.assertFalse(np.any(np.isnan(result)))
+        self.assertEqual(self.state_model.query_value({'exposure time': 0.05, 'temperature': 3.}),
+                         result[0])
+
+    def test_domain_ragged(self):
+        """The domain should be the bounding box of all of the slices."""
+        # Setup
+        state_model = vstate.VariationWithStateSlicedTable(
+            ['exposure time', 'temperature'], {'exposure time': 'hour', 'temperature': 'kelvin'},
+            'multiplier', 'reference',
+            np.array([[1., 150.], [1., 300.], [10., 100.], [10., 280.]]), np.array([1., 2., 2., 3.]),
+            ['linear', 'linear'])
+
+        # Action and verification
+        self.assertEqual(state_model.get_state_domain(),
+                         {'exposure time': (1., 10.), 'temperature': (100., 300.)})
+        self.assertTrue(state_model.is_state_in_domain({'exposure time': 10., 'temperature': 120.}))
+        self.assertAlmostEqual(
+            state_model.query_value({'exposure time': 10., 'temperature': 120.}), 2. + 20. / 180.)
+        self.assertFalse(state_model.is_state_in_domain({'exposure time': 10., 'temperature': 301.}))
+
+    def test_query_many_slices(self):
+        """Queries on a table with many slices should find the right slices and segments."""
+        # Setup
+        exposure_time, temperature = np.meshgrid(np.arange(1000.), np.linspace(0., 1., 20), indexing='ij')
+        state_model = vstate.VariationWithStateSlicedTable(
+            ['exposure time', 'temperature'], {'exposure time': 'hour', 'temperature': 'kelvin'},
+            'multiplier', 'reference', np.stack((exposure_time.ravel(), temperature.ravel()), axis=-1),
+            exposure_time.ravel() + temperature.ravel() ** 2, ['linear', 'linear'])
+        rng = np.random.default_rng(0)
+        state = {'exposure time': rng.uniform(0., 999., 1000), 'temperature': rng.uniform(0., 1., 1000)}
+
+        # Action
+        result = state_model.query_value(state)
+
+        # Verification
+        # The values are linear in exposure time, and linear in temperature between the points.
+        upper = np.clip(np.searchsorted(temperature[0], state['temperature']), 1, 19)
+        t_0, t_1 = temperature[0, upper - 1], temperature[0, upper]
+        expected = state['exposure time'] + t_0 ** 2 + (state['temperature'] - t_0) * (t_1 + t_0)
+        np.testing.assert_allclose(result, expected)
+        self.assertAlmostEqual(state_model.query_value({'exposure time': 500.5, 'temperature': 1.}), 501.5)
+
+    def test_float32(self):
+        """A table stored in float32 should use half the memory, and give double results."""
+        # Action
+        state_model = self.state_model.astype(np.float32)
+
+        # Verification
+        self.assertEqual(state_model.nbytes, self.state_model.nbytes // 2)
+        state = {'exposure time': [0.05, 0.2], 'temperature': [1., 1.5]}
+        result = state_model.query_value(state)
+        self.assertEqual(result.dtype, np.double)
+        np.testing.assert_allclose(result, self.state_model.query_value(state), rtol=1e-6)
+
+    def test_query_nearest(self):
+        """Methods other than linear should fall back to scattered interpolation."""
+        result = self.state_model.query_value(
+            {'exposure time': 0.29, 'temperature': 4.1}, method='nearest')
+        self.assertEqual(result, 5.)
+
+
 class TestVariationWithStateEquation(unittest.TestCase):
     """Unit tests for VariationWithStateEquation."""
 
@@ -367,6 +980,90 @@ class TestVariationWithStateEquation(unittest.TestCase):
         self.assertFalse(state_model.is_state_in_domain({'temperature': 1000.1, 'pressure': 1}))
         self.assertFalse(state_model.is_state_in_domain({'temperature': 10, 'pressure': -1}))
 
+    def test_query_partly_out_of_domain(self):
+        """Only the points of an array query which are out of the domain should be NaN."""
+        # Setup
+        state_model = vstate.VariationWithStateEquation(
+            ['temperature', 'pressure'], {'temperature': 'kelvin', 'pressure': 'pascal'},
+            'override', 'reference',
+            'value = 1 / temperature + pressure', {'temperature': (1, 1000), 'pressure': (0, 1e6)})
+        temperature = np.array([[0., 1., 2.], [4., 5., 2000.]])
+
+        # Action
+        result = state_model.query_value({'temperature': temperature, 'pressure': 1.})
+        out = np.zeros((2, 3))
+        out_result = state_model.query_value(
+            {'temperature': temperature, 'pressure': np.array([1., 1., -1.])}, out=out)
+
+        # Verification
+        np.testing.assert_equal(result, [[np.nan, 2., 1.5], [1.25, 1.2, np.nan]])
+        self.assertIs(out_result, out)
+        np.testing.assert_equal(out, [[np.nan, 2., np.nan], [1.25, 1.2, np.nan]])
+        np.testing.assert_equal(
+            state_model.get_domain_mask({'temperature': temperature, 'pressure': 1.}),
+            [[False, True, True], [True, True, False]])
+        self.assertTrue(np.isnan(state_model.query_value({'temperature': 0., 'pressure': 1.})))
+
+    def test_query_list(self):
+        """Lists should be queried like arrays, whether or not the points are all in the domain."""
+        for compiled in [True, False]:
+            # Setup
+            state_model = vstate.VariationWithStateEquation(
+                ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+                'value = 2 * temperature', {'temperature': (0, 1000)}, compiled=compiled)
+
+            # Action and verification
+            np.testing.assert_equal(state_model.query_value({'temperature': [1., 2.]}), [2., 4.])
+            np.testing.assert_equal(state_model.query_value({'temperature': [1., -2.]}), [2., np.nan])
+
+    def test_query_constant(self):
+        """The result of a constant expression should have the shape of the query."""
+        # Setup
+        state_model = vstate.VariationWithStateEquation(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            'value = 5.', {'temperature': (0, 1000)})
+
+        # Action and verification
+        np.testing.assert_equal(state_model.query_value({'temperature': np.array([1., 2.])}), [5., 5.])
+        np.testing.assert_equal(state_model.query_value({'temperature': np.array([1., -2.])}), [5., np.nan])
+        self.assertEqual(state_model.query_value({'temperature': 1.}), 5.)
+
+    def test_query_identity(self):
+        """The result should never be the caller's state array."""
+        # Setup
+        state_model = vstate.VariationWithStateEquation(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            'value = temperature', {'temperature': (0, 1000)})
+        temperature = np.array([1., 2.])
+
+        # Action
+        result = state_model.query_value({'temperature': temperature})
+
+        # Verification
+        self.assertIsNot(result, temperature)
+        np.testing.assert_equal(result, temperature)
+
+    def test_query_compiled(self):
+        """The compiled expression should agree with asteval, on scalars and arrays."""
+        # Setup
+        expression = ('t = temperature / 1000; value = (1/ 0.063546) * (17.72891 + 28.09870 * t'
+                      + ' + -31.25289 * t**2 + 13.97243 * t**3 + 0.068611 * t**(-2))')
+        compiled_model = vstate.VariationWithStateEquation(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            expression, {'temperature': (298, 1358)})
+        asteval_model = vstate.VariationWithStateEquation(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            expression, {'temperature': (298, 1358)}, compiled=False)
+        temperature = np.linspace(300, 1300)
+
+        # Action and verification
+        self.assertIsNotNone(compiled_model.compiled_procedure)
+        self.assertIsNone(asteval_model.compiled_procedure)
+        self.assertAlmostEqual(compiled_model.query_value({'temperature': 300}),
+                               asteval_model.query_value({'temperature': 300}))
+        np.testing.assert_allclose(compiled_model.query_value({'temperature': temperature}),
+                                   asteval_model.query_value({'temperature': temperature}))
+
     def test_import_os(self):
         """Security: Make sure one cannot import os in the expression."""
         # Setup
@@ -378,5 +1075,99 @@ class TestVariationWithStateEquation(unittest.TestCase):
             state_model.query_value({'temperature': 1})
 
 
+class TestVariationWithStateUniformTable(unittest.TestCase):
+    """Unit tests for VariationWithStateUniformTable and resample."""
+
+    def test_query_1d(self):
+        """Test querying a 1d uniform table."""
+        # Setup
+        state_model = vstate.VariationWithStateUniformTable(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            [(0., 3.)], np.arange(4.) ** 2)
+
+        # Action and verification
+        self.assertEqual(state_model.query_value({'temperature': 1.5}), 2.5)
+        np.testing.assert_equal(
+            state_model.query_value({'temperature': [[0., 3.], [-1., np.nan]]}),
+            [[0., 9.], [np.nan, np.nan]])
+        out = np.zeros(2)
+        self.assertIs(state_model.query_value({'temperature': [0.5, 2.5]}, out=out), out)
+        np.testing.assert_allclose(out, [0.5, 6.5])
+
+    def test_query_2d(self):
+        """Test querying a 2d uniform table, which should be bilinear in each cell."""
+        # Setup
+        state_model = vstate.VariationWithStateUniformTable(
+            ['exposure time', 'temperature'], {'exposure time': 'hour', 'temperature': 'kelvin'},
+            'override', 'reference', [(1., 100.), (0., 2.)],
+            [[0., 1., 2.], [10., 11., 12.], [20., 21., 22.]], ['log', 'linear'])
+
+        # Action
+        result = state_model.query_value(
+            {'exposure time': [1., 10., 100., np.sqrt(10.), 0.5], 'temperature': 0.5})
+
+        # Verification
+        np.testing.assert_allclose(result, [0.5, 10.5, 20.5, 5.5, np.nan])
+
+    def test_resample_table(self):
+        """Resampling a 1d table onto the table's own (uniform) grid should be exact."""
+        # Setup
+        state_model = vstate.VariationWithStateTable(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            np.arange(5.), np.arange(5.) ** 2, ['linear'])
+        temperature = np.linspace(0., 4.)
+
+        # Action
+        resampled = state_model.resample(num_points=5)
+
+        # Verification
+        np.testing.assert_allclose(resampled.query_value({'temperature': temperature}),
+                                   state_model.query_value({'temperature': temperature}))
+        self.assertAlmostEqual(resampled.resampling_error.max_abs_error, 0.)
+        self.assertEqual(resampled.get_state_domain(), {'temperature': (0., 4.)})
+
+    def test_resample_tolerance(self):
+        """Resampling to a tolerance should refine the grid until the tolerance is met."""
+        # Setup
+        state_model = vstate.VariationWithStateEquation(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            'value = sin(temperature)', {'temperature': (0, 10)})
+        temperature = np.linspace(2., 4., 1001)
+
+        # Action
+        resampled = state_model.resample(tolerance=1e-4, state_domain={'temperature': (2., 4.)})
+
+        # Verification
+        error = resampled.resampling_error
+        self.assertLessEqual(error.max_abs_error, 1e-4)
+        self.assertEqual(error.lost_points, 0)
+        actual_error = np.max(np.abs(resampled.query_value({'temperature': temperature})
+                                     - np.sin(temperature)))
+        self.assertLessEqual(actual_error, 1e-4)
+        self.assertTrue(np.isnan(resampled.query_value({'temperature': 5.})))
+        with self.assertRaises(ValueError):
+            state_model.resample(tolerance=1e-12, max_points=1000)
+        with self.assertRaises(ValueError):
+            state_model.resample()
+
+    def test_resample_table_tolerance(self):
+        """The error of a resampled table should be exact, so the tolerance always holds."""
+        # Setup
+        # A steep step, between two grid points of the check grid.
+        state_model = vstate.VariationWithStateTable(
+            ['temperature'], {'temperature': 'kelvin'}, 'override', 'reference',
+            np.array([0., 0.3, 0.31, 1.]), np.array([0., 0., 1., 1.]), ['linear'])
+        temperature = np.union1d(np.linspace(0., 1., 100001), [0.3, 0.31])
+
+        # Action
+        resampled = state_model.resample(tolerance=0.045)
+
+        # Verification
+        actual_error = np.max(np.abs(resampled.query_value({'temperature': temperature})
+                                     - state_model.query_value({'temperature': temperature})))
+        self.assertEqual(resampled.resampling_error.max_abs_error, actual_error)
+        self.assertLessEqual(actual_error, 0.045)
+
+
 if __name__ == '__main__':
     unittest.main()
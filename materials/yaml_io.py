@@ -0,0 +1,28 @@
+"""YAML loading and dumping, using libyaml's C implementation when it is available.
+
+The material data only uses standard YAML (plus merge keys), so the safe
+loader is enough. If PyYAML was built with libyaml, its C safe loader parses
+several times faster than the pure python loaders used by `yaml.full_load`.
+"""
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+    HAS_LIBYAML = True
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+    HAS_LIBYAML = False
+
+
+def load_yaml(stream):
+    """Parse a YAML document from a string or stream, with the fastest available safe loader."""
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def dump_yaml(data, stream=None, **kwargs):
+    """Dump data as YAML, with the fastest available safe dumper.
+
+    Keyword arguments are passed to `yaml.dump`. Custom representers should be
+    registered on `SafeDumper`.
+    """
+    return yaml.dump(data, stream, Dumper=SafeDumper, **kwargs)
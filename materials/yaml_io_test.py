@@ -0,0 +1,27 @@
+"""Unit tests for yaml_io."""
+import os.path
+import unittest
+import yaml
+
+from materials import get_database_dir
+from materials.yaml_io import load_yaml, dump_yaml
+
+
+class TestLoadYaml(unittest.TestCase):
+    """Unit tests for load_yaml."""
+
+    def test_database(self):
+        """The safe loader should parse the database the same as full_load."""
+        for filename in os.listdir(get_database_dir()):
+            with open(os.path.join(get_database_dir(), filename), 'r', encoding='utf-8') as yaml_stream:
+                source = yaml_stream.read()
+            self.assertEqual(load_yaml(source), yaml.full_load(source))
+
+    def test_round_trip(self):
+        """Dumped YAML should load back to the same data."""
+        data = {'temperature': [300., 400.], 'values': [1, 2], 'name': 'a', 0.5: {'b': None}}
+        self.assertEqual(load_yaml(dump_yaml(data)), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
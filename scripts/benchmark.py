@@ -0,0 +1,195 @@
+"""Benchmark loading materials, building properties and querying properties.
+
+The results are written as JSON, so that the results of two versions of the
+package can be compared, e.g.:
+
+    python scripts/benchmark.py --output old.json
+    (change the package)
+    python scripts/benchmark.py --output new.json --compare old.json
+
+The script benchmarks the package in the checkout which contains it (rather than an
+installed copy), and only uses the features of the package which that version has,
+so it can be run on older versions to find regressions.
+"""
+import argparse
+import inspect
+import json
+import os.path
+import platform
+import sys
+import timeit
+import numpy as np
+
+# Benchmark the package in this checkout, even when it is not installed.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+import materials
+from materials.material import build_properties
+try:
+    from materials.record_cache import load_record
+except ImportError:
+    # Versions before the record cache parse the YAML files directly.
+    load_record = None
+
+
+def time_call(func, repeat):
+    """Time a function call.
+
+    The function is called in a loop, with enough calls per loop to take at
+    least 0.2 seconds, and the loop is repeated `repeat` times.
+
+    Returns:
+        dict: the minimum and median time per call [units: second], and the number of calls.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = np.array(timer.repeat(repeat=repeat, number=number)) / number
+    return {'min_s': float(np.min(times)), 'median_s': float(np.median(times)),
+            'calls': number * repeat}
+
+
+def first_form_condition(record):
+    """Get the first form and condition in a parsed record which has any conditions."""
+    for form, form_dict in record['forms'].items():
+        if form_dict and form_dict.get('conditions'):
+            return form, next(iter(form_dict['conditions']))
+    raise ValueError('Record {:s} has no conditions'.format(record['name']))
+
+
+def read_record(filename):
+    """Parse a material YAML file."""
+    if load_record is not None:
+        return load_record(filename)
+    import yaml  # pylint: disable=import-outside-toplevel
+    with open(filename, 'r', encoding='utf-8') as yaml_file:
+        return yaml.safe_load(yaml_file)
+
+
+def can_load(name, form, condition):
+    """Check that this version of the package can load a material, and report it if not."""
+    try:
+        materials.load(name, form, condition)
+    except Exception as exc:  # pylint: disable=broad-except
+        print('Skipping {:s}, which cannot be loaded: {}'.format(name, exc), file=sys.stderr)
+        return False
+    return True
+
+
+def load_cases(repeat):
+    """Benchmark `materials.load` and `build_properties` for each file in the database.
+
+    Versions with a record cache are benchmarked with and without it; for older versions,
+    `load/parse` is a plain `materials.load`.
+    """
+    results = {}
+    has_cache = 'use_cache' in inspect.signature(materials.load).parameters
+    data_dir = materials.get_database_dir()
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith('.yaml'):
+            continue
+        name = filename[:-len('.yaml')]
+        record = read_record(os.path.join(data_dir, filename))
+        form, condition = first_form_condition(record)
+        properties_dict = record['forms'][form]['conditions'][condition]['properties']
+        if not can_load(name, form, condition):
+            continue
+        if has_cache:
+            results['load/parse/' + name] = time_call(
+                lambda: materials.load(name, form, condition, use_cache=False), repeat)
+            results['load/cached/' + name] = time_call(
+                lambda: materials.load(name, form, condition), repeat)
+        else:
+            results['load/parse/' + name] = time_call(
+                lambda: materials.load(name, form, condition), repeat)
+        results['build_properties/' + name] = time_call(
+            lambda: build_properties(properties_dict), repeat)
+    return results
+
+
+def query_models():
+    """Get a representative model and query domain for each kind of variation with state.
+
+    Returns:
+        dict: (model, {state var: (min, max)}) for each kind of model.
+    """
+    cases = {
+        'table_1d': ('Al_6061', 'extruded, thickness > 1 inch', 'T6', 'youngs_modulus'),
+        'table_2d': ('Al_6061', 'extruded, thickness > 1 inch', 'T6', 'strength_tensile_ultimate'),
+        'equation': ('copper', 'wire', 'annealed', 'heat_capacity'),
+    }
+    models = {}
+    for kind, (name, form, condition, property_name) in cases.items():
+        if can_load(name, form, condition):
+            model = materials.load(name, form, condition)[property_name].variations_with_state['thermal']
+            models[kind] = (model, model.get_state_domain())
+    return models
+
+
+def query_cases(repeat, max_points):
+    """Benchmark `query_value` of each kind of model, for scalars and arrays of increasing size."""
+    results = {}
+    rng = np.random.default_rng(0)
+    sizes = ['scalar'] + [10**i for i in range(int(np.log10(max_points)) + 1)]
+    for kind, (model, domain) in query_models().items():
+        for size in sizes:
+            state = {}
+            for name in model.state_vars:
+                smin, smax = domain[name]
+                if size == 'scalar':
+                    state[name] = 0.5 * (smin + smax)
+                else:
+                    state[name] = rng.uniform(smin, smax, size)
+            result = time_call(lambda: model.query_value(state), repeat)
+            points = 1 if size == 'scalar' else size
+            result['points'] = points
+            result['points_per_s'] = points / result['min_s']
+            results['query/{:s}/{}'.format(kind, size)] = result
+    return results
+
+
+def compare(results, baseline):
+    """Print the ratio of each benchmark's time to its time in `baseline`."""
+    print('{:50s} {:>12s} {:>12s} {:>8s}'.format('benchmark', 'baseline', 'current', 'ratio'),
+          file=sys.stderr)
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        old = baseline[key]['min_s']
+        new = result['min_s']
+        print('{:50s} {:12.3e} {:12.3e} {:8.2f}'.format(key, old, new, new / old), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='JSON file to write the results to. Default: stdout.')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against.')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timing loops per benchmark.')
+    parser.add_argument('--max-points', type=float, default=1e7,
+                        help='Largest number of query points.')
+    parser.add_argument('--skip-load', action='store_true', help='Skip the load benchmarks.')
+    args = parser.parse_args()
+
+    results = {}
+    if not args.skip_load:
+        results.update(load_cases(args.repeat))
+    results.update(query_cases(args.repeat, int(args.max_points)))
+    output = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(output, output_file, indent=2)
+    else:
+        print(json.dumps(output, indent=2))
+    if args.compare:
+        with open(args.compare, 'r') as baseline_file:
+            compare(results, json.load(baseline_file)['results'])
+
+
+if __name__ == '__main__':
+    main()
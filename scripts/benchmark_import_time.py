@@ -0,0 +1,48 @@
+"""Measure the time taken by `import materials`, in fresh python processes."""
+import argparse
+import json
+import subprocess
+import sys
+import numpy as np
+
+
+def time_import(module):
+    """Time importing `module` in a new python process, using `python -X importtime`.
+
+    Returns:
+        float: the cumulative import time of `module`, in seconds.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            check=True, stderr=subprocess.PIPE, universal_newlines=True)
+    for line in result.stderr.splitlines():
+        # Lines have the form 'import time: self [us] | cumulative | imported package'
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return float(fields[1]) * 1e-6
+    raise ValueError('No import time reported for {:s}'.format(module))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--module', default='materials', help='Module to import.')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of processes to time.')
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='Exit with an error if the median import time exceeds this, in ms.')
+    args = parser.parse_args()
+
+    times = np.array([time_import(args.module) for _ in range(args.repeat)])
+    result = {
+        'module': args.module,
+        'repeat': args.repeat,
+        'median_ms': 1e3 * float(np.median(times)),
+        'min_ms': 1e3 * float(np.min(times)),
+        'max_ms': 1e3 * float(np.max(times)),
+    }
+    print(json.dumps(result))
+    if args.max_ms is not None and result['median_ms'] > args.max_ms:
+        sys.exit('Median import time {:.1f} ms exceeds {:.1f} ms'.format(
+            result['median_ms'], args.max_ms))
+
+
+if __name__ == '__main__':
+    main()
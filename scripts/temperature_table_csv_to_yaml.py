@@ -1,8 +1,8 @@
 """Convert a property vs temperature table from WebPlotDigitizer csv to this project's YAML format."""
 import os.path
 import argparse
-import yaml
 import numpy as np
+from materials.yaml_io import SafeDumper, dump_yaml
 
 
 # See https://stackoverflow.com/a/33944926
@@ -12,7 +12,7 @@ def float_representer(dumper, value):
     else:
         text = '{:.4e}'.format(value)
     return dumper.represent_scalar(u'tag:yaml.org,2002:float', text)
-yaml.add_representer(float, float_representer)
+SafeDumper.add_representer(float, float_representer)
 
 
 def make_yaml_dict(filename, args):
@@ -40,7 +40,7 @@ def main(args):
                 yaml_dict[name] = make_yaml_dict(os.path.join(args.in_filename, file), args)
     else:
         yaml_dict = make_yaml_dict(args.in_filename, args)
-    yaml_doc = yaml.dump(yaml_dict, default_flow_style=True)
+    yaml_doc = dump_yaml(yaml_dict, default_flow_style=True)
     print(yaml_doc)
     with open('out.yaml', 'w') as outfile:
         outfile.write(yaml_doc)